@@ -1,6 +1,11 @@
 import { fetchEventSource } from "@microsoft/fetch-event-source";
 import type { ToolCallChunk, UserMessage } from "@/types/message";
-import type { TaskCreate, TaskRead, TaskUsage } from "@/types/task";
+import type {
+  TaskContextUsage,
+  TaskCreate,
+  TaskRead,
+  TaskUsage,
+} from "@/types/task";
 import { API_BASE, fetchApi, type PaginatedResponse } from "./index";
 
 export async function fetchTasks(
@@ -23,6 +28,14 @@ export async function fetchTaskById(taskId: number): Promise<TaskRead> {
   return await fetchApi<TaskRead>(`${API_BASE}/tasks/${taskId}`);
 }
 
+export async function fetchTaskContextUsage(
+  taskId: number
+): Promise<TaskContextUsage> {
+  return await fetchApi<TaskContextUsage>(
+    `${API_BASE}/tasks/${taskId}/context_usage`
+  );
+}
+
 export async function createTask(taskData: TaskCreate): Promise<TaskRead> {
   return await fetchApi<TaskRead>(`${API_BASE}/tasks/`, {
     method: "POST",
@@ -64,6 +77,11 @@ export type ToolExecutedEventData = {
   result: string | null;
 };
 
+export type ToolProgressEventData = {
+  tool_call_id: string;
+  elapsed: number;
+};
+
 export type ToolRequireUserResponseEventData = {
   tool_name: "ask_user" | "finish_task";
 };
@@ -83,6 +101,7 @@ export type AgentEventType =
   | "TASK_DONE"
   | "TASK_INTERRUPTED"
   | "TOOL_EXECUTED"
+  | "TOOL_PROGRESS"
   | "TOOL_REQUIRE_USER_RESPONSE"
   | "TOOL_REQUIRE_PERMISSION"
   | "ERROR";
@@ -95,6 +114,7 @@ export type TaskSseCallbacks = {
 
   // tool related callbacks
   onToolExecuted?: (data: ToolExecutedEventData) => void;
+  onToolProgress?: (data: ToolProgressEventData) => void;
   onToolRequireUserResponse?: (data: ToolRequireUserResponseEventData) => void;
   onToolRequirePermission?: (data: ToolRequirePermissionEventData) => void;
 
@@ -159,6 +179,10 @@ function createTaskSseStream(
             callbacks.onToolExecuted?.(data as ToolExecutedEventData);
             break;
 
+          case "TOOL_PROGRESS":
+            callbacks.onToolProgress?.(data as ToolProgressEventData);
+            break;
+
           case "TOOL_REQUIRE_USER_RESPONSE":
             callbacks.onToolRequireUserResponse?.(
               data as ToolRequireUserResponseEventData
@@ -155,6 +155,7 @@ export function PromptInput({
                 inputTokens: taskUsage.input_tokens,
                 outputTokens: taskUsage.output_tokens,
                 totalTokens: taskUsage.total_tokens,
+                cachedInputTokens: taskUsage.cached_tokens,
               }}
               usedTokens={taskUsage.total_tokens}
             >
@@ -58,6 +58,9 @@ export function TaskPanel({ tabId, metadata }: TabPanelProps<TaskTabMetadata>) {
       return;
     }
     setTaskData(taskQueryData);
+    if (!metadata.isDraft && taskRunner.state === "idle") {
+      taskRunner.loadContextUsage(taskQueryData.id);
+    }
     if (!(metadata.isDraft || taskRunner.state !== "idle")) {
       const lastMessage = taskQueryData.messages.at(-1);
       if (lastMessage) {
@@ -2,7 +2,12 @@ import { current } from "immer";
 import { useEffect, useRef, useState } from "react";
 import { toast } from "sonner";
 import type { Updater } from "use-immer";
-import { continueTask, type TaskSseCallbacks, toolAnswer } from "@/api/task";
+import {
+  continueTask,
+  fetchTaskContextUsage,
+  type TaskSseCallbacks,
+  toolAnswer,
+} from "@/api/task";
 import type { ToolCallChunk, ToolMessage, UserMessage } from "@/types/message";
 import type { TaskRead, TaskUsage } from "@/types/task";
 
@@ -11,6 +16,7 @@ export type TaskState = "idle" | "waiting" | "running";
 export type TaskRunner = {
   continue: (taskId: number, messages: UserMessage | null) => void;
   answerTool: (taskId: number, toolCallId: string, answer: string) => void;
+  loadContextUsage: (taskId: number) => void;
   cancel: () => void;
   handleCustomToolAction: (
     toolMessageId: string,
@@ -189,6 +195,21 @@ export function useTaskRunner(
     );
   };
 
+  const loadContextUsage = (taskId: number) => {
+    fetchTaskContextUsage(taskId)
+      .then(({ used_tokens, max_tokens }) => {
+        setUsage((draft) => ({
+          ...draft,
+          input_tokens: used_tokens,
+          total_tokens: used_tokens,
+          max_tokens,
+        }));
+      })
+      .catch((error) => {
+        console.warn("Failed to load task context usage:", error);
+      });
+  };
+
   const handleCustomToolAction = (
     toolMessageId: string,
     _event: string,
@@ -224,6 +245,7 @@ export function useTaskRunner(
   return {
     continue: continue_,
     answerTool,
+    loadContextUsage,
     cancel,
     handleCustomToolAction,
 
@@ -5,6 +5,7 @@ export type AgentBase = {
   name: string;
   icon_name: IconName;
   system_prompt: string;
+  parallel_tool_calls?: boolean;
 };
 
 export type AgentBrief = {
@@ -6,6 +6,12 @@ export type TaskUsage = {
   input_tokens: number;
   output_tokens: number;
   total_tokens: number;
+  cached_tokens?: number;
+  max_tokens: number;
+};
+
+export type TaskContextUsage = {
+  used_tokens: number;
   max_tokens: number;
 };
 
@@ -3,6 +3,7 @@ import type { AgentRead } from "./agent";
 export type WorkspaceBase = {
   name: string;
   directory: string;
+  search_index_max_bytes?: number;
 };
 
 export type WorkspaceRead = WorkspaceBase & {
@@ -0,0 +1,117 @@
+"""
+Load test for the ASGI serving mode: open hundreds of concurrent task streams
+against one server process and report how many OS threads it took.
+
+The agent is replaced with a fake one that emits text chunks from the AsyncTaskPool loop,
+the rest of the path (`AgentTask.run_async`, `agent_stream_async`, starlette, uvicorn) is real.
+
+Usage:
+    python -m benchmarks.bench_async_streams [stream_count]
+"""
+import asyncio
+import socket
+import sys
+import threading
+import time
+import httpx
+import uvicorn
+from liteai_sdk import TextChunk
+from src.app import App
+from src.asgi import create_asgi_app
+from src.agent import AgentTask
+from src.agent.chunk_coalescer import CoalesceStats
+from src.agent.types import MessageChunkEvent, MessageStartEvent, MessageEndEvent, TaskDoneEvent
+from src.routes import task as task_routes
+
+CHUNK_COUNT = 20
+CHUNK_INTERVAL = 0.1
+
+class FakeAgentTask(AgentTask):
+    def __init__(self, task_id: int):
+        self._lock = threading.Lock()
+        self.task_id = task_id
+        self._is_running = True
+        self._current_task_id = None
+        self._current_channel = None
+        self._messages = []
+        self.coalesce_stats = CoalesceStats()
+
+    def __del__(self): pass
+
+    def persist(self): pass
+
+    async def _run_loop(self, event_channel):
+        try:
+            event_channel.put(MessageStartEvent())
+            for i in range(CHUNK_COUNT):
+                await asyncio.sleep(CHUNK_INTERVAL)
+                event_channel.put(MessageChunkEvent(TextChunk(f"chunk {i} ")))
+            event_channel.put(MessageEndEvent())
+            event_channel.put(TaskDoneEvent())
+        finally:
+            event_channel.close()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+async def open_stream(client: httpx.AsyncClient, url: str) -> int:
+    events = 0
+    async with client.stream("POST", url, json={"message": None}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                events += 1
+    return events
+
+async def run_clients(port: int, stream_count: int) -> list[int]:
+    limits = httpx.Limits(max_connections=stream_count)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        return await asyncio.gather(*[
+            open_stream(client, f"http://localhost:{port}/api/tasks/{i}/continue")
+            for i in range(stream_count)
+        ])
+
+def main():
+    stream_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    task_routes.task_pool.add = FakeAgentTask
+
+    port = free_port()
+    config = uvicorn.Config(create_asgi_app(App()), host="localhost", port=port,
+                            log_level="warning", backlog=stream_count * 2)
+    server = uvicorn.Server(config)
+    server_thread = threading.Thread(target=server.run, daemon=True)
+    server_thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    baseline_threads = threading.active_count()
+    peak_threads = baseline_threads
+    sampling = True
+
+    def sample_threads():
+        nonlocal peak_threads
+        while sampling:
+            peak_threads = max(peak_threads, threading.active_count())
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample_threads)
+    sampler.start()
+
+    start = time.perf_counter()
+    results = asyncio.run(run_clients(port, stream_count))
+    elapsed = time.perf_counter() - start
+    sampling = False
+    sampler.join()
+    server.should_exit = True
+    server_thread.join()
+
+    expected_events = CHUNK_COUNT + 3
+    completed = sum(1 for events in results if events == expected_events)
+    print(f"streams: {stream_count}, completed: {completed}")
+    print(f"elapsed: {elapsed:.2f} s (a single stream takes {CHUNK_COUNT * CHUNK_INTERVAL:.2f} s)")
+    print(f"threads: {baseline_threads} before, {peak_threads} peak "
+          "(includes the sampler and the client)")
+
+if __name__ == "__main__":
+    main()
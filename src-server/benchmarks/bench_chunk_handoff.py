@@ -0,0 +1,106 @@
+"""
+Compare the legacy `queue.Queue.get(timeout=0.3)` polling consumer with `EventChannel`.
+
+Measures:
+    - handoff latency: time between the producer putting a chunk and the consumer receiving it
+    - stop latency: time between `stop()` and the consumer loop exiting
+    - idle wakeups: how many times a consumer wakes up while no chunk arrives
+
+Usage:
+    python -m benchmarks.bench_chunk_handoff
+"""
+import asyncio
+import queue
+import statistics
+import threading
+import time
+from src.utils import use_async_task_pool, EventChannel
+
+CHUNK_COUNT = 500
+CHUNK_INTERVAL = 0.002
+IDLE_SECONDS = 2.0
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def report(name: str, latencies: list[float], stop_latency: float, wakeups: int):
+    ms = [v * 1000 for v in latencies]
+    print(f"{name:>8} | handoff p50 {percentile(ms, 0.5):7.3f} ms"
+          f" | p99 {percentile(ms, 0.99):7.3f} ms"
+          f" | max {max(ms):7.3f} ms"
+          f" | stop {stop_latency * 1000:8.3f} ms"
+          f" | idle wakeups/{IDLE_SECONDS:.0f}s {wakeups}")
+
+async def produce(put, count: int):
+    for _ in range(count):
+        put(time.perf_counter())
+        await asyncio.sleep(CHUNK_INTERVAL)
+
+def bench_legacy_queue():
+    pool = use_async_task_pool()
+    chunk_queue: queue.Queue[float] = queue.Queue()
+    latencies: list[float] = []
+    is_running = True
+    wakeups = 0
+    exited = threading.Event()
+
+    def consume():
+        nonlocal wakeups
+        while is_running:
+            try:
+                sent_at = chunk_queue.get(timeout=0.3)
+            except queue.Empty:
+                wakeups += 1
+                continue
+            latencies.append(time.perf_counter() - sent_at)
+        exited.set()
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    pool.wait_result(pool.add_task(produce(chunk_queue.put_nowait, CHUNK_COUNT)))
+
+    wakeups = 0
+    time.sleep(IDLE_SECONDS)
+    idle_wakeups = wakeups
+
+    stop_at = time.perf_counter()
+    is_running = False
+    exited.wait()
+    stop_latency = time.perf_counter() - stop_at
+    consumer.join()
+    report("queue", latencies, stop_latency, idle_wakeups)
+
+def bench_event_channel():
+    pool = use_async_task_pool()
+    channel: EventChannel[float] = EventChannel()
+    latencies: list[float] = []
+    wakeups = 0
+    exited = threading.Event()
+
+    def consume():
+        nonlocal wakeups
+        for sent_at in channel:
+            wakeups += 1
+            latencies.append(time.perf_counter() - sent_at)
+        exited.set()
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    pool.wait_result(pool.add_task(produce(channel.put, CHUNK_COUNT)))
+
+    wakeups = 0
+    time.sleep(IDLE_SECONDS)
+    idle_wakeups = wakeups
+
+    stop_at = time.perf_counter()
+    channel.close()
+    exited.wait()
+    stop_latency = time.perf_counter() - stop_at
+    consumer.join()
+    report("channel", latencies, stop_latency, idle_wakeups)
+
+if __name__ == "__main__":
+    print(f"{CHUNK_COUNT} chunks, {CHUNK_INTERVAL * 1000:.0f} ms apart")
+    bench_legacy_queue()
+    bench_event_channel()
@@ -0,0 +1,72 @@
+"""
+Measure the document index on generated notes (5000 markdown files of about 4 KB by default):
+
+- the first build and the size of the index,
+- the update after editing one note,
+- search_documents with a few queries, against a search_files run for one of the words.
+
+Usage:
+    python -m benchmarks.bench_document_index [--notes 5000] [--note-kb 4]
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools.conversion_cache import ConversionCache
+from src.agent.tools.document_index import DocumentIndex
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.workspace_index import WorkspaceIndex
+
+QUERIES = ["quarterly budget review", "migration plan database", "onboarding checklist", "zebra"]
+
+def make_notes(root: Path, rng: random.Random, notes: int, note_bytes: int):
+    words = [f"{rng.choice('bcdfghklmnprstvz')}{rng.choice('aeiou')}{rng.choice('lnrst')}{i}" for i in range(5000)]
+    words += ["budget", "quarterly", "review", "migration", "database", "plan", "onboarding", "checklist"]
+    for i in range(notes):
+        directory = root / f"notes_{i // 500}"
+        directory.mkdir(exist_ok=True)
+        paragraphs = []
+        size = 0
+        while size < note_bytes:
+            paragraph = " ".join(rng.choices(words, k=rng.randint(20, 60)))
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        (directory / f"note_{i}.md").write_text(f"# Note {i}\n\n" + "\n\n".join(paragraphs), encoding="utf-8")
+
+def timed(name: str, run):
+    start = time.perf_counter()
+    result = run()
+    print(f"{name:>40} | {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--note-kb", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as db_dir:
+        make_notes(Path(root), random.Random(0), args.notes, args.note_kb * 1024)
+        workspace_index = WorkspaceIndex(root, Path(db_dir) / "workspace.db")
+        workspace_index.build()
+        index = DocumentIndex(workspace_index, Path(db_dir) / "documents.db",
+                              conversion_cache=ConversionCache(Path(db_dir) / "conversions.db"))
+        index.state = index.state.READY
+        timed(f"build ({args.notes} notes)", lambda: index.update([""]))
+        print(f"{'index size':>40} | {index.usage()['bytes'] / 1024 / 1024:10.1f} MB")
+
+        edited = Path(root) / "notes_0" / "note_7.md"
+        edited.write_text(edited.read_text(encoding="utf-8") + "\n\nzebra crossing\n", encoding="utf-8")
+        workspace_index.apply_changes([str(edited)])
+        timed("update after editing one note", lambda: index.update(["notes_0/note_7.md"]))
+
+        tool = FileSystemTool(root, workspace_index=workspace_index, document_index=index)
+        for query in QUERIES:
+            result = timed(f'search_documents "{query}"', lambda: tool.search_documents(query))
+            print(f"{'':>40} | {result.splitlines()[0]}")
+        timed('search_files "budget"', lambda: tool.search_files("budget"))
+        index.stop()
+
+if __name__ == "__main__":
+    main()
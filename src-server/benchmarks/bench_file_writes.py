@@ -0,0 +1,82 @@
+"""
+Measure the throughput of many small edit_file and write_file calls on one file
+(a 2000 line source file by default) with each fsync policy,
+against the in-place `Path.write_text` the tools used before, the time of write_file for a large file,
+and the diff of a one line edit in a 50k line file against `difflib.unified_diff` over the whole file.
+
+Usage:
+    python -m benchmarks.bench_file_writes [--edits 500] [--lines 2000] [--large-mb 64] [--diff-lines 50000]
+"""
+import argparse
+import difflib
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.edit_diff import edit_diff
+from src.agent.tools.file_writer import FsyncPolicy
+
+def make_source(lines: int) -> str:
+    return "".join(f"def function_{i}(value):\n    return value + {i}\n\n" for i in range(lines // 3))
+
+def report(name: str, count: int, elapsed: float):
+    print(f"{name:>32} | {elapsed * 1000:9.1f} ms | {count / elapsed:9.0f} calls/s")
+
+def edit_in_place(path: Path, count: int):
+    # what edit_file did before, without the diff: read, replace, rewrite the file in place
+    for i in range(count):
+        content = path.read_text(encoding="utf-8")
+        content = content.replace(f"return value + {i}\n", f"return value - {i}\n", 1)
+        path.write_text(content, encoding="utf-8")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edits", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--large-mb", type=int, default=64)
+    parser.add_argument("--diff-lines", type=int, default=50_000)
+    args = parser.parse_args()
+    edits = min(args.edits, args.lines // 3)
+
+    with tempfile.TemporaryDirectory() as root:
+        path = Path(root) / "module.py"
+        source = make_source(args.lines)
+        path.write_text(source, encoding="utf-8")
+        start = time.perf_counter()
+        edit_in_place(path, edits)
+        report("in place edits", edits, time.perf_counter() - start)
+
+        for policy in FsyncPolicy:
+            path.write_text(source, encoding="utf-8")
+            tool = FileSystemTool(root)
+            tool.WRITE_FSYNC = policy
+            start = time.perf_counter()
+            for i in range(edits):
+                tool.edit_file("module.py", f"return value + {i}\n", f"return value - {i}\n")
+            report(f"edit_file, fsync {policy.value}", edits, time.perf_counter() - start)
+            start = time.perf_counter()
+            for _ in range(edits):
+                tool.write_file("module.py", source)
+            report(f"write_file, fsync {policy.value}", edits, time.perf_counter() - start)
+
+        large = "x" * 99 + "\n"
+        large = large * (args.large_mb * 1024 * 1024 // len(large))
+        tool = FileSystemTool(root)
+        start = time.perf_counter()
+        tool.write_file("large.txt", large)
+        print(f"{f'write_file ({args.large_mb} MB)':>32} | {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+    text = make_source(args.diff_lines)
+    old, new = f"return value + {args.diff_lines // 6}\n", "return value * 2\n"
+    start = time.perf_counter()
+    expected = "\n".join(difflib.unified_diff(text.splitlines(), text.replace(old, new).splitlines(),
+                                              fromfile="a/module.py", tofile="b/module.py"))
+    print(f"{'difflib over the whole file':>32} | {(time.perf_counter() - start) * 1000:9.1f} ms")
+    start = time.perf_counter()
+    offset = text.index(old)
+    diff = edit_diff(text, offset, offset + len(old), new, "module.py")
+    print(f"{'edit_diff':>32} | {(time.perf_counter() - start) * 1000:9.1f} ms")
+    assert diff == expected
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure find_files on a synthetic tree (about 100k files by default, 100 packages x 10 modules x 100 files),
+against the recursive `list_directory` the agent used to locate a file:
+
+- the first lookup, which loads the path list from the workspace index,
+- a repeated lookup, answered from the cached results,
+- new fuzzy and glob lookups over the cached path list,
+- the first lookup after a file is added.
+
+Usage:
+    python -m benchmarks.bench_find_files [packages] [modules] [files]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.workspace_index import WorkspaceIndex
+from benchmarks.bench_list_directory import make_tree
+
+def timed(name: str, run) -> str:
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    unit, value = ("us", elapsed * 1e6) if elapsed < 0.001 else ("ms", elapsed * 1000)
+    print(f"{name:>34} | {value:9.1f} {unit} | {len(result):8} chars")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("packages", type=int, nargs="?", default=100)
+    parser.add_argument("modules", type=int, nargs="?", default=10)
+    parser.add_argument("files", type=int, nargs="?", default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as db_dir:
+        workspace = Path(root)
+        count = make_tree(workspace, args.packages, args.modules, args.files)
+        print(f"{count} entries")
+        index = WorkspaceIndex(root, Path(db_dir) / "index.db", max_entries=10_000_000)
+        index.build()
+        tool = FileSystemTool(root, workspace_index=index)
+
+        timed("list_directory (2000 entries max)", lambda: tool.list_directory(".", recursive=True, max_entries=10**9))
+        timed("first lookup (loads the list)", lambda: tool.find_files("pkg7mod3file42"))
+        timed("repeated lookup", lambda: tool.find_files("pkg7mod3file42"))
+        timed("new fuzzy lookup", lambda: tool.find_files("package_42/module_7/file_9.py"))
+        timed("short fuzzy lookup", lambda: tool.find_files("f99"))
+        timed("glob lookup", lambda: tool.find_files("**/module_3/file_4?.py"))
+        # packages and modules in the middle of the tree, which exist whatever the parameters
+        package, module = f"package_{args.packages // 2}", f"module_{args.modules // 2}"
+        timed("subdirectory lookup", lambda: tool.find_files("file_1", package))
+
+        new_file = workspace / package / module / "handlers.py"
+        new_file.write_text("", encoding="utf-8")
+        index.apply_changes([str(new_file)])
+        result = timed("lookup after a change", lambda: tool.find_files("handlers"))
+        assert f"{package}/{module}/handlers.py" in result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare the legacy `Path.iterdir` based recursive listing with the `os.scandir` based one,
+on a synthetic tree (about 100k entries by default, 100 packages x 10 modules x 100 files).
+
+The scandir listing is measured without a limit, which produces the same output as the legacy one,
+and with the default entry limit of the tool.
+
+Usage:
+    python -m benchmarks.bench_list_directory [packages] [modules] [files]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools.file_system import FileSystemTool
+
+def make_tree(root: Path, packages: int, modules: int, files: int) -> int:
+    count = 0
+    for p in range(packages):
+        for m in range(modules):
+            directory = root / f"package_{p}" / f"module_{m}"
+            directory.mkdir(parents=True)
+            for f in range(files):
+                (directory / f"file_{f}.py").touch()
+            count += files + 1
+        count += 1
+    return count
+
+def legacy_list_recursive(directory: Path, prefix: str = "", indent: int = 0) -> list[str]:
+    def format_item(item: Path) -> str:
+        if item.is_symlink():
+            try:
+                item_type = f"symlink -> {item.readlink()}"
+            except (OSError, ValueError):
+                item_type = "symlink -> <unreadable>"
+        elif item.is_dir():
+            item_type = "dir"
+        else:
+            item_type = "file"
+        return f"[{item_type}] {item.name}"
+
+    try:
+        items = sorted(directory.iterdir(), key=lambda x: (not x.is_dir(), x.name.lower()))
+    except PermissionError:
+        return []
+    indent_str = "  " * indent
+    if len(items) == 0:
+        return [indent_str + "(empty directory)"]
+    lines = []
+    for idx, item in enumerate(items, 1):
+        current_prefix = f"{prefix}{idx}" if prefix else str(idx)
+        lines.append(f"{indent_str}{current_prefix} {format_item(item)}")
+        if item.is_dir():
+            lines.extend(legacy_list_recursive(item, f"{current_prefix}.", indent + 1))
+    return lines
+
+def measure(name: str, run) -> str:
+    start = time.perf_counter()
+    output = run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>22} | {elapsed * 1000:9.1f} ms | {output.count(chr(10)) + 1:7d} lines"
+          f" | {len(output) / 1024:8.1f} KB")
+    return output
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("packages", type=int, nargs="?", default=100)
+    parser.add_argument("modules", type=int, nargs="?", default=10)
+    parser.add_argument("files", type=int, nargs="?", default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        count = make_tree(Path(root), args.packages, args.modules, args.files)
+        print(f"{count} entries")
+        tool = FileSystemTool(root)
+
+        legacy = measure("legacy iterdir", lambda: "\n".join(["Directory: .", *legacy_list_recursive(Path(root))]))
+        FileSystemTool.LIST_DIRECTORY_MAX_ENTRIES = count
+        unlimited = measure("scandir, unlimited", lambda: tool.list_directory(".", recursive=True))
+        assert unlimited == legacy
+        FileSystemTool.LIST_DIRECTORY_MAX_ENTRIES = 2000
+        measure("scandir, 2000 entries", lambda: tool.list_directory(".", recursive=True))
+
+if __name__ == "__main__":
+    main()
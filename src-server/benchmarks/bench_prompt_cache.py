@@ -0,0 +1,148 @@
+"""
+Check that the request prefix sent by an agent task stays byte-stable across turns,
+which is what the provider prompt caches match on.
+
+A local stub of an OpenAI compatible provider records every request body
+and answers with a `list_directory` tool call for a number of turns, then with `finish_task`.
+The agent side (`AgentTask._run_loop`, liteai_sdk, litellm) is real.
+For each turn the report shows the request size, how many of its bytes
+(tool definitions and messages) repeat the previous request exactly,
+and the share of the prompt a prefix cache could serve.
+
+Usage:
+    python -m benchmarks.bench_prompt_cache [turn_count]
+"""
+import json
+import socket
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import uvicorn
+from liteai_sdk import LLM, LlmProviders, SystemMessage, UserMessage
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from src.agent import AgentTask
+from src.agent.chunk_coalescer import CoalesceStats
+from src.agent.context_window import ContextWindowManager
+
+request_bodies: list[dict] = []
+
+def completion_chunk(delta: dict, finish_reason: str | None = None) -> str:
+    return "data: " + json.dumps({
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }) + "\n\n"
+
+def make_stub_app(turn_count: int) -> Starlette:
+    async def chat_completions(request: Request):
+        body = await request.json()
+        request_bodies.append(body)
+        turn = len(request_bodies)
+        tool_name, arguments = ("list_directory", '{"path": "."}') if turn < turn_count\
+                               else ("finish_task", "{}")
+
+        def stream():
+            yield completion_chunk({"role": "assistant", "content": f"Turn {turn}, "})
+            yield completion_chunk({"tool_calls": [{
+                "index": 0,
+                "id": f"call_{turn}",
+                "type": "function",
+                "function": {"name": tool_name, "arguments": arguments},
+            }]})
+            yield completion_chunk({}, "tool_calls")
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+
+class StubAgentTask(AgentTask):
+    def __init__(self, base_url: str, workspace: str):
+        self._lock = threading.Lock()
+        self._ctx = SimpleNamespace(
+            workspace=SimpleNamespace(directory=workspace, search_index_max_bytes=1024 * 1024 * 1024),
+            agent=SimpleNamespace(parallel_tool_calls=False))
+        self.llm = LLM(provider=LlmProviders.OPENAI, base_url=base_url, api_key="sk-stub")
+        self.task_id = 0
+        self.model_id = "stub"
+        self._is_running = True
+        self._current_task_id = None
+        self._current_channel = None
+        self._tool_speculator = None
+        self._messages = [UserMessage(content="List the workspace until you are done.")]
+        self._compacted_history = None
+        self.coalesce_stats = CoalesceStats()
+        self._system_message = SystemMessage(content="You are a benchmark agent. " * 200)
+        self._cache_args = None
+        self._init_builtin_tools()
+        self._context_window = ContextWindowManager(
+            self.llm, self.model_id, 128_000, self.COMPACTION_POLICY,
+            fixed_messages=[self._system_message], tools=self._tools)
+
+    def __del__(self): pass
+
+    def persist(self): pass
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+def encode(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+def stable_prefix_size(previous: dict, current: dict) -> int:
+    """Bytes of the current request that repeat the previous request from the start"""
+    size = 0
+    if encode(previous.get("tools")) != encode(current.get("tools")):
+        return size
+    size += len(encode(current.get("tools")))
+    for previous_message, message in zip(previous["messages"], current["messages"]):
+        if encode(previous_message) != encode(message):
+            break
+        size += len(encode(message))
+    return size
+
+def request_size(body: dict) -> int:
+    return len(encode(body.get("tools"))) + sum(len(encode(m)) for m in body["messages"])
+
+def main():
+    turn_count = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(make_stub_app(turn_count), host="localhost",
+                                           port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    with tempfile.TemporaryDirectory() as workspace:
+        for name in ("a.txt", "b.txt", "c.txt"):
+            open(f"{workspace}/{name}", "w").close()
+        task = StubAgentTask(f"http://localhost:{port}/v1", workspace)
+        for _ in task.run():
+            pass
+    server.should_exit = True
+
+    print(f"{'turn':>4} {'request bytes':>14} {'stable prefix':>14} {'cacheable':>10}")
+    all_stable = True
+    for turn, body in enumerate(request_bodies, 1):
+        size = request_size(body)
+        if turn == 1:
+            print(f"{turn:>4} {size:>14} {'-':>14} {'-':>10}")
+            continue
+        previous = request_bodies[turn - 2]
+        stable = stable_prefix_size(previous, body)
+        # the whole previous request must be a prefix of the current one
+        all_stable &= stable == request_size(previous)
+        print(f"{turn:>4} {size:>14} {stable:>14} {stable / size:>9.1%}")
+    print(f"previous request is a byte-stable prefix on every turn: {all_stable}")
+
+if __name__ == "__main__":
+    main()
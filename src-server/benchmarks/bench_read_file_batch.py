@@ -0,0 +1,83 @@
+"""
+Compare the legacy sequential `read_file_batch` (one read after another, `result +=` assembly)
+with the concurrent one, on a batch of small source files.
+
+Local files are usually in the page cache, where a read barely waits on I/O,
+`--latency` adds a sleep to every file read to emulate a network drive or a cold disk.
+
+Usage:
+    python -m benchmarks.bench_read_file_batch [file_count] [--latency SECONDS]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools import file_system
+from src.agent.tools.file_system import FileSystemTool
+
+ROUNDS = 5
+
+def make_workspace(root: Path, file_count: int) -> list[str]:
+    paths = []
+    for i in range(file_count):
+        path = root / f"pkg{i % 20}" / f"module_{i}.py"
+        path.parent.mkdir(exist_ok=True)
+        path.write_text("\n".join(f"def function_{i}_{j}(value):\n    return value * {j}\n"
+                                  for j in range(40)), encoding="utf-8")
+        paths.append(str(path.relative_to(root)))
+    return paths
+
+def legacy_read_file_batch(tool: FileSystemTool, paths: list[str], enable_line_numbers: bool = False) -> str:
+    result = ""
+    for path in paths:
+        try:
+            file_content = tool.read_file(path, enable_line_numbers)
+        except Exception as e:
+            file_content = f"Error: {e}"
+        result += f"""\
+<file_content path="{path}">
+{file_content}
+</file_content>
+"""
+    return result
+
+def measure(name: str, read) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        output = read()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    print(f"{name:>10} | median {median * 1000:9.2f} ms | min {min(timings) * 1000:9.2f} ms"
+          f" | output {len(output) / 1024:8.1f} KB")
+    return median
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file_count", type=int, nargs="?", default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = make_workspace(Path(root), args.file_count)
+        tool = FileSystemTool(root)
+        # the benchmark is about the batch, not about the output limit
+        FileSystemTool.READ_BATCH_MAX_BYTES = 1 << 30
+
+        if args.latency > 0:
+            read_text_lines = file_system.read_text_lines
+            def slow_read_text_lines(*read_args, **read_kwargs):
+                time.sleep(args.latency)
+                return read_text_lines(*read_args, **read_kwargs)
+            file_system.read_text_lines = slow_read_text_lines
+
+        print(f"{args.file_count} files, {args.latency * 1000:.1f} ms latency per read,"
+              f" {FileSystemTool.READ_BATCH_WORKERS} workers")
+        assert legacy_read_file_batch(tool, paths) == tool.read_file_batch(paths)
+        legacy = measure("sequential", lambda: legacy_read_file_batch(tool, paths))
+        concurrent = measure("concurrent", lambda: tool.read_file_batch(paths))
+        print(f"speedup: {legacy / concurrent:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Microbenchmark of the SSE encoding of typical agent event payloads,
+the legacy `format_sse` (str, then encoded to bytes by the server) against `encode_sse`
+and the pre-encoded text chunk template.
+
+Usage:
+    python -m benchmarks.bench_sse
+"""
+import json
+import timeit
+from src.utils import sse
+from src.utils.sse import encode_sse, SseObjectTemplate
+
+NUMBER = 100_000
+
+def legacy_format_sse(data, event=None, event_id=None, retry=None) -> str:
+    buffer = []
+    if event_id is not None:
+        buffer.append(f"id: {event_id}")
+    if event is not None:
+        buffer.append(f"event: {event}")
+    if retry is not None:
+        buffer.append(f"retry: {retry}")
+    if not isinstance(data, str):
+        payload = json.dumps(data, ensure_ascii=False)
+    else:
+        payload = data
+    for line in payload.splitlines():
+        buffer.append(f"data: {line}")
+    return "\n".join(buffer) + "\n\n"
+
+TEXT_CHUNKS = {
+    "short text": "Hello",
+    "ascii text": "The quick brown fox jumps over the lazy dog. ",
+    "cjk text": "这是一个用于测试的中文文本片段，",
+    "code text": "def main():\n    print(\"hello\")\n",
+    "long text": "Lorem ipsum dolor sit amet. " * 20,
+}
+
+OTHER_PAYLOADS = {
+    "usage": ("MESSAGE_CHUNK", {"type": "usage", "max_tokens": 8192,
+                                "input_tokens": 1234, "output_tokens": 56, "total_tokens": 1290}),
+    "tool_call": ("MESSAGE_CHUNK", {"type": "tool_call", "data": {
+        "id": "call_abc", "name": "read_file", "arguments": "{\"path\": \"src/", "index": 0}}),
+    "message end": ("MESSAGE_END", None),
+}
+
+def ns_per_call(fn) -> float:
+    return timeit.timeit(fn, number=NUMBER) / NUMBER * 1e9
+
+def main():
+    print(f"json backend for strings: {'orjson' if sse.orjson is not None else 'json'}")
+    print(f"{'payload':>12} | {'legacy':>9} | {'encode_sse':>10} | {'template':>9} | speedup")
+
+    text_chunk = SseObjectTemplate("MESSAGE_CHUNK", {"type": "text"}, "content")
+    for name, content in TEXT_CHUNKS.items():
+        data = {"type": "text", "content": content}
+        legacy = ns_per_call(lambda: legacy_format_sse(data, event="MESSAGE_CHUNK").encode("utf-8"))
+        generic = ns_per_call(lambda: encode_sse(data, event="MESSAGE_CHUNK"))
+        template = ns_per_call(lambda: text_chunk(content))
+        print(f"{name:>12} | {legacy:7.0f}ns | {generic:8.0f}ns | {template:7.0f}ns | {legacy / template:5.1f}x")
+
+    for name, (event, data) in OTHER_PAYLOADS.items():
+        legacy = ns_per_call(lambda: legacy_format_sse(data, event=event).encode("utf-8"))
+        generic = ns_per_call(lambda: encode_sse(data, event=event))
+        print(f"{name:>12} | {legacy:7.0f}ns | {generic:8.0f}ns | {'-':>9} | {legacy / generic:5.1f}x")
+
+if __name__ == "__main__":
+    main()
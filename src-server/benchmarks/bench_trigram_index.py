@@ -0,0 +1,103 @@
+"""
+Measure search_files with and without the trigram index on a generated tree that grows
+through the given sizes (64 MB, 256 MB and 1 GB by default), made of 16 KB source-like files.
+
+For each size, the trigram index catches up with the new files incrementally, then the searches are timed:
+a rare identifier, a regex around it, a pattern without literal text and a text that is not in the tree.
+The search without the index is timed once per size, as it reads the whole tree.
+
+Usage:
+    python -m benchmarks.bench_trigram_index [--sizes 64 256 1024] [--file-kb 16]
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.trigram_index import TrigramIndex
+from src.agent.tools.workspace_index import WorkspaceIndex
+
+QUERIES = [
+    ("rare literal", "needle_7_handler", True),
+    ("rare regex", r"def needle_\d+_handler\(", False),
+    ("no literal text", r"[A-Z]{3}\d{3}[a-z]{3}", False),
+    ("absent literal", "definitely_not_in_the_tree", True),
+]
+
+def make_vocabulary(rng: random.Random, count: int) -> list[str]:
+    syllables = ["get", "set", "user", "data", "load", "file", "path", "item", "node", "list", "map", "task",
+                 "read", "write", "open", "close", "event", "queue", "cache", "index", "config", "value"]
+    return ["_".join(rng.choices(syllables, k=rng.randint(1, 3))) + str(rng.randint(0, 99)) for _ in range(count)]
+
+def grow_tree(root: Path, rng: random.Random, vocabulary: list[str], file_bytes: int,
+              start: int, target_bytes: int) -> int:
+    """Write files until the tree holds `target_bytes`, returns the number of files"""
+    count = start
+    while count * file_bytes < target_bytes:
+        directory = root / f"package_{count // 1000}" / f"module_{count // 50 % 20}"
+        directory.mkdir(parents=True, exist_ok=True)
+        lines = []
+        size = 0
+        while size < file_bytes:
+            line = "    " + " = ".join(rng.choices(vocabulary, k=rng.randint(2, 6)))
+            lines.append(line)
+            size += len(line) + 1
+        if count % 5000 == 7:
+            lines.append(f"def needle_{count % 10}_handler(request):")
+        (directory / f"file_{count}.py").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        count += 1
+    return count
+
+def timed(run) -> tuple[float, str]:
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024], help="tree sizes in MB")
+    parser.add_argument("--file-kb", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng, 20_000)
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as db_dir:
+        workspace = Path(root)
+        workspace_index = WorkspaceIndex(root, Path(db_dir) / "workspace.db", max_entries=10_000_000)
+        trigram_index = TrigramIndex(workspace_index, Path(db_dir) / "trigrams.db", max_bytes=1 << 40)
+        indexed_tool = FileSystemTool(root, workspace_index=workspace_index, trigram_index=trigram_index)
+        plain_tool = FileSystemTool(root, workspace_index=workspace_index)
+        files = 0
+        for size in args.sizes:
+            start = time.perf_counter()
+            files = grow_tree(workspace, rng, vocabulary, args.file_kb * 1024, files, size * 1024 * 1024)
+            print(f"\n=== {size} MB, {files} files (generated in {time.perf_counter() - start:.1f}s)")
+
+            elapsed, _ = timed(workspace_index.build)
+            print(f"{'workspace index build':>32} | {elapsed * 1000:10.1f} ms")
+            elapsed, _ = timed(lambda: trigram_index.update([""]))
+            trigram_index._store_pending()
+            trigram_index.state = trigram_index.state.READY
+            usage = trigram_index.usage()
+            print(f"{'trigram index catch-up':>32} | {elapsed * 1000:10.1f} ms"
+                  f" | index {usage['bytes'] / 1024 / 1024:.1f} MB")
+
+            changed = [workspace / "package_0" / "module_0" / f"file_{i}.py" for i in range(20)]
+            for path in changed:
+                path.write_text(path.read_text(encoding="utf-8") + "# edited\n", encoding="utf-8")
+            workspace_index.apply_changes(str(path) for path in changed)
+            elapsed, _ = timed(lambda: trigram_index.update(
+                [path.relative_to(workspace).as_posix() for path in changed]))
+            print(f"{'update after editing 20 files':>32} | {elapsed * 1000:10.1f} ms")
+
+            for name, pattern, literal in QUERIES:
+                indexed_time, indexed = timed(lambda: indexed_tool.search_files(pattern, literal=literal))
+                plain_time, plain = timed(lambda: plain_tool.search_files(pattern, literal=literal))
+                assert indexed == plain
+                print(f"{name:>32} | {indexed_time * 1000:10.1f} ms indexed | {plain_time * 1000:10.1f} ms full scan"
+                      f" | {indexed.splitlines()[0]}")
+        trigram_index.stop()
+
+if __name__ == "__main__":
+    main()
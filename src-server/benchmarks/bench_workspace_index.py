@@ -0,0 +1,89 @@
+"""
+Measure the workspace index on a synthetic tree (about 100k entries by default,
+100 packages x 10 modules x 100 files):
+
+- the cold build of the index,
+- the latency of an incremental update, applied directly and picked up from the file system events,
+- a recursive `list_directory` answered from the index and from the disk.
+
+Usage:
+    python -m benchmarks.bench_workspace_index [packages] [modules] [files] [--updates N]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.workspace_index import WorkspaceIndex
+from benchmarks.bench_list_directory import make_tree
+
+def measure(name: str, run, repeat: int = 3):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    print(f"{name:>34} | {min(timings) * 1000:9.1f} ms")
+    return result
+
+def percentiles(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p50 = statistics.median(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:>34} | p50 {p50 * 1000:7.2f} ms | p95 {p95 * 1000:7.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("packages", type=int, nargs="?", default=100)
+    parser.add_argument("modules", type=int, nargs="?", default=10)
+    parser.add_argument("files", type=int, nargs="?", default=100)
+    parser.add_argument("--updates", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, tempfile.TemporaryDirectory() as db_dir:
+        workspace = Path(root)
+        count = make_tree(workspace, args.packages, args.modules, args.files)
+        print(f"{count} entries")
+
+        index = WorkspaceIndex(root, Path(db_dir) / "index.db")
+        measure("cold build", index.build)
+        assert index.count() == count
+
+        applied = []
+        for i in range(args.updates):
+            path = workspace / "package_0" / f"applied_{i}.py"
+            path.write_text("pass", encoding="utf-8")
+            start = time.perf_counter()
+            index.apply_changes([str(path)])
+            applied.append(time.perf_counter() - start)
+        percentiles("apply_changes, one file", applied)
+
+        watched = WorkspaceIndex(root, Path(db_dir) / "watched.db")
+        watched.start()
+        assert watched.wait_ready()
+        observed = []
+        for i in range(args.updates):
+            path = workspace / "package_1" / f"watched_{i}.py"
+            start = time.perf_counter()
+            path.write_text("pass", encoding="utf-8")
+            while watched.get(path.relative_to(workspace).as_posix()) is None:
+                time.sleep(0.001)
+            observed.append(time.perf_counter() - start)
+        watched.stop()
+        percentiles("file event to query", observed)
+
+        FileSystemTool.LIST_DIRECTORY_MAX_ENTRIES = count + 2 * args.updates
+        indexed_tool = FileSystemTool(root, workspace_index=index)
+        disk_tool = FileSystemTool(root)
+        indexed = measure("list_directory, index", lambda: indexed_tool.list_directory(".", recursive=True))
+        disk = measure("list_directory, disk", lambda: disk_tool.list_directory(".", recursive=True))
+        FileSystemTool.LIST_DIRECTORY_MAX_ENTRIES = 2000
+        measure("list_directory, index, 2000", lambda: indexed_tool.list_directory(".", recursive=True))
+        measure("list_directory, disk, 2000", lambda: disk_tool.list_directory(".", recursive=True))
+        # the watched files were not applied to the first index
+        assert indexed.count("\n") == disk.count("\n") - args.updates
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,7 @@
-from src.main import main
+import multiprocessing
 
 if __name__ == "__main__":
+    # the document converter workers are spawned from the frozen executable
+    multiprocessing.freeze_support()
+    from src.main import main
     main()
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections.abc import AsyncGenerator, Generator
+from dataclasses import dataclass
+from liteai_sdk import TextChunk
+from .types import AgentEvent, MessageChunkEvent
+from ..utils import EventChannel, ChannelClosedError
+
+@dataclass
+class CoalesceStats:
+    """Metrics of the text chunk coalescing"""
+    frames_in: int = 0
+    frames_out: int = 0
+    # sum and max of the time text chunks were held back, in seconds
+    total_delay: float = 0.0
+    max_delay: float = 0.0
+
+    @property
+    def frames_saved(self) -> int:
+        return self.frames_in - self.frames_out
+
+    @property
+    def mean_delay(self) -> float:
+        return self.total_delay / self.frames_in if self.frames_in else 0.0
+
+class TextChunkCoalescer:
+    """
+    Merge adjacent text chunk events that arrive within `window` seconds,
+    or until the merged text reaches `max_bytes` bytes (UTF-8).
+    Any other event flushes the pending text first and is passed through immediately.
+    A `window` of 0 disables the coalescing.
+    """
+
+    def __init__(self,
+                 window: float = 0.005,
+                 max_bytes: int = 4096,
+                 stats: CoalesceStats | None = None):
+        self.window = window
+        self.max_bytes = max_bytes
+        self.stats = stats if stats is not None else CoalesceStats()
+        self._texts: list[str] = []
+        self._arrivals: list[float] = []
+        self._size = 0
+
+    @property
+    def _deadline(self) -> float:
+        return self._arrivals[0] + self.window
+
+    @staticmethod
+    def _is_text_chunk(event: AgentEvent) -> bool:
+        return isinstance(event, MessageChunkEvent) and isinstance(event.chunk, TextChunk)
+
+    def _flush(self) -> MessageChunkEvent:
+        now = time.perf_counter()
+        stats = self.stats
+        for arrival in self._arrivals:
+            delay = now - arrival
+            stats.total_delay += delay
+            stats.max_delay = max(stats.max_delay, delay)
+        stats.frames_in += len(self._texts)
+        stats.frames_out += 1
+
+        content = self._texts[0] if len(self._texts) == 1 else "".join(self._texts)
+        self._texts.clear()
+        self._arrivals.clear()
+        self._size = 0
+        return MessageChunkEvent(TextChunk(content))
+
+    def _accept(self, event: AgentEvent) -> list[AgentEvent]:
+        """Receive an event and return the events that are ready to be sent"""
+        if not self._is_text_chunk(event):
+            if not self._texts:
+                return [event]
+            return [self._flush(), event]
+
+        content = event.chunk.content # type: ignore
+        self._texts.append(content)
+        self._arrivals.append(time.perf_counter())
+        self._size += len(content.encode("utf-8"))
+        if self._size >= self.max_bytes:
+            return [self._flush()]
+        return []
+
+    def iter(self, event_channel: EventChannel[AgentEvent]) -> Generator[AgentEvent]:
+        if self.window <= 0:
+            yield from event_channel
+            return
+
+        while True:
+            try:
+                if self._texts:
+                    event = event_channel.get(timeout=max(0.0, self._deadline - time.perf_counter()))
+                else:
+                    event = event_channel.get()
+            except TimeoutError:
+                yield self._flush()
+                continue
+            except ChannelClosedError:
+                if self._texts:
+                    yield self._flush()
+                return
+            yield from self._accept(event)
+
+    async def iter_async(self, event_channel: EventChannel[AgentEvent]) -> AsyncGenerator[AgentEvent]:
+        if self.window <= 0:
+            async for event in event_channel:
+                yield event
+            return
+
+        while True:
+            try:
+                if self._texts:
+                    event = await asyncio.wait_for(event_channel.get_async(),
+                                                   max(0.0, self._deadline - time.perf_counter()))
+                else:
+                    event = await event_channel.get_async()
+            except TimeoutError:
+                yield self._flush()
+                continue
+            except ChannelClosedError:
+                if self._texts:
+                    yield self._flush()
+                return
+            for ready_event in self._accept(event):
+                yield ready_event
@@ -1,5 +1,5 @@
 import platform
-from .prompts.instruction import BASE_INSTRUCTION
+from .prompts.instruction import BASE_INSTRUCTION, SINGLE_TOOL_CALL_CONSTRAINT, PARALLEL_TOOL_CALLS_CONSTRAINT
 from ..db.models import agent as agent_models,\
                         provider as provider_models,\
                         workspace as workspace_models
@@ -13,6 +13,9 @@ class AgentContext:
         self._system_instruction = BASE_INSTRUCTION.format(
             os_platform=platform.system(),
             user_language="zh-CN", # TODO: Get from system settings
+            tool_call_constraint=PARALLEL_TOOL_CALLS_CONSTRAINT
+                                 if self.agent.parallel_tool_calls
+                                 else SINGLE_TOOL_CALL_CONSTRAINT,
             user_custom_instruction=self.agent.system_prompt
         )
 
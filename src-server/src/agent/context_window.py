@@ -0,0 +1,176 @@
+import json
+from dataclasses import dataclass
+from litellm import token_counter
+from loguru import logger
+from liteai_sdk import LLM, AssistantMessage, ChatMessage, LlmRequestParams,\
+                       SystemMessage, ToolLike, ToolMessage, UserMessage
+from liteai_sdk.tool.prepare import prepare_tools
+from .prompts import HISTORY_SUMMARY_INSTRUCTION, HISTORY_SUMMARY_PREFIX
+from .token_ledger import TokenLedger
+from ..db.models.task import CompactedHistory, TaskMessage
+
+@dataclass
+class CompactionPolicy:
+    """When and how the task history is compacted"""
+    # compact before a call whose request exceeds this share of the context window
+    trigger_ratio: float = 0.8
+    # and compact until the request is below this share
+    target_ratio: float = 0.5
+    # number of the newest steps (a user message, or an assistant message
+    # with its tool results) that are always kept verbatim
+    keep_recent_steps: int = 6
+    # results of older tool calls longer than this (in characters) are elided
+    elide_tool_results_over: int = 256
+    # summarize the early steps when eliding tool results is not enough
+    summarize: bool = True
+    # model used to write the summary, the task model is used if it is None
+    summary_model: str | None = None
+    # the text of each message is truncated to this length (in characters) in the summary request
+    summary_input_message_limit: int = 4000
+    # tokens expected for the summary, the steps to summarize are chosen before it is written
+    summary_tokens: int = 1000
+
+def _split_steps(messages: list[TaskMessage]) -> list[int]:
+    """Return the start index of each step, tool results belong to the previous assistant message"""
+    return [index for index, message in enumerate(messages)
+            if not isinstance(message, ToolMessage)]
+
+def _elide_tool_results(messages: list[TaskMessage], limit: int) -> list[TaskMessage]:
+    elided = []
+    for message in messages:
+        if (isinstance(message, ToolMessage) and
+            message.result is not None and
+            len(message.result) > limit):
+            message = message.model_copy(update={
+                "result": f"[System Message] The result of this tool call ({len(message.result)} characters) "
+                           "was elided to save context, call the tool again if it is still needed."
+            })
+        elided.append(message)
+    return elided
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"... ({len(text) - limit} characters truncated)"
+
+def _render_transcript(messages: list[TaskMessage], limit: int) -> str:
+    """Render messages as plain text for the summary request"""
+    lines = []
+    for message in messages:
+        match message:
+            case UserMessage(content=content):
+                text = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+                lines.append(f"## User\n{_truncate(text, limit)}")
+            case AssistantMessage(content=content, tool_calls=tool_calls):
+                parts = [content] if content else []
+                for tool_call in tool_calls or []:
+                    function = tool_call.get("function") or {}
+                    parts.append(f"(called tool `{function.get('name')}` with {function.get('arguments')})")
+                lines.append(f"## Assistant\n{_truncate(chr(10).join(parts), limit)}")
+            case ToolMessage(name=name, result=result, error=error):
+                text = f"error: {error}" if error is not None else (result or "")
+                lines.append(f"## Tool result of `{name}`\n{_truncate(text, limit)}")
+    return "\n\n".join(lines)
+
+class ContextWindowManager:
+    """
+    Track the token count of the request assembled for a task,
+    and compact the history before it grows past the context window of the model.
+
+    The full transcript is never changed, the compaction produces a `CompactedHistory`,
+    a view that replaces the leading part of the transcript:
+    old tool results are elided first, if that is not enough the early steps are summarized.
+    The newest steps are always kept verbatim.
+    """
+    _logger = logger.bind(name="ContextWindowManager")
+
+    def __init__(self,
+                 llm: LLM,
+                 model: str,
+                 context_size: int,
+                 policy: CompactionPolicy,
+                 fixed_messages: list[ChatMessage],
+                 tools: list[ToolLike],
+                 ledger: TokenLedger | None = None):
+        self._llm = llm
+        self._model = model
+        self.context_size = context_size
+        self.policy = policy
+        self.ledger = ledger if ledger is not None else TokenLedger(model)
+        # tokens of the parts of the request that never change
+        self.fixed_tokens = self.ledger.count_messages(fixed_messages) +\
+                            token_counter(model=model, text=json.dumps(prepare_tools(tools)))
+
+    def count_request_tokens(self, view: list[TaskMessage]) -> int:
+        return self.fixed_tokens + self.ledger.count_messages(view)
+
+    @property
+    def request_tokens(self) -> int:
+        """Tokens of the request built from the view last passed to `ledger.sync`"""
+        return self.fixed_tokens + self.ledger.total
+
+    async def _summarize(self, messages: list[TaskMessage]) -> UserMessage:
+        transcript = _render_transcript(messages, self.policy.summary_input_message_limit)
+        response = await self._llm.generate_text(LlmRequestParams(
+            model=self.policy.summary_model or self._model,
+            messages=[
+                SystemMessage(content=HISTORY_SUMMARY_INSTRUCTION),
+                UserMessage(content=transcript),
+            ],
+        ))
+        summary = response[0]
+        assert isinstance(summary, AssistantMessage)
+        return UserMessage(content=HISTORY_SUMMARY_PREFIX + (summary.content or ""))
+
+    async def compact(self,
+                      transcript: list[TaskMessage],
+                      history: CompactedHistory | None
+                      ) -> CompactedHistory | None:
+        """
+        Compact the history if the request built from it exceeds the trigger share of the window.
+        Returns the new compacted history, or the given one if no compaction is needed or possible.
+        """
+        policy = self.policy
+        view = history.apply(transcript) if history else transcript
+        tokens = self.count_request_tokens(view)
+        if tokens <= self.context_size * policy.trigger_ratio:
+            return history
+
+        target = self.context_size * policy.target_ratio
+        compacted_prefix = history.messages if history else []
+        compacted_length = history.source_length if history else 0
+        step_starts = [index for index in _split_steps(transcript) if index > compacted_length]
+        # from the most steps kept verbatim to the fewest
+        boundaries = [step_starts[-keep_steps] for keep_steps in range(policy.keep_recent_steps, 0, -1)
+                      if len(step_starts) >= keep_steps]
+
+        def elided(boundary: int) -> CompactedHistory:
+            return CompactedHistory(
+                messages=[*compacted_prefix,
+                          *_elide_tool_results(transcript[compacted_length:boundary],
+                                               policy.elide_tool_results_over)],
+                source_length=boundary)
+
+        best = history
+        for boundary in boundaries:
+            best = elided(boundary)
+            if self.count_request_tokens(best.apply(transcript)) <= target:
+                break
+        else:
+            if policy.summarize and boundaries:
+                # the summary is written once, for the most steps kept verbatim that leave room for it
+                boundary = next((boundary for boundary in boundaries
+                                 if self.count_request_tokens(transcript[boundary:]) + policy.summary_tokens <= target),
+                                boundaries[-1])
+                try:
+                    summary = await self._summarize(elided(boundary).messages)
+                except Exception as e:
+                    self._logger.warning(f"Failed to summarize the history: {e}")
+                else:
+                    best = CompactedHistory(messages=[summary], source_length=boundary)
+
+        if best is not history:
+            self._logger.info("Compacted {} messages, request tokens {} -> {}",
+                              best.source_length, tokens,
+                              self.count_request_tokens(best.apply(transcript)))
+        return best
@@ -0,0 +1,66 @@
+import dataclasses
+from typing import Any
+from liteai_sdk import AssistantMessage, LlmProviders, UsageChunk
+from litellm.types.utils import Usage as LiteLlmUsage
+
+# Providers that only cache the prompt prefix up to an explicit breakpoint,
+# the others (OpenAI, DeepSeek, ...) cache the longest matching prefix automatically.
+PROVIDERS_WITH_CACHE_BREAKPOINTS = {
+    LlmProviders.ANTHROPIC,
+    LlmProviders.BEDROCK,
+}
+
+# The first breakpoint covers the tool definitions and the system instruction,
+# the second one covers the whole history, which is the prefix of the next turn.
+_CACHE_CONTROL_INJECTION_POINTS = [
+    {"location": "message", "role": "system"},
+    {"location": "message", "index": -1},
+]
+
+def cache_breakpoint_args(provider: LlmProviders) -> dict[str, Any] | None:
+    """Extra request arguments that place the cache breakpoints for the provider"""
+    if provider not in PROVIDERS_WITH_CACHE_BREAKPOINTS:
+        return None
+    return {"cache_control_injection_points": _CACHE_CONTROL_INJECTION_POINTS}
+
+def get_cached_tokens(usage: LiteLlmUsage | dict[str, Any] | None) -> int:
+    """Read the count of prompt tokens served from the provider cache"""
+    if usage is None:
+        return 0
+    if not isinstance(usage, dict):
+        usage = usage.model_dump()
+    details = usage.get("prompt_tokens_details") or {}
+    cached_tokens = details.get("cached_tokens")
+    if cached_tokens is None:
+        # Anthropic style usage
+        cached_tokens = usage.get("cache_read_input_tokens")
+    return cached_tokens or 0
+
+@dataclasses.dataclass
+class CachedUsageChunk(UsageChunk):
+    """Usage chunk with the count of cached prompt tokens"""
+    cached_tokens: int = 0
+
+def complete_usage(usage_chunk: UsageChunk, assistant_message: AssistantMessage) -> CachedUsageChunk:
+    """
+    Merge the streamed usage chunk with the usage of the complete message,
+    and fill the usage into the message if the stream did not.
+    """
+    cached_tokens = getattr(usage_chunk, "cached_tokens", None)
+    if cached_tokens is None:
+        cached_tokens = get_cached_tokens(assistant_message.usage)
+
+    if assistant_message.usage is None:
+        assistant_message.usage = LiteLlmUsage(
+            prompt_tokens=usage_chunk.input_tokens,
+            completion_tokens=usage_chunk.output_tokens,
+            total_tokens=usage_chunk.total_tokens,
+            prompt_tokens_details={"cached_tokens": cached_tokens},
+        )
+
+    return CachedUsageChunk(
+        input_tokens=usage_chunk.input_tokens,
+        output_tokens=usage_chunk.output_tokens,
+        total_tokens=usage_chunk.total_tokens,
+        cached_tokens=cached_tokens,
+    )
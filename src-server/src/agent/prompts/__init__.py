@@ -1 +1,2 @@
-from .instruction import BASE_INSTRUCTION
+from .instruction import BASE_INSTRUCTION, SINGLE_TOOL_CALL_CONSTRAINT, PARALLEL_TOOL_CALLS_CONSTRAINT
+from .compaction import HISTORY_SUMMARY_INSTRUCTION, HISTORY_SUMMARY_PREFIX
@@ -0,0 +1,16 @@
+HISTORY_SUMMARY_INSTRUCTION = """\
+You are compacting the early part of a conversation between a user and an AI assistant
+that is working on a task with tools, so that the conversation fits in the context window.
+
+Write a concise summary of the conversation below, which will replace it.
+The summary must keep:
+
+- The user's goals, requirements and preferences, and any decisions that were made.
+- What the assistant has already done, including the tools called and the important findings from their results.
+- File paths, names, identifiers and values that may be needed later.
+- Open questions and the work that is still pending.
+
+Write the summary in the language of the conversation, do not add any comments about the summary itself.
+"""
+
+HISTORY_SUMMARY_PREFIX = "[System Message] The earlier part of this conversation was compacted, here is its summary:\n\n"
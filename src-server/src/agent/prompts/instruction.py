@@ -33,7 +33,7 @@ To ensure the best user experience within the desktop UI:
 ## 4. Tool Usage Guidelines
 
 - Continue using tool in every response. Once you can confirm that the task is complete, use `finish_task` tool to present the result of your work to the user.
-- **Constraint**: You are strictly limited to generating exactly one tool call per turn.
+{tool_call_constraint}
 - **Error Handling & Fallback**: If a required tool fails continuously (e.g., 3 consecutive failed attempts) or returns errors that prevent progress, do NOT continue to retry the same operation indefinitely. Instead, you MUST use the `ask_user` tool. In the message, clearly state which tool is failing and request the user to check the tool's availability or configuration.
 
 ## 5. Safety & Security
@@ -51,3 +51,11 @@ To ensure the best user experience within the desktop UI:
 
 [END OF USER CUSTOM INSTRUCTIONS]
 """
+
+SINGLE_TOOL_CALL_CONSTRAINT = """\
+- **Constraint**: You are strictly limited to generating exactly one tool call per turn."""
+
+PARALLEL_TOOL_CALLS_CONSTRAINT = """\
+- **Parallel Tool Calls**: You may generate multiple tool calls in one turn when they are independent of each other, \
+for example reading several files or listing several directories at once. Read-only tool calls are executed concurrently. \
+`ask_user` and `finish_task` must always be the last tool call of a turn."""
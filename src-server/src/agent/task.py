@@ -1,25 +1,33 @@
 import asyncio
-import queue
 import threading
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 import time
 from typing import Any, Literal, cast
 from loguru import logger
 from liteai_sdk import LLM, AssistantMessage, LlmRequestParams, MessageChunk,\
-                       SystemMessage, ToolMessage, UserMessage, execute_tool_sync
+                       SystemMessage, ToolCallChunk, ToolMessage, UsageChunk, UserMessage
 from .context import AgentContext
+from .context_window import ContextWindowManager, CompactionPolicy
+from .token_ledger import TokenLedger
+from .chunk_coalescer import TextChunkCoalescer, CoalesceStats
+from .prompt_cache import cache_breakpoint_args, complete_usage
+from .tool_executor import use_tool_executor
+from .tool_speculator import ToolCallSpeculator
 from .tools import finish_task, ask_user, FileSystemTool
+from .tools.workspace_index import use_workspace_index
+from .tools.trigram_index import use_trigram_index
+from .tools.document_index import use_document_index
 from .types import (
     AgentEvent,
     MessageChunkEvent, MessageStartEvent, MessageEndEvent,
     TaskDoneEvent, TaskInterruptedEvent,
-    ToolExecutedEvent,
+    ToolExecutedEvent, ToolProgressEvent,
     ToolRequirePermissionEvent, ToolRequireUserResponseEvent,
     ErrorEvent
 )
 from ..services.task import TaskService
 from ..db.models import task as task_models
-from ..utils import use_async_task_pool, TaskNotFoundError as AsyncTaskNotFoundError
+from ..utils import use_async_task_pool, EventChannel
 
 class ToolCallNotFoundError(Exception):
     tool_call_id: str
@@ -27,6 +35,28 @@ class ToolCallNotFoundError(Exception):
 class AgentTask:
     _logger = logger.bind(name="AgentTask")
 
+    # Adjacent text chunks arrived within this window (in seconds)
+    # or up to this size (in bytes) are merged into one event,
+    # set the window to 0 to disable the coalescing.
+    CHUNK_COALESCE_WINDOW = 0.005
+    CHUNK_COALESCE_MAX_BYTES = 4096
+    # Start read-only tool calls as soon as their arguments are streamed
+    SPECULATIVE_TOOL_EXECUTION = True
+    # Tool calls running longer than these (in seconds) are cancelled,
+    # the timeout is reported to the model as the tool error.
+    TOOL_TIMEOUTS: dict[str, float | None] = {
+        "read_file": 120,
+        "list_directory": 60,
+        "search_files": 120,
+        "find_files": 60,
+        "search_documents": 60,
+    }
+    DEFAULT_TOOL_TIMEOUT: float | None = 300
+    # Interval (in seconds) of the progress events while a tool is running
+    TOOL_PROGRESS_INTERVAL = 1.0
+    # How the history is compacted when it outgrows the context window of the model
+    COMPACTION_POLICY = CompactionPolicy()
+
     def __init__(self, task: task_models.Task):
         self._lock = threading.Lock()
         ctx = self._ctx = AgentContext(task.workspace_id, task.agent_id)
@@ -36,86 +66,209 @@ class AgentTask:
             api_key=ctx.provider.api_key)
         self.task_id = task.id
         self.model_id = ctx.model.name
+        # Built once, so that the request prefix is byte-stable across turns
+        # and can be served from the provider prompt cache.
+        self._system_message = SystemMessage(content=ctx.system_instruction)
+        self._cache_args = cache_breakpoint_args(ctx.provider.type)
         self._is_running = True
         self._current_task_id = None
+        self._current_channel: EventChannel | None = None
+        self._tool_speculator: ToolCallSpeculator | None = None
         self._messages = task.messages
+        self._compacted_history = task.compacted_history
+        self.coalesce_stats = CoalesceStats()
         self._init_builtin_tools()
+        self._context_window = ContextWindowManager(
+            self.llm,
+            self.model_id,
+            ctx.model.context_size,
+            self.COMPACTION_POLICY,
+            fixed_messages=[self._system_message],
+            tools=self._tools,
+            ledger=TokenLedger(self.model_id))
+        self._update_context_tokens()
 
     def __del__(self):
         self.stop()
         self.persist()
 
     def _init_builtin_tools(self):
-        self._file_system_tool = FileSystemTool(self._ctx.workspace.directory)
+        workspace = self._ctx.workspace
+        workspace_index = use_workspace_index(workspace.directory)
+        self._file_system_tool = FileSystemTool(
+            workspace.directory,
+            workspace_index=workspace_index,
+            trigram_index=use_trigram_index(workspace_index, workspace.search_index_max_bytes),
+            document_index=use_document_index(workspace_index))
+        # tools that can be safely executed concurrently or speculatively
+        self._read_only_tools = {
+            "read_file": self._file_system_tool.read_file,
+            "list_directory": self._file_system_tool.list_directory,
+            "search_files": self._file_system_tool.search_files,
+            "find_files": self._file_system_tool.find_files,
+            "search_documents": self._file_system_tool.search_documents,
+        }
+        self._tools = [
+            ask_user,
+            finish_task,
+            self._file_system_tool.read_file,
+            self._file_system_tool.list_directory,
+            self._file_system_tool.search_files,
+            self._file_system_tool.find_files,
+            self._file_system_tool.search_documents,
+        ]
+
+    def _history_view_locked(self) -> list[task_models.TaskMessage]:
+        if self._compacted_history is None:
+            return list(self._messages)
+        return self._compacted_history.apply(self._messages)
+
+    def _history_view(self) -> list[task_models.TaskMessage]:
+        """The messages sent to the model, with the compacted history applied"""
+        with self._lock:
+            return self._history_view_locked()
+
+    def _update_context_tokens(self):
+        """Refresh the token total of the next request, only new or changed messages are counted"""
+        with self._lock:
+            self._context_window.ledger.sync(self._history_view_locked())
+
+    @property
+    def context_tokens(self) -> int:
+        """Estimated tokens of the next request, without counting anything"""
+        return self._context_window.request_tokens
+
+    @property
+    def context_size(self) -> int:
+        return self._context_window.context_size
+
+    async def _compact_history(self):
+        """Compact the history if the next request would not fit in the context window"""
+        with self._lock:
+            transcript = list(self._messages)
+            history = self._compacted_history
+        try:
+            history = await self._context_window.compact(transcript, history)
+        except Exception as e:
+            self._logger.exception(f"Failed to compact the history: {e}")
+            return
+        with self._lock:
+            self._compacted_history = history
+        self._update_context_tokens()
 
     def _request_param_factory(self) -> LlmRequestParams:
         return LlmRequestParams(
             model=self.model_id,
-            messages=[
-                SystemMessage(content=self._ctx.system_instruction),
-                *self._messages,
-            ],
-            tools=[
-                ask_user,
-                finish_task,
-                self._file_system_tool.read_file,
-                self._file_system_tool.list_directory,
-            ],
+            messages=[self._system_message, *self._history_view()],
+            tools=list(self._tools),
             tool_choice="required",
+            extra_args=self._cache_args,
         )
 
-    async def _create_llm_call(self,
-                chunk_queue: queue.Queue[MessageChunkEvent
-                                       | MessageStartEvent
-                                       | MessageEndEvent
-                                       | TaskInterruptedEvent
-                                       | ErrorEvent]
-                ) -> ToolMessage | None:
+    async def _create_llm_call(self, event_channel: EventChannel[AgentEvent]) -> list[ToolMessage]:
         """
-        Create LLM API call, put message chunks into chunk_queue and return the first tool call message
+        Create LLM API call, put message chunks into event_channel and return the tool call messages.
+        Only the first tool call is kept unless the agent allows parallel tool calls.
         """
         assistant_message: AssistantMessage | None = None
+        usage_chunk: UsageChunk | None = None
+        speculator = self._tool_speculator = ToolCallSpeculator(
+            self._read_only_tools,
+            {name: self._get_tool_timeout(name) for name in self._read_only_tools}
+        ) if self.SPECULATIVE_TOOL_EXECUTION else None
         try:
             stream, message_queue = await self.llm.stream_text(self._request_param_factory())
-            chunk_queue.put_nowait(MessageStartEvent())
+            event_channel.put(MessageStartEvent())
             async for chunk in stream:
-                chunk_queue.put_nowait(MessageChunkEvent(chunk))
+                if isinstance(chunk, UsageChunk):
+                    # sent with the cached token count once the message is complete
+                    usage_chunk = chunk
+                    continue
+                event_channel.put(MessageChunkEvent(chunk))
+                if speculator is not None and isinstance(chunk, ToolCallChunk):
+                    speculator.feed(chunk)
 
             # Since we did not set `execute_tools` flag,
             # there will be only one assistant message in the queue
             first_message = await message_queue.get()
             assert type(first_message) == AssistantMessage
             assistant_message = first_message
-            chunk_queue.put_nowait(MessageEndEvent())
+            if usage_chunk is not None:
+                event_channel.put(MessageChunkEvent(complete_usage(usage_chunk, assistant_message)))
+            event_channel.put(MessageEndEvent())
         except asyncio.CancelledError:
-            chunk_queue.put_nowait(TaskInterruptedEvent())
+            if speculator is not None:
+                speculator.cancel_all()
+            event_channel.put(TaskInterruptedEvent())
             raise
         except Exception as e:
             self._logger.exception(f"Failed to create llm call: {e}")
-            chunk_queue.put_nowait(ErrorEvent(error=e))
+            event_channel.put(ErrorEvent(error=e))
 
         if assistant_message is None:
-            return None
+            if speculator is not None:
+                speculator.cancel_all()
+            return []
+
+        if assistant_message.tool_calls and not self._ctx.agent.parallel_tool_calls:
+            # Only keep the first tool call
+            assistant_message.tool_calls = assistant_message.tool_calls[:1]
+        partial_tool_messages = assistant_message.get_partial_tool_messages()\
+                                if assistant_message.tool_calls else None
 
         with self._lock:
             self._messages.append(assistant_message)
+            if partial_tool_messages:
+                self._messages.extend(partial_tool_messages)
+        self._update_context_tokens()
+        return partial_tool_messages or []
 
-        if not assistant_message.tool_calls or len(assistant_message.tool_calls) == 0:
-            return None
+    def _get_tool_timeout(self, tool_name: str) -> float | None:
+        return self.TOOL_TIMEOUTS.get(tool_name, self.DEFAULT_TOOL_TIMEOUT)
 
-        # Only keep the first tool call
-        assistant_message.tool_calls = assistant_message.tool_calls[:1]
-        partial_tool_messages = assistant_message.get_partial_tool_messages()
-        if partial_tool_messages is None or len(partial_tool_messages) == 0:
-            return None
+    async def _execute_tool_call(self,
+            tool_call_message: ToolMessage,
+            event_channel: EventChannel[AgentEvent]) -> ToolExecutedEvent:
+        """
+        Execute the tool on the tool executor and fill the result into the message,
+        a progress event is put into event_channel periodically while the tool is running.
+        """
+        execution = self._tool_speculator.take(tool_call_message)\
+                    if self._tool_speculator is not None else None
+        if execution is None:
+            execution = asyncio.create_task(use_tool_executor().execute(
+                tool_call_message.tool_def,
+                tool_call_message.arguments,
+                self._get_tool_timeout(tool_call_message.name)))
 
-        tool_call_message = partial_tool_messages[0]
-        with self._lock:
-            self._messages.append(tool_call_message)
-        return tool_call_message
+        result, error = None, None
+        started_at = time.perf_counter()
+        try:
+            while not execution.done():
+                await asyncio.wait((execution,), timeout=self.TOOL_PROGRESS_INTERVAL)
+                if not execution.done():
+                    event_channel.put(ToolProgressEvent(
+                        tool_call_id=tool_call_message.id,
+                        elapsed=time.perf_counter() - started_at))
+            result = execution.result()
+        except asyncio.CancelledError:
+            # propagates the cancellation to the running tool
+            execution.cancel()
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
 
-    def _process_tool_call_to_event(self,
-            tool_call_message: ToolMessage
+        tool_call_message.result = result
+        tool_call_message.error = error
+
+        return ToolExecutedEvent(
+            tool_call_id=tool_call_message.id,
+            result=result if error is None else None
+        )
+
+    async def _process_tool_call_to_event(self,
+            tool_call_message: ToolMessage,
+            event_channel: EventChannel[AgentEvent]
             ) -> ToolExecutedEvent\
                | ToolRequireUserResponseEvent\
                | ToolRequirePermissionEvent | None:
@@ -129,40 +282,70 @@ class AgentTask:
         if tool_call_message.tool_def is None:
             return None
 
-        result, error = None, None
+        return await self._execute_tool_call(tool_call_message, event_channel)
+
+    async def _process_tool_calls(self,
+            tool_call_messages: list[ToolMessage],
+            event_channel: EventChannel[AgentEvent]) -> bool:
+        """
+        Process the tool calls of one turn in order and put one event per call into event_channel.
+        Consecutive read-only tool calls are executed concurrently,
+        any other tool call waits for the previous ones to finish.
+
+        Returns:
+            False if the task should stop and wait for the user
+        """
+        pending: list[asyncio.Task[ToolExecutedEvent]] = []
+
+        async def flush_pending():
+            for pending_task in pending:
+                event_channel.put(await pending_task)
+            pending.clear()
+
         try:
-            result = execute_tool_sync(tool_call_message.tool_def,
-                                      tool_call_message.arguments)
-        except Exception as e:
-            error = f"{type(e).__name__}: {str(e)}"
+            for index, tool_call_message in enumerate(tool_call_messages):
+                if tool_call_message.tool_def in self._read_only_tools.values():
+                    pending.append(asyncio.create_task(
+                        self._execute_tool_call(tool_call_message, event_channel)))
+                    continue
 
-        tool_call_message.result = result
-        tool_call_message.error = error
+                await flush_pending()
+                tool_event = await self._process_tool_call_to_event(tool_call_message, event_channel)
+                if tool_event is None:
+                    continue
 
-        return ToolExecutedEvent(
-            tool_call_id=tool_call_message.id,
-            result=result if error is None else None
-        )
+                event_channel.put(tool_event)
+                if isinstance(tool_event, (ToolRequirePermissionEvent, ToolRequireUserResponseEvent)):
+                    for skipped_message in tool_call_messages[index + 1:]:
+                        skipped_message.result = "[System Message] This tool call is skipped "\
+                                                 "since a previous tool call requires user response."
+                    return False
+            await flush_pending()
+        finally:
+            for pending_task in pending:
+                pending_task.cancel()
+            self._update_context_tokens()
+            if self._tool_speculator is not None:
+                self._logger.debug("Speculative tool execution: {} hits, {} misses",
+                                   self._tool_speculator.hits, self._tool_speculator.misses)
+                self._tool_speculator.cancel_all()
+        return True
 
     @property
     def is_running(self) -> bool:
         return self._is_running
 
     def append_message(self, message: UserMessage):
-        try:
-            last_message = self._messages[-1]
-        except IndexError:
-            last_message = None
-
-        if last_message and\
-           last_message.role == "tool" and\
-           last_message.result is None and \
-           last_message.error is None:
-            # If the previous tool call is not finished,
-            # we consider it as ignored by user.
-            last_message.result = "[System Message] User ignored this tool call."
+        for last_message in reversed(self._messages):
+            if last_message.role != "tool":
+                break
+            if last_message.result is None and last_message.error is None:
+                # If the previous tool call is not finished,
+                # we consider it as ignored by user.
+                last_message.result = "[System Message] User ignored this tool call."
 
         self._messages.append(message)
+        self._update_context_tokens()
 
     def set_tool_call_result(self, tool_call_id: str, result: str):
         """
@@ -177,59 +360,103 @@ class AgentTask:
                 break
         raise ToolCallNotFoundError(tool_call_id)
 
-    def run(self) -> Generator[AgentEvent]:
+    async def _run_loop(self, event_channel: EventChannel[AgentEvent]):
         """
-        Run agent task and generate event stream
-
-        Yields:
-            AgentEvent: Various events during task execution
+        Drive the agent turns on the AsyncTaskPool loop and put all events into event_channel.
+        The channel is always closed when this coroutine exits, which wakes up the consumer.
         """
-        async_task_pool = use_async_task_pool()
-
-        while self._is_running:
-            chunk_queue = queue.Queue()
-            self._current_task_id = async_task_pool.add_task(
-                self._create_llm_call(chunk_queue)
-            )
-
+        try:
             while self._is_running:
-                try:
-                    chunk = chunk_queue.get(timeout=0.3)
-                except queue.Empty:
-                    continue
+                await self._compact_history()
+                tool_call_messages = await self._create_llm_call(event_channel)
+                if len(tool_call_messages) == 0:
+                    # Exception occurred during LLM call
+                    break
 
-                yield chunk
-                if isinstance(chunk, (MessageEndEvent, TaskInterruptedEvent, ErrorEvent)):
+                if not await self._process_tool_calls(tool_call_messages, event_channel):
                     break
 
-            try:
-                tool_call_message = async_task_pool.wait_result(self._current_task_id)
-            except AsyncTaskNotFoundError:
-                # Task cancelled by user
-                break
+            event_channel.put(TaskDoneEvent())
+        except Exception as e:
+            # nobody waits for the result of this coroutine, report the error to the consumer
+            self._logger.exception(f"Failed to run the task: {e}")
+            event_channel.put(ErrorEvent(error=e))
+        finally:
+            event_channel.close()
+
+    def _start(self) -> EventChannel[AgentEvent]:
+        event_channel = EventChannel[AgentEvent]()
+        with self._lock:
+            if not self._is_running:
+                event_channel.close()
+                return event_channel
+            self._current_channel = event_channel
+            self._current_task_id = use_async_task_pool().add_task(
+                self._run_loop(event_channel)
+            )
+        return event_channel
+
+    def _create_coalescer(self) -> TextChunkCoalescer:
+        return TextChunkCoalescer(window=self.CHUNK_COALESCE_WINDOW,
+                                  max_bytes=self.CHUNK_COALESCE_MAX_BYTES,
+                                  stats=self.coalesce_stats)
+
+    def _finish(self, event_channel: EventChannel[AgentEvent]):
+        stats = self.coalesce_stats
+        self._logger.debug("Coalesced {} text frames into {} ({} saved), "
+                           "added latency mean {:.3f} ms, max {:.3f} ms",
+                           stats.frames_in, stats.frames_out, stats.frames_saved,
+                           stats.mean_delay * 1000, stats.max_delay * 1000)
+
+        event_channel.close()
+        if self._current_task_id is not None:
+            # If the consumer left before the producer finished,
+            # e.g. the client disconnected, this propagates the cancellation,
+            # otherwise it only drops the finished task from the pool.
+            use_async_task_pool().cancel(self._current_task_id)
 
-            if tool_call_message is None:
-                # Exception occurred during LLM call
-                break
+    def run(self) -> Generator[AgentEvent]:
+        """
+        Run agent task and generate event stream
 
-            tool_event = self._process_tool_call_to_event(tool_call_message)
-            if tool_event is not None:
-                yield tool_event
-                if isinstance(tool_event, (ToolRequirePermissionEvent, ToolRequireUserResponseEvent)):
-                    break
+        Yields:
+            AgentEvent: Various events during task execution
+        """
+        event_channel = self._start()
+        try:
+            yield from self._create_coalescer().iter(event_channel)
+        finally:
+            self._finish(event_channel)
+
+    async def run_async(self) -> AsyncGenerator[AgentEvent]:
+        """
+        Asynchronous version of `run`, waiting for events costs no thread.
 
-        yield TaskDoneEvent()
+        Yields:
+            AgentEvent: Various events during task execution
+        """
+        event_channel = self._start()
+        try:
+            async for event in self._create_coalescer().iter_async(event_channel):
+                yield event
+        finally:
+            self._finish(event_channel)
 
     def persist(self):
         with TaskService() as task_service:
             task_service.update_task(self.task_id, {
                 "messages": self._messages,
+                "compacted_history": self._compacted_history,
+                "context_tokens": self.context_tokens,
                 "last_run_at": int(time.time())
             })
 
     def stop(self):
         with self._lock:
             self._is_running = False
+            if self._current_channel is not None:
+                # wake up the consumer immediately
+                self._current_channel.close()
             if self._current_task_id:
                 async_task_pool = use_async_task_pool()
                 async_task_pool.cancel(self._current_task_id)
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from litellm import token_counter
+from liteai_sdk import ChatMessage, ToolMessage
+
+class _TokenCountCache:
+    """LRU cache of message token counts keyed by (model, content hash), shared by all tasks"""
+
+    def __init__(self, max_size: int = 65536):
+        self._lock = threading.Lock()
+        self._counts: OrderedDict[tuple[str, str], int] = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, key: tuple[str, str]) -> int | None:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+            return count
+
+    def put(self, key: tuple[str, str], count: int):
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            if len(self._counts) > self._max_size:
+                self._counts.popitem(last=False)
+
+_token_count_cache = _TokenCountCache()
+
+def _is_resolved(message: ChatMessage) -> bool:
+    return not (isinstance(message, ToolMessage) and
+                message.result is None and
+                message.error is None)
+
+def _identity_key(message: ChatMessage) -> Hashable:
+    """
+    A cheap key that changes whenever the message content may have changed.
+    Only tool messages are changed after they are added (when their result is filled),
+    hashes of strings are cached by Python, so this costs no serialization.
+    """
+    if isinstance(message, ToolMessage):
+        return (message.id, hash(message.result), hash(message.error))
+    content = getattr(message, "content", None)
+    return (message.id, hash(content) if isinstance(content, str) else None)
+
+class TokenLedger:
+    """
+    Local token estimates of the messages of a task.
+
+    Each message is tokenized at most once: counts are cached by message content hash,
+    and looked up by a cheap identity key of the message afterwards.
+    `sync` records the total of the current messages, which `total` then returns in O(1).
+    """
+
+    def __init__(self, model: str):
+        self._model = model
+        self._counts: dict[Hashable, int] = {}
+        self._total = 0
+
+    def _tokenize(self, message: ChatMessage) -> int:
+        litellm_message = message.to_litellm_message()
+        content_hash = hashlib.sha256(
+            json.dumps(litellm_message, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        cache_key = (self._model, content_hash)
+        if (count := _token_count_cache.get(cache_key)) is None:
+            count = token_counter(model=self._model, messages=[litellm_message])
+            _token_count_cache.put(cache_key, count)
+        return count
+
+    def count(self, message: ChatMessage) -> int:
+        if not _is_resolved(message):
+            # not sent to the model
+            return 0
+        key = _identity_key(message)
+        if (count := self._counts.get(key)) is None:
+            count = self._counts[key] = self._tokenize(message)
+        return count
+
+    def count_messages(self, messages: Iterable[ChatMessage]) -> int:
+        return sum(self.count(message) for message in messages)
+
+    def sync(self, messages: list[ChatMessage]) -> int:
+        """Record the current messages, counting only the new or changed ones"""
+        counts = {}
+        total = 0
+        for message in messages:
+            count = self.count(message)
+            if count:
+                counts[_identity_key(message)] = count
+            total += count
+        # drop the counts of the messages that were replaced or compacted away
+        self._counts = counts
+        self._total = total
+        return total
+
+    @property
+    def total(self) -> int:
+        return self._total
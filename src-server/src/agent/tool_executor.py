@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Any
+from loguru import logger
+from liteai_sdk import ToolLike, execute_tool_sync
+
+class ToolCancelledError(Exception): pass
+class ToolTimeoutError(Exception): pass
+
+# The cancellation token of the tool call running on the current worker thread
+_cancel_event: ContextVar[threading.Event | None] = ContextVar("tool_cancel_event", default=None)
+
+def check_cancelled():
+    """
+    Called by long running tools at safe points,
+    stops the tool if its call was cancelled or timed out.
+
+    Raises:
+        ToolCancelledError
+    """
+    cancel_event = _cancel_event.get()
+    if cancel_event is not None and cancel_event.is_set():
+        raise ToolCancelledError("Tool call was cancelled")
+
+def _run_tool(cancel_event: threading.Event,
+              tool_def: ToolLike,
+              arguments: str | dict[str, Any]) -> Any:
+    if cancel_event.is_set():
+        raise ToolCancelledError("Tool call was cancelled")
+    token = _cancel_event.set(cancel_event)
+    try:
+        return execute_tool_sync(tool_def, arguments)
+    finally:
+        _cancel_event.reset(token)
+
+class ToolExecutor:
+    """
+    A bounded thread pool shared by all of the agent tasks to execute tool calls,
+    so that tools never run on the event loop or on a request thread.
+
+    Awaiting a tool call can be cancelled or timed out at any time,
+    the running tool is notified through `check_cancelled`.
+    A tool that does not stop keeps its worker thread, the next call then replaces the pool by a new one
+    so that abandoned calls never take the workers of the other calls.
+    """
+    _logger = logger.bind(name="ToolExecutor")
+
+    def __init__(self, max_workers: int = 8):
+        self._max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = self._create_executor()
+        # calls that were timed out or cancelled while their tool is still running on the current pool
+        self._abandoned: set[Future] = set()
+
+    def _create_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self._max_workers,
+                                  thread_name_prefix="ToolExecutor")
+
+    def _release(self, future: Future):
+        with self._lock:
+            self._abandoned.discard(future)
+
+    def _abandon(self, future: Future):
+        if future.cancel():
+            # the tool has not started
+            return
+        with self._lock:
+            self._abandoned.add(future)
+        future.add_done_callback(self._release)
+
+    def _submit(self, cancel_event: threading.Event, tool_def: ToolLike, arguments: str | dict[str, Any]) -> Future:
+        retired = None
+        with self._lock:
+            if self._abandoned:
+                # the abandoned calls still running hold workers of the pool, the new calls go to a new one
+                retired, self._executor = self._executor, self._create_executor()
+                abandoned_count = len(self._abandoned)
+                self._abandoned.clear()
+            future = self._executor.submit(_run_tool, cancel_event, tool_def, arguments)
+        if retired is not None:
+            # the other workers of the retired pool finish the calls queued on it, then exit
+            retired.shutdown(wait=False)
+            self._logger.warning("Replaced the tool executor pool, {} abandoned tool calls are still running",
+                                 abandoned_count)
+        return future
+
+    async def execute(self,
+                      tool_def: ToolLike,
+                      arguments: str | dict[str, Any],
+                      timeout: float | None = None) -> Any:
+        """
+        Raises:
+            ToolTimeoutError: If the tool did not finish in `timeout` seconds
+        """
+        cancel_event = threading.Event()
+        future = self._submit(cancel_event, tool_def, arguments)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except TimeoutError:
+            cancel_event.set()
+            self._abandon(future)
+            self._logger.warning("Tool {} timed out after {} seconds",
+                                 getattr(tool_def, "__name__", tool_def), timeout)
+            raise ToolTimeoutError(f"Tool execution timed out after {timeout} seconds")
+        except asyncio.CancelledError:
+            cancel_event.set()
+            self._abandon(future)
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+__instance = ToolExecutor()
+
+def use_tool_executor() -> ToolExecutor:
+    return __instance
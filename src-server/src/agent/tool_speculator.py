@@ -0,0 +1,96 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Any
+from liteai_sdk import ToolCallChunk, ToolLike, ToolMessage
+from .tool_executor import use_tool_executor
+
+@dataclass
+class _StreamingToolCall:
+    id: str | None = None
+    name: str = ""
+    arguments: str = ""
+    task: asyncio.Task[Any] | None = None
+    # the arguments kept streaming after the execution started
+    invalidated: bool = False
+
+def _discard(task: asyncio.Task[Any]):
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        # retrieve the exception to avoid the "never retrieved" warning
+        task.exception()
+
+class ToolCallSpeculator:
+    """
+    Start executing read-only tool calls while the assistant message is still streaming.
+
+    Tool call chunks are collected the same way the final assistant message is,
+    once the arguments of a call to one of the given read-only tools are a complete JSON object,
+    the tool is started on the tool executor with its timeout.
+    The result is only used if the final tool call has the same id, name and arguments,
+    otherwise the speculative execution is thrown away.
+    """
+
+    def __init__(self,
+                 read_only_tools: dict[str, ToolLike],
+                 tool_timeouts: dict[str, float | None] | None = None):
+        self._tools = read_only_tools
+        self._timeouts = tool_timeouts or {}
+        self._calls: dict[int, _StreamingToolCall] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def feed(self, chunk: ToolCallChunk):
+        """Collect a tool call chunk, must be called on the event loop"""
+        call = self._calls.setdefault(chunk.index, _StreamingToolCall())
+        if chunk.id:
+            call.id = chunk.id
+        if chunk.name:
+            call.name += chunk.name
+        if not chunk.arguments:
+            return
+        call.arguments += chunk.arguments
+
+        if call.task is not None:
+            # arguments changed after the execution started, the result can not be used
+            _discard(call.task)
+            call.task = None
+            call.invalidated = True
+            return
+
+        if (call.invalidated or
+            (tool := self._tools.get(call.name)) is None or
+            not call.arguments.rstrip().endswith("}")):
+            return
+        try:
+            arguments = json.loads(call.arguments)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(arguments, dict):
+            return
+        call.task = asyncio.create_task(
+            use_tool_executor().execute(tool, arguments, self._timeouts.get(call.name)))
+
+    def take(self, tool_call_message: ToolMessage) -> asyncio.Task[Any] | None:
+        """
+        Return the speculative execution matching the final tool call, if there is one
+        """
+        for index, call in self._calls.items():
+            if call.id != tool_call_message.id or call.task is None:
+                continue
+            del self._calls[index]
+            if (call.name == tool_call_message.name and
+                call.arguments == tool_call_message.arguments):
+                self.hits += 1
+                return call.task
+            _discard(call.task)
+            break
+        self.misses += 1
+        return None
+
+    def cancel_all(self):
+        for call in self._calls.values():
+            if call.task is not None:
+                _discard(call.task)
+        self._calls.clear()
@@ -0,0 +1,252 @@
+import os
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from loguru import logger
+from ..tool_executor import check_cancelled
+from .ignore_rules import IgnoreRules, RuleSet
+from .workspace_index import WorkspaceIndex
+from ...utils.text_search import (
+    FileMatches, SearchQuery, search_file, search_files, use_search_pool, reset_search_pool)
+
+_logger = logger.bind(name="ContentSearch")
+
+# interval of the cancellation checks while waiting for the worker processes
+_POLL_INTERVAL = 0.1
+
+@dataclass
+class Candidate:
+    # relative to the search root, with `/` separators
+    path: str
+    absolute_path: str
+    size: int
+    mtime_ns: int
+
+@dataclass
+class SearchResult:
+    files: list[FileMatches]
+    match_count: int
+    files_searched: int
+    # the search stopped at the match limit
+    truncated: bool
+
+class PathFilter:
+    """
+    The include and exclude globs of a search, with the .gitignore syntax:
+    a glob without a slash matches the file name at any level, a glob with a slash is relative to the search root.
+    """
+
+    def __init__(self, include: list[str] | None, exclude: list[str] | None):
+        self._include = RuleSet(include) if include else None
+        self._exclude = RuleSet(exclude) if exclude else None
+
+    def __call__(self, relative_path: str) -> bool:
+        if self._include is not None and not self._include.match(relative_path, False):
+            return False
+        return self._exclude is None or not self._exclude.match(relative_path, False)
+
+def _walk_files(root: str, ignore_rules: IgnoreRules | None) -> list[Candidate]:
+    """Files below the directory, ignored paths are skipped and symlinks to directories are not followed"""
+    if ignore_rules is None:
+        base = ""
+        chain = None
+    else:
+        base = os.path.relpath(root, ignore_rules.root).replace(os.sep, "/")
+        base = "" if base == "." else base
+        chain = ignore_rules.chain_for(base)
+
+    candidates = []
+    pending = [(root, "", chain)]
+    while len(pending) > 0:
+        check_cancelled()
+        directory, relative_directory, chain = pending.pop()
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            continue
+        with scanner:
+            for entry in scanner:
+                relative_path = f"{relative_directory}/{entry.name}" if relative_directory else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                    stat = None if is_dir else entry.stat()
+                except OSError:
+                    continue
+                if chain is not None:
+                    rule_path = f"{base}/{relative_path}" if base else relative_path
+                    if chain.is_ignored(rule_path, is_dir):
+                        continue
+                if stat is not None:
+                    candidates.append(Candidate(relative_path, entry.path, stat.st_size, stat.st_mtime_ns))
+                elif not entry.is_symlink():
+                    child_chain = chain.descend(entry.path, rule_path) if chain is not None else None
+                    pending.append((entry.path, relative_path, child_chain))
+    return candidates
+
+def _indexed_files(index: WorkspaceIndex, relative_root: str) -> list[Candidate] | None:
+    files = index.files(relative_root)
+    if files is None:
+        return None
+    prefix_length = len(relative_root) + 1 if relative_root else 0
+    return [Candidate(entry.path[prefix_length:], os.path.join(index.root, entry.path), entry.size, entry.mtime_ns)
+            for entry in files]
+
+def collect_candidates(root: str,
+                       path_filter: Callable[[str], bool],
+                       ignore_rules: IgnoreRules | None,
+                       index: WorkspaceIndex | None = None,
+                       relative_root: str = "") -> list[Candidate]:
+    """
+    The files to search below `root`, sorted by path.
+    The workspace index is used when it is given and ready, `relative_root` is the path of `root` in the index.
+    """
+    candidates = _indexed_files(index, relative_root) if index is not None else None
+    if candidates is None:
+        candidates = _walk_files(root, ignore_rules)
+    candidates = [candidate for candidate in candidates if path_filter(candidate.path)]
+    candidates.sort(key=lambda candidate: candidate.path)
+    return candidates
+
+def _chunks(candidates: list[Candidate], chunk_bytes: int, chunk_files: int) -> list[list[Candidate]]:
+    chunks: list[list[Candidate]] = []
+    current: list[Candidate] = []
+    current_bytes = 0
+    for candidate in candidates:
+        current.append(candidate)
+        current_bytes += candidate.size
+        if current_bytes >= chunk_bytes or len(current) >= chunk_files:
+            chunks.append(current)
+            current = []
+            current_bytes = 0
+    if len(current) > 0:
+        chunks.append(current)
+    return chunks
+
+def _wait(future: Future[list[FileMatches]]) -> list[FileMatches]:
+    while True:
+        check_cancelled()
+        try:
+            return future.result(timeout=_POLL_INTERVAL)
+        except FutureTimeoutError:
+            continue
+
+def _search_sequential(candidates: list[Candidate], query: SearchQuery):
+    regex = query.compile()
+    for candidate in candidates:
+        check_cancelled()
+        matches = search_file(candidate.absolute_path, query, regex)
+        yield [] if matches is None else [matches]
+
+def _search_parallel(candidates: list[Candidate], query: SearchQuery, workers: int, chunk_bytes: int):
+    """Search the chunks in the worker processes, the results are yielded in the order of the chunks"""
+    chunks = _chunks(candidates, chunk_bytes, chunk_files=256)
+    pool = use_search_pool(workers)
+    in_flight: deque[tuple[list[Candidate], Future[list[FileMatches]]]] = deque()
+    next_chunk = 0
+    waiting: list[Candidate] | None = None
+    try:
+        while next_chunk < len(chunks) or len(in_flight) > 0:
+            # keep every worker busy, without queuing the chunks the early stop may not need
+            while next_chunk < len(chunks) and len(in_flight) < workers * 2:
+                chunk = chunks[next_chunk]
+                paths = [candidate.absolute_path for candidate in chunk]
+                in_flight.append((chunk, pool.submit(search_files, paths, query)))
+                next_chunk += 1
+            waiting, future = in_flight.popleft()
+            yield _wait(future)
+            waiting = None
+    except BrokenProcessPool:
+        _logger.warning("A search worker exited unexpectedly, searching the rest in this process")
+        reset_search_pool()
+        rest = ([waiting] if waiting is not None else []) + [chunk for chunk, _ in in_flight] + chunks[next_chunk:]
+        in_flight.clear()
+        yield from _search_sequential([candidate for chunk in rest for candidate in chunk], query)
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+def _keep_matches(matches: FileMatches, keep: int, context_lines: int) -> FileMatches:
+    """The first `keep` matches of the file with their context"""
+    lines = []
+    seen = 0
+    after_last = 0
+    for line in matches.lines:
+        number, _, is_match = line
+        if seen == keep:
+            # the context after the last kept match
+            if is_match or after_last >= context_lines or number != lines[-1][0] + 1:
+                break
+            after_last += 1
+        elif is_match:
+            seen += 1
+        lines.append(line)
+    return FileMatches(matches.path, lines, keep, truncated=True)
+
+def run_search(candidates: list[Candidate],
+               query: SearchQuery,
+               max_matches: int,
+               workers: int,
+               parallel_min_bytes: int,
+               chunk_bytes: int = 1024 * 1024) -> SearchResult:
+    """
+    Search the candidates in order and stop after `max_matches` matching lines.
+    Large searches run in worker processes when there is more than one worker.
+    """
+    total_bytes = sum(candidate.size for candidate in candidates)
+    if workers > 1 and total_bytes >= parallel_min_bytes:
+        batches = _search_parallel(candidates, query, workers, chunk_bytes)
+    else:
+        batches = _search_sequential(candidates, query)
+
+    files: list[FileMatches] = []
+    match_count = 0
+    truncated = False
+    try:
+        for batch in batches:
+            for matches in batch:
+                remaining = max_matches - match_count
+                if remaining == 0:
+                    truncated = True
+                    break
+                if matches.match_count > remaining or (matches.truncated and matches.match_count == remaining):
+                    files.append(_keep_matches(matches, remaining, query.context_lines))
+                    match_count += remaining
+                    truncated = True
+                    break
+                files.append(matches)
+                match_count += matches.match_count
+            if truncated:
+                break
+    finally:
+        batches.close()
+    return SearchResult(files, match_count, len(candidates), truncated)
+
+def render_result(result: SearchResult,
+                  display_path: Callable[[str], str],
+                  max_matches: int,
+                  context_lines: int = 0) -> str:
+    """
+    Compact grep-like output: the path of each file, then its lines as `number:line` for the matches
+    and `number-line` for the context, with `--` between the blocks of a file when there is context.
+    """
+    if result.match_count == 0:
+        return f"No matches found in {result.files_searched} files."
+    summary = f"Found {result.match_count} matching lines in {len(result.files)} files"
+    # a search stopped at the limit did not reach all the files
+    lines = [summary + ("." if result.truncated else f" ({result.files_searched} files searched).")]
+    for matches in result.files:
+        lines.append("")
+        lines.append(display_path(matches.path))
+        previous = None
+        for number, text, is_match in matches.lines:
+            if context_lines > 0 and previous is not None and number != previous + 1:
+                lines.append("--")
+            lines.append(f"{number}{':' if is_match else '-'}{text}")
+            previous = number
+    if result.truncated:
+        lines.append("")
+        lines.append(f"[Stopped after {max_matches} matching lines. "
+                     "Use a more specific pattern, path or include filter to see the rest.]")
+    return "\n".join(lines)
@@ -0,0 +1,196 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass
+from importlib.metadata import version
+from pathlib import Path
+from loguru import logger
+from ...db import data_dir
+
+HASH_CHUNK_BYTES = 1 << 20
+
+@dataclass
+class ConversionCacheStats:
+    """Metrics of the document conversion cache, counted in the current process"""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    # time spent converting documents on misses, in seconds
+    convert_time: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ConversionCache:
+    """
+    Disk-backed cache of the markdown converted from documents, stored in a SQLite database,
+    so that it is shared by all tool instances and processes.
+
+    The converted text is addressed by the hash of the document content,
+    the (path, size, mtime) of a file are remembered to skip hashing a file that has not changed.
+    Entries are evicted in least-recently-used order when the stored size exceeds `max_bytes`.
+    """
+    _logger = logger.bind(name="ConversionCache")
+
+    def __init__(self,
+                 db_path: Path,
+                 max_bytes: int = 256 * 1024 * 1024,
+                 namespace: str = f"markitdown-{version('markitdown')}"):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        # cached text of a different converter version is never returned
+        self.namespace = namespace
+        self.stats = ConversionCacheStats()
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    content BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+                CREATE TABLE IF NOT EXISTS paths (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    key TEXT NOT NULL
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, **deltas: float):
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self.stats, name, getattr(self.stats, name) + delta)
+
+    def _load(self, conn: sqlite3.Connection, key: str) -> str | None:
+        row = conn.execute("SELECT content FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def _store(self, conn: sqlite3.Connection, key: str, text: str):
+        content = zlib.compress(text.encode("utf-8"))
+        if len(content) > self.max_bytes:
+            return
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO entries (key, content, size, last_access) VALUES (?, ?, ?, ?)",
+                         (key, content, len(content), time.time()))
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        conn.execute("DELETE FROM paths WHERE key NOT IN (SELECT key FROM entries)")
+        self._count(evictions=len(evicted))
+
+    def get_or_convert(self, path: Path, convert: Callable[[Path], str]) -> str:
+        """Return the cached conversion of the file, or convert it with `convert` and cache the result"""
+        try:
+            return self._get_or_convert(path, convert)
+        except sqlite3.Error as e:
+            # the cache must never make reading the document fail
+            self._logger.warning("Conversion cache unavailable: {}", e)
+            return convert(path)
+
+    def _get_or_convert(self, path: Path, convert: Callable[[Path], str]) -> str:
+        conn = self._connect()
+        resolved = str(path.resolve())
+        stat = path.stat()
+
+        row = conn.execute("SELECT key FROM paths WHERE path = ? AND size = ? AND mtime_ns = ?",
+                           (resolved, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if (row is not None and
+            row[0].startswith(f"{self.namespace}:") and
+            (text := self._load(conn, row[0])) is not None):
+            self._count(hits=1)
+            return text
+
+        # the file is new or changed, or it is a copy of a document converted before
+        key = f"{self.namespace}:{_hash_file(path)}"
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO paths (path, size, mtime_ns, key) VALUES (?, ?, ?, ?)",
+                         (resolved, stat.st_size, stat.st_mtime_ns, key))
+        if (text := self._load(conn, key)) is not None:
+            self._count(hits=1)
+            return text
+
+        start = time.perf_counter()
+        text = convert(path)
+        elapsed = time.perf_counter() - start
+        self._count(misses=1, convert_time=elapsed)
+        self._logger.debug("Converted {} in {:.2f}s, cache hit rate {:.1%}",
+                           path, elapsed, self.stats.hit_rate)
+        try:
+            self._store(conn, key, text)
+        except sqlite3.Error as e:
+            self._logger.warning("Failed to store the conversion of {}: {}", path, e)
+        return text
+
+    def get(self, path: Path) -> str | None:
+        """The cached conversion of the file if it did not change since, without converting it"""
+        try:
+            stat = path.stat()
+            conn = self._connect()
+            row = conn.execute("SELECT key FROM paths WHERE path = ? AND size = ? AND mtime_ns = ?",
+                               (str(path.resolve()), stat.st_size, stat.st_mtime_ns)).fetchone()
+            if row is None or not row[0].startswith(f"{self.namespace}:"):
+                return None
+            return self._load(conn, row[0])
+        except (OSError, sqlite3.Error):
+            return None
+
+    def usage(self) -> tuple[int, int]:
+        """Number of entries and their total stored size in bytes"""
+        count, size = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return count, size
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM paths")
+
+__instance: ConversionCache | None = None
+__instance_lock = threading.Lock()
+
+def use_conversion_cache() -> ConversionCache:
+    global __instance
+    with __instance_lock:
+        if __instance is None:
+            __instance = ConversionCache(data_dir / "conversion_cache.db")
+        return __instance
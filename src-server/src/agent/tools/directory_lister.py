@@ -0,0 +1,177 @@
+import os
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from ..tool_executor import check_cancelled
+from .ignore_rules import IgnoreChain, IgnoreRules
+from .workspace_index import WorkspaceIndex
+
+@dataclass(slots=True)
+class _Node:
+    name: str
+    path: str
+    # type from the cached `DirEntry` information, `is_dir` follows symlinks
+    is_dir: bool
+    is_symlink: bool
+    # None when the directory was not scanned
+    children: list["_Node"] | None = None
+    # number of children left out by the entry limit
+    omitted: int = 0
+    # ignored directories are listed without their content
+    ignored: bool = False
+
+def _scan(path: str) -> list[_Node]:
+    nodes = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            nodes.append(_Node(entry.name, entry.path, is_dir, entry.is_symlink()))
+    nodes.sort(key=lambda node: (not node.is_dir, node.name.lower()))
+    return nodes
+
+def _format_node(node: _Node) -> str:
+    if node.is_symlink:
+        try:
+            item_type = f"symlink -> {os.readlink(node.path)}"
+        except (OSError, ValueError):
+            item_type = "symlink -> <unreadable>"
+    elif node.is_dir:
+        item_type = "dir"
+    else:
+        item_type = "file"
+    return f"[{item_type}] {node.name}" + (" (ignored)" if node.ignored else "")
+
+@dataclass
+class DirectoryListing:
+    root: _Node
+    listed: int
+    truncated: bool
+
+def _filter_ignored(children: list[_Node], chain: IgnoreChain, relative_directory: str) -> list[_Node]:
+    """Drop ignored files and mark ignored directories, which are not descended into"""
+    kept = []
+    for child in children:
+        relative_path = f"{relative_directory}/{child.name}" if relative_directory else child.name
+        if chain.is_ignored(relative_path, child.is_dir):
+            if not child.is_dir:
+                continue
+            child.ignored = True
+        kept.append(child)
+    return kept
+
+def _walk(root: _Node,
+          relative_root: str,
+          root_chain: IgnoreChain | None,
+          max_depth: int | None,
+          max_entries: int,
+          load_children: Callable[[_Node, str], list[_Node]]) -> DirectoryListing:
+    listed = 0
+    truncated = False
+    queue: deque[tuple[_Node, int, str, IgnoreChain | None]] = deque([(root, 1, relative_root, root_chain)])
+    while len(queue) > 0:
+        check_cancelled()
+        if listed >= max_entries:
+            # directories that were not reached are shown without their content
+            truncated = True
+            break
+        node, depth, relative_directory, chain = queue.popleft()
+        if node.children is None:
+            try:
+                node.children = load_children(node, relative_directory)
+            except OSError:
+                # unreadable directories are listed without their content
+                continue
+        if chain is not None:
+            node.children = _filter_ignored(node.children, chain, relative_directory)
+
+        remaining = max_entries - listed
+        if len(node.children) > remaining:
+            node.omitted = len(node.children) - remaining
+            node.children = node.children[:remaining]
+            truncated = True
+        listed += len(node.children)
+
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for child in node.children:
+            if child.is_dir and not child.is_symlink and not child.ignored:
+                relative_path = f"{relative_directory}/{child.name}" if relative_directory else child.name
+                child_chain = chain.descend(child.path, relative_path) if chain is not None else None
+                queue.append((child, depth + 1, relative_path, child_chain))
+
+    return DirectoryListing(root, listed, truncated)
+
+def scan_tree(path: str,
+              max_depth: int | None,
+              max_entries: int,
+              ignore_rules: IgnoreRules | None = None) -> DirectoryListing:
+    """
+    Scan the directory breadth-first until `max_entries` entries are collected,
+    so that a truncated listing still shows the upper levels of the tree completely.
+    Symlinks to directories are listed but not descended into.
+    With `ignore_rules`, ignored files are left out and ignored directories are not descended into.
+
+    Raises:
+        PermissionError: If the directory itself can not be read
+    """
+    root = _Node(os.path.basename(path), path, True, False, children=_scan(path))
+    relative_root = ""
+    root_chain = None
+    if ignore_rules is not None:
+        relative_root = os.path.relpath(path, ignore_rules.root).replace(os.sep, "/")
+        relative_root = "" if relative_root == "." else relative_root
+        root_chain = ignore_rules.chain_for(relative_root)
+    return _walk(root, relative_root, root_chain, max_depth, max_entries,
+                 lambda node, _: _scan(node.path))
+
+def _index_children(index: WorkspaceIndex, relative_directory: str) -> list[_Node]:
+    entries = index.children(relative_directory)
+    if entries is None:
+        raise FileNotFoundError(relative_directory)
+    nodes = [_Node(entry.name, os.path.join(index.root, entry.path), entry.is_dir, entry.is_symlink,
+                   ignored=entry.ignored)
+             for entry in entries]
+    nodes.sort(key=lambda node: (not node.is_dir, node.name.lower()))
+    return nodes
+
+def index_tree(index: WorkspaceIndex,
+               relative_path: str,
+               max_depth: int | None,
+               max_entries: int) -> DirectoryListing:
+    """
+    The same listing as `scan_tree` with the ignore rules of the workspace,
+    answered from the workspace index without touching the disk.
+
+    Raises:
+        FileNotFoundError: If the directory is not in the index
+    """
+    root = _Node(os.path.basename(relative_path), os.path.join(index.root, relative_path), True, False,
+                 children=_index_children(index, relative_path))
+    return _walk(root, relative_path, None, max_depth, max_entries,
+                 lambda _, relative_directory: _index_children(index, relative_directory))
+
+def _render(node: _Node, prefix: str, indent: int, lines: list[str]):
+    assert node.children is not None
+    indent_str = "  " * indent
+    if len(node.children) == 0 and node.omitted == 0:
+        lines.append(indent_str + "(empty directory)")
+        return
+    for index, child in enumerate(node.children, 1):
+        child_prefix = f"{prefix}{index}"
+        lines.append(f"{indent_str}{child_prefix} {_format_node(child)}")
+        if child.children is not None:
+            _render(child, f"{child_prefix}.", indent + 1, lines)
+    if node.omitted > 0:
+        lines.append(f"{indent_str}... ({node.omitted} more entries not listed)")
+
+def render_listing(listing: DirectoryListing, max_entries: int) -> list[str]:
+    """Numbered lines of the listing (1, 1.1, 1.1.1 ...), with a footer if it was truncated"""
+    lines: list[str] = []
+    _render(listing.root, "", 0, lines)
+    if listing.truncated:
+        lines.append(f"[Truncated: {listing.listed} entries listed, the limit of one call is {max_entries}. "
+                     "List a subdirectory or use a smaller max_depth to see the rest.]")
+    return lines
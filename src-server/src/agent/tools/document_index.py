@@ -0,0 +1,478 @@
+import hashlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from loguru import logger
+from .conversion_cache import ConversionCache, use_conversion_cache
+from .file_reader import split_lines
+from .file_sniffer import sniff_file
+from .workspace_index import IndexState, WorkspaceIndex
+from ...db import data_dir
+from ...utils.document_converter import DocumentConverter, use_document_converter
+
+# changes of the layout or of the text processing invalidate the stored indexes
+_FORMAT = "1"
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx", ".pptx", ".xlsx", ".epub")
+
+# the rowid of a passage is the id of its file shifted by this, plus the index of the passage in the file
+_PASSAGE_BITS = 16
+_MAX_PASSAGES = (1 << _PASSAGE_BITS) - 1
+
+# ideographs and kana are not separated by spaces, each one is indexed as a token
+_CJK_CHARACTER = re.compile(r"([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff])")
+_WORD = re.compile(r"[^\W_]+")
+
+def index_text(text: str) -> str:
+    """The text given to the FTS5 tokenizer"""
+    return _CJK_CHARACTER.sub(r" \1 ", text)
+
+def query_tokens(query: str) -> list[list[str]]:
+    """The words of a query, a word with ideographs is the phrase of its characters"""
+    return [tokens for word in _WORD.findall(query.lower()) if len(tokens := index_text(word).split()) > 0]
+
+def match_expression(words: list[list[str]]) -> str:
+    """An FTS5 query matching any of the words, every word is quoted so that no query syntax applies"""
+    return " OR ".join('"' + " ".join(tokens) + '"' for tokens in words)
+
+def split_passages(lines: list[str], max_lines: int, max_chars: int) -> list[tuple[int, int]]:
+    """
+    (start line, line count) of the passages of a text, line numbers start from 1.
+    A passage ends at a blank line once it has half of `max_lines`, or at the limits. Blank passages are skipped.
+    """
+    passages = []
+    start = 0
+    chars = 0
+    has_text = False
+    for index, line in enumerate(lines):
+        is_blank = line.strip() == ""
+        has_text = has_text or not is_blank
+        chars += len(line)
+        count = index - start + 1
+        if count >= max_lines or chars >= max_chars or (is_blank and count >= max_lines // 2):
+            if has_text:
+                passages.append((start + 1, count))
+            start = index + 1
+            chars = 0
+            has_text = False
+    if has_text:
+        passages.append((start + 1, len(lines) - start))
+    return passages
+
+class _IndexStopped(Exception): pass
+
+@dataclass
+class DocumentHit:
+    # relative to the workspace root
+    path: str
+    start_line: int
+    line_count: int
+    score: float
+
+@dataclass(slots=True)
+class _FileRecord:
+    id: int
+    size: int
+    mtime_ns: int
+
+class DocumentIndex:
+    """
+    An on-disk full-text index of the text files and documents of a workspace, ranked with BM25,
+    so that the agent can find the relevant passages without reading whole directories.
+
+    Files are split into passages of a few lines which are indexed with SQLite FTS5,
+    documents (.pdf, .docx...) are indexed from their markdown conversion.
+    The files come from the workspace index and follow its updates, the index is built in the background
+    on first use and kept between the runs of the server.
+    """
+    _logger = logger.bind(name="DocumentIndex")
+
+    PASSAGE_LINES = 20
+    PASSAGE_CHARS = 2000
+    # text files larger than this are not indexed
+    MAX_TEXT_BYTES = 1024 * 1024
+    # documents larger than this are not converted
+    MAX_DOCUMENT_BYTES = 64 * 1024 * 1024
+    # the index is disabled when its database grows beyond this size
+    MAX_BYTES = 1024 * 1024 * 1024
+    # the indexed files are committed in transactions of this many files
+    COMMIT_FILES = 64
+
+    def __init__(self,
+                 workspace_index: WorkspaceIndex,
+                 db_path: Path,
+                 conversion_cache: ConversionCache | None = None,
+                 converter: DocumentConverter | None = None):
+        self.workspace_index = workspace_index
+        self.db_path = db_path
+        self.conversion_cache = conversion_cache or use_conversion_cache()
+        self._converter = converter
+        self.state = IndexState.EMPTY
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._records: dict[str, _FileRecord] = {}
+        self._paths_by_id: dict[int, str] = {}
+        self._next_id = 1
+        # files indexed and to index in the current update, reported while building
+        self.progress = (0, 0)
+        self._changes: queue.Queue[list[str] | None] = queue.Queue()
+        self._unapplied = 0
+        self._stopped = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker: threading.Thread | None = None
+        self.disabled_reason: str | None = None
+
+        try:
+            with self._connect() as conn:
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                    CREATE TABLE IF NOT EXISTS files (
+                        id INTEGER PRIMARY KEY,
+                        path TEXT NOT NULL UNIQUE,
+                        size INTEGER NOT NULL,
+                        mtime_ns INTEGER NOT NULL
+                    );
+                    CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(
+                        start_line UNINDEXED,
+                        line_count UNINDEXED,
+                        text,
+                        tokenize = 'unicode61 remove_diacritics 2'
+                    );
+                """)
+                row = conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+                if row is None or row[0] != _FORMAT:
+                    self._clear(conn)
+        except sqlite3.OperationalError as e:
+            # SQLite may be built without FTS5
+            self.state = IndexState.DISABLED
+            self.disabled_reason = str(e)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _clear(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM files")
+        conn.execute("DELETE FROM passages")
+        conn.execute("DELETE FROM meta")
+        conn.execute("INSERT INTO meta (key, value) VALUES ('format', ?)", (_FORMAT,))
+        with self._lock:
+            self._records.clear()
+            self._paths_by_id.clear()
+            self._next_id = 1
+
+    def _load(self):
+        records = {}
+        paths_by_id = {}
+        for file_id, path, size, mtime_ns in self._connect().execute("SELECT id, path, size, mtime_ns FROM files"):
+            records[path] = _FileRecord(file_id, size, mtime_ns)
+            paths_by_id[file_id] = path
+        with self._lock:
+            self._records = records
+            self._paths_by_id = paths_by_id
+            self._next_id = max(paths_by_id, default=0) + 1
+
+    def _database_bytes(self) -> int:
+        conn = self._connect()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def _disable(self, reason: str):
+        self._logger.warning("Document index of {} disabled: {}", self.workspace_index.root, reason)
+        self.state = IndexState.DISABLED
+        # nothing reads the changes any more
+        self.workspace_index.remove_listener(self._on_workspace_changed)
+        self.disabled_reason = reason
+        conn = self._connect()
+        with conn:
+            self._clear(conn)
+        conn.execute("VACUUM")
+
+    # --- --- --- --- --- ---
+    # --- Updates -----------
+    # --- --- --- --- --- ---
+
+    def _check_stopped(self):
+        if self._stopped.is_set():
+            raise _IndexStopped()
+
+    def read_lines(self, path: str, convert: bool = True) -> list[str] | None:
+        """
+        The lines of a file as they are indexed, the markdown of a document.
+        None for a binary file, or a document that is not converted yet when `convert` is False.
+        """
+        absolute_path = Path(self.workspace_index.root) / path
+        if path.lower().endswith(DOCUMENT_EXTENSIONS):
+            if not convert:
+                markdown = self.conversion_cache.get(absolute_path)
+            else:
+                converter = self._converter or use_document_converter()
+                markdown = self.conversion_cache.get_or_convert(
+                    absolute_path,
+                    lambda file_path: converter.convert(file_path, cancel_check=self._check_stopped).markdown)
+            return None if markdown is None else markdown.splitlines()
+        sniff = sniff_file(absolute_path)
+        if sniff.is_binary:
+            return None
+        assert sniff.encoding is not None
+        text = absolute_path.read_bytes()[sniff.bom_length:].decode(sniff.encoding, errors="replace")
+        # the line numbers of read_file
+        return text.splitlines() if sniff.is_wide_encoding else split_lines(text)
+
+    def _is_indexable(self, path: str, size: int) -> bool:
+        if path.lower().endswith(DOCUMENT_EXTENSIONS):
+            return size <= self.MAX_DOCUMENT_BYTES
+        return size <= self.MAX_TEXT_BYTES
+
+    def _index_file(self, conn: sqlite3.Connection, path: str, size: int, mtime_ns: int):
+        """Replace the passages of a file, files which can not be read are recorded without passages"""
+        with self._lock:
+            record = self._records.get(path)
+            if record is None:
+                record = _FileRecord(self._next_id, size, mtime_ns)
+                self._next_id += 1
+            else:
+                record.size, record.mtime_ns = size, mtime_ns
+        lines = None
+        if self._is_indexable(path, size):
+            try:
+                lines = self.read_lines(path)
+            except _IndexStopped:
+                raise
+            except Exception as e:
+                self._logger.debug("Not indexing {}: {}", path, e)
+
+        first_rowid = record.id << _PASSAGE_BITS
+        conn.execute("DELETE FROM passages WHERE rowid BETWEEN ? AND ?", (first_rowid, first_rowid + _MAX_PASSAGES))
+        if lines is not None:
+            passages = split_passages(lines, self.PASSAGE_LINES, self.PASSAGE_CHARS)[:_MAX_PASSAGES + 1]
+            conn.executemany(
+                "INSERT INTO passages (rowid, start_line, line_count, text) VALUES (?, ?, ?, ?)",
+                ((first_rowid + index, start, count, index_text("\n".join(lines[start - 1:start - 1 + count])))
+                 for index, (start, count) in enumerate(passages)))
+        conn.execute("INSERT OR REPLACE INTO files (id, path, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                     (record.id, path, size, mtime_ns))
+        with self._lock:
+            self._records[path] = record
+            self._paths_by_id[record.id] = path
+
+    def _remove_file(self, conn: sqlite3.Connection, path: str):
+        with self._lock:
+            record = self._records.pop(path, None)
+            if record is None:
+                return
+            del self._paths_by_id[record.id]
+        first_rowid = record.id << _PASSAGE_BITS
+        conn.execute("DELETE FROM passages WHERE rowid BETWEEN ? AND ?", (first_rowid, first_rowid + _MAX_PASSAGES))
+        conn.execute("DELETE FROM files WHERE id = ?", (record.id,))
+
+    def update(self, paths: list[str]):
+        """Bring the passages of the files at or below the paths up to date with the workspace index"""
+        if self.state is IndexState.DISABLED:
+            return
+        removed: list[str] = []
+        changed: list[tuple[str, int, int]] = []
+        for path in sorted(set(paths)):
+            files = self.workspace_index.files(path)
+            if files is None:
+                return
+            current = {entry.path for entry in files}
+            prefix = f"{path}/"
+            with self._lock:
+                removed.extend(recorded_path for recorded_path in self._records
+                               if (path == "" or recorded_path == path or recorded_path.startswith(prefix)) and
+                                  recorded_path not in current)
+                for entry in files:
+                    record = self._records.get(entry.path)
+                    if record is None or (record.size, record.mtime_ns) != (entry.size, entry.mtime_ns):
+                        changed.append((entry.path, entry.size, entry.mtime_ns))
+
+        conn = self._connect()
+        with conn:
+            for path in removed:
+                self._remove_file(conn, path)
+        self.progress = (0, len(changed))
+        for start in range(0, len(changed), self.COMMIT_FILES):
+            with conn:
+                for path, size, mtime_ns in changed[start:start + self.COMMIT_FILES]:
+                    self._index_file(conn, path, size, mtime_ns)
+            self.progress = (min(start + self.COMMIT_FILES, len(changed)), len(changed))
+            if (database_bytes := self._database_bytes()) > self.MAX_BYTES:
+                self._disable(f"the index takes {database_bytes} bytes, the limit is {self.MAX_BYTES}")
+                return
+
+    # --- --- --- --- --- ---
+    # --- Lifecycle ---------
+    # --- --- --- --- --- ---
+
+    def start(self):
+        """Load the stored index, catch up with the workspace and follow its updates in the background"""
+        with self._lock:
+            if self._worker is not None or self.state is IndexState.DISABLED:
+                return
+            self._idle.clear()
+            self._worker = threading.Thread(target=self._run, name="DocumentIndex", daemon=True)
+        self._worker.start()
+
+    def _on_workspace_changed(self, paths: list[str]):
+        with self._lock:
+            self._unapplied += 1
+            self._idle.clear()
+        # a changed .gitignore may hide or reveal the files of its directory
+        self._changes.put([path.rpartition("/")[0] if path.rpartition("/")[2] == ".gitignore" else path
+                           for path in paths])
+
+    def _run(self):
+        try:
+            self._build()
+            if self.state is not IndexState.DISABLED:
+                self._follow_changes()
+        except _IndexStopped:
+            pass
+        finally:
+            self._idle.set()
+
+    def _build(self):
+        start = time.perf_counter()
+        self._load()
+        self.state = IndexState.BUILDING
+        if not self.workspace_index.wait_ready():
+            self._disable("the workspace index is disabled")
+            return
+        self.workspace_index.add_listener(self._on_workspace_changed)
+        try:
+            self.update([""])
+        except _IndexStopped:
+            raise
+        except Exception as e:
+            self._logger.exception("Failed to build the document index: {}", e)
+            self._disable(str(e))
+            return
+        if self.state is IndexState.DISABLED:
+            return
+        self.state = IndexState.READY
+        self._logger.info("Document index of {} is ready in {:.2f}s, {} files",
+                          self.workspace_index.root, time.perf_counter() - start, len(self._records))
+        with self._lock:
+            if self._unapplied == 0:
+                self._idle.set()
+
+    def _follow_changes(self):
+        while not self._stopped.is_set():
+            batch = self._changes.get()
+            if batch is None:
+                return
+            paths = list(batch)
+            batches = 1
+            while not self._changes.empty():
+                more = self._changes.get()
+                if more is None:
+                    self._stopped.set()
+                    break
+                paths.extend(more)
+                batches += 1
+            try:
+                self.update(paths)
+            except _IndexStopped:
+                raise
+            except Exception as e:
+                self._logger.exception("Failed to update the document index: {}", e)
+            with self._lock:
+                self._unapplied -= batches
+                if self._unapplied == 0:
+                    self._idle.set()
+            if self.state is IndexState.DISABLED:
+                return
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait until the index caught up with the workspace and the changes it received"""
+        return self._idle.wait(timeout)
+
+    def stop(self):
+        self.workspace_index.remove_listener(self._on_workspace_changed)
+        self._stopped.set()
+        self._changes.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    # --- --- --- --- --- ---
+    # --- Queries -----------
+    # --- --- --- --- --- ---
+
+    def search(self,
+               words: list[list[str]],
+               relative_root: str,
+               max_files: int,
+               max_rows: int = 5000) -> list[DocumentHit]:
+        """
+        The best passage of each of the `max_files` most relevant files at or below `relative_root`,
+        best first. `words` come from `query_tokens`, at most `max_rows` passages are looked at.
+        """
+        if len(words) == 0 or self.state is IndexState.DISABLED:
+            return []
+        hits: dict[str, DocumentHit] = {}
+        if relative_root:
+            # filtered before the limit, the best passages of the whole workspace may be elsewhere
+            # (`0` sorts right after `/`, the paths below the directory are in [`root/`, `root0`))
+            cursor = self._connect().execute(
+                "SELECT passages.rowid, start_line, line_count, passages.rank FROM passages "
+                "JOIN files ON files.id = passages.rowid >> ? "
+                "WHERE passages MATCH ? AND (files.path = ? OR (files.path >= ? AND files.path < ?)) "
+                "ORDER BY passages.rank LIMIT ?",
+                (_PASSAGE_BITS, match_expression(words), relative_root,
+                 f"{relative_root}/", f"{relative_root}0", max_rows))
+        else:
+            cursor = self._connect().execute(
+                "SELECT rowid, start_line, line_count, rank FROM passages WHERE passages MATCH ? ORDER BY rank LIMIT ?",
+                (match_expression(words), max_rows))
+        for rowid, start_line, line_count, rank in cursor:
+            with self._lock:
+                path = self._paths_by_id.get(rowid >> _PASSAGE_BITS)
+            if path is None or path in hits:
+                continue
+            # FTS5 ranks with the negated BM25 score
+            hits[path] = DocumentHit(path, start_line, line_count, -rank)
+            if len(hits) == max_files:
+                break
+        cursor.close()
+        return list(hits.values())
+
+    def record(self, path: str) -> tuple[int, int] | None:
+        """(size, mtime_ns) of the indexed version of a file"""
+        with self._lock:
+            record = self._records.get(path)
+            return None if record is None else (record.size, record.mtime_ns)
+
+    def usage(self) -> dict[str, int]:
+        with self._lock:
+            files = len(self._records)
+        return {"files": files, "bytes": self._database_bytes()}
+
+_indexes: dict[str, DocumentIndex] = {}
+_indexes_lock = threading.Lock()
+
+def use_document_index(workspace_index: WorkspaceIndex) -> DocumentIndex:
+    """The document index of a workspace, it is started by its first search"""
+    root = workspace_index.root
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is not None and index.workspace_index is workspace_index:
+            return index
+        if index is not None:
+            index.stop()
+        index_dir = data_dir / "document_index"
+        index_dir.mkdir(exist_ok=True)
+        db_name = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+        index = _indexes[root] = DocumentIndex(workspace_index, index_dir / f"{db_name}.db")
+        return index
@@ -0,0 +1,176 @@
+import difflib
+from collections.abc import Iterator
+from ...utils.text_search import clip_line
+
+# The characters `str.splitlines` breaks lines on, "\r\n" is one break
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+# Changed regions with more lines than this are shown as one replaced block instead of being matched line by line
+MATCH_MAX_LINES = 2000
+# Line breaks are searched in chunks of this size, doubled at each step, so that the search stays near the edit
+SEARCH_CHUNK_CHARS = 256
+
+Opcode = tuple[str, int, int, int, int]
+
+def _find_break(text: str, pos: int) -> int:
+    """Offset of the first line break at or after `pos`, -1 if there is none"""
+    size = SEARCH_CHUNK_CHARS
+    while pos < len(text):
+        stop = pos + size
+        found = [i for c in LINE_BREAKS if (i := text.find(c, pos, stop)) != -1]
+        if found:
+            return min(found)
+        pos, size = stop, size * 2
+    return -1
+
+def _rfind_break(text: str, pos: int) -> int:
+    """Offset of the last line break before `pos`, -1 if there is none"""
+    size = SEARCH_CHUNK_CHARS
+    while pos > 0:
+        start = max(0, pos - size)
+        found = max(text.rfind(c, start, pos) for c in LINE_BREAKS)
+        if found != -1:
+            return found
+        pos, size = start, size * 2
+    return -1
+
+def _is_crlf(text: str, pos: int) -> bool:
+    return text.startswith("\r\n", pos)
+
+def line_start(text: str, pos: int) -> int:
+    """Offset of the start of the line that holds `pos`"""
+    if 0 < pos < len(text) and _is_crlf(text, pos - 1):
+        pos -= 1
+    return _rfind_break(text, pos) + 1
+
+def next_line_start(text: str, pos: int) -> int:
+    """Offset of the start of the line after the one that holds `pos`, the end of the text for the last line"""
+    if 0 < pos < len(text) and _is_crlf(text, pos - 1):
+        pos -= 1
+    found = _find_break(text, pos)
+    if found == -1:
+        return len(text)
+    return found + (2 if _is_crlf(text, found) else 1)
+
+def count_lines(text: str, end: int) -> int:
+    """The number of line breaks before `end`"""
+    return sum(text.count(c, 0, end) for c in LINE_BREAKS) - text.count("\r\n", 0, end)
+
+def _format_range(start: int, stop: int) -> str:
+    # `difflib._format_range_unified`
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+def _group_opcodes(codes: list[Opcode], n: int) -> Iterator[list[Opcode]]:
+    # `difflib.SequenceMatcher.get_grouped_opcodes`
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > n * 2:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+def _window_opcodes(a: list[str], b: list[str]) -> list[Opcode]:
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < min(len(a), len(b)) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    if prefix == len(a) == len(b):
+        return []
+
+    a_middle, b_middle = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    if len(a_middle) + len(b_middle) <= MATCH_MAX_LINES:
+        middle = difflib.SequenceMatcher(None, a_middle, b_middle).get_opcodes()
+    else:
+        tag = "replace" if a_middle and b_middle else ("delete" if a_middle else "insert")
+        middle = [(tag, 0, len(a_middle), 0, len(b_middle))]
+
+    codes = [("equal", 0, prefix, 0, prefix)] if prefix else []
+    codes += [(tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in middle]
+    if suffix:
+        codes.append(("equal", len(a) - suffix, len(a), len(b) - suffix, len(b)))
+    return codes
+
+def edit_diff(text: str, start: int, end: int, new_text: str, file_name: str,
+              context: int = 3, max_chars: int | None = None, max_line_chars: int | None = None) -> str:
+    """
+    The unified diff of replacing `text[start:end]` with `new_text`,
+    as `difflib.unified_diff` over the lines of the whole text formats it,
+    computed from the lines around the replacement only.
+
+    The diff is cut after `max_chars` characters with a footer telling where the changed lines are,
+    and its lines are clipped to `max_line_chars` characters around the column of the edit.
+    """
+    # `context` lines around the lines touched by the replacement, every line of the diff is in this window
+    window_start = line_start(text, start)
+    column = start - window_start
+    for _ in range(context):
+        if window_start == 0:
+            break
+        window_start = line_start(text, window_start - 1)
+    window_end = next_line_start(text, end)
+    for _ in range(context):
+        window_end = next_line_start(text, window_end)
+
+    a = text[window_start:window_end].splitlines()
+    b = (text[window_start:start] + new_text + text[end:window_end]).splitlines()
+    codes = _window_opcodes(a, b)
+    if not codes:
+        return ""
+    first_line = count_lines(text, window_start)
+
+    lines = [f"--- a/{file_name}\n", f"+++ b/{file_name}\n"]
+    size = sum(len(line) + 1 for line in lines)
+    truncated = False
+
+    def add(line: str) -> bool:
+        nonlocal size, truncated
+        if max_line_chars is not None:
+            line = clip_line(line, column + 1, max_line_chars)
+        if max_chars is not None and size + len(line) + 1 > max_chars:
+            truncated = True
+            return False
+        lines.append(line)
+        size += len(line) + 1
+        return True
+
+    for group in _group_opcodes(codes, context):
+        first, last = group[0], group[-1]
+        from_range = _format_range(first_line + first[1], first_line + last[2])
+        to_range = _format_range(first_line + first[3], first_line + last[4])
+        if not add(f"@@ -{from_range} +{to_range} @@\n"):
+            break
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                changed = [" " + line for line in a[i1:i2]]
+            else:
+                changed = ["-" + line for line in a[i1:i2]] + ["+" + line for line in b[j1:j2]]
+            if not all(add(line) for line in changed):
+                break
+        if truncated:
+            break
+
+    if truncated:
+        changes = [code for code in codes if code[0] != "equal"]
+        changed_start = first_line + changes[0][3] + 1
+        changed_end = max(changed_start, first_line + changes[-1][4])
+        lines.append(f"[Diff truncated at {max_chars} characters. The edit changed lines "
+                     f"{changed_start}-{changed_end} of the new file, call read_file with offset={changed_start} "
+                     "to see them.]")
+    return "\n".join(lines)
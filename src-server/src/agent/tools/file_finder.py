@@ -0,0 +1,265 @@
+import heapq
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import compress
+from ..tool_executor import check_cancelled
+from .ignore_rules import IGNORE_FILE_NAME, IgnoreRules, compile_glob
+from .workspace_index import WorkspaceIndex
+
+# a pattern with one of these is a glob, otherwise it is matched as a fuzzy subsequence
+GLOB_CHARACTERS = "*?["
+
+@dataclass
+class FindResult:
+    # relative to the searched directory, best match first
+    paths: list[str]
+    # number of matching files, before the limit
+    match_count: int
+    files_searched: int
+
+def is_glob(pattern: str) -> bool:
+    return any(char in pattern for char in GLOB_CHARACTERS)
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+def _walk_paths(root: str, ignore_rules: IgnoreRules | None, stamps: dict[str, int]) -> list[str]:
+    """
+    Files below the directory, ignored paths are skipped and symlinks to directories are not followed.
+    The mtimes of the walked directories and ignore files are recorded in `stamps`.
+    """
+    if ignore_rules is None:
+        base = ""
+        chain = None
+    else:
+        base = os.path.relpath(root, ignore_rules.root).replace(os.sep, "/")
+        base = "" if base == "." else base
+        chain = ignore_rules.chain_for(base)
+        # the ignore files of the parents apply too
+        directory = ignore_rules.root
+        for part in ([""] + base.split("/") if base else [""]):
+            directory = os.path.join(directory, part)
+            ignore_file = os.path.join(directory, IGNORE_FILE_NAME)
+            stamps[ignore_file] = _mtime(ignore_file)
+
+    paths = []
+    pending = [(root, "", chain)]
+    while len(pending) > 0:
+        check_cancelled()
+        directory, relative_directory, chain = pending.pop()
+        stamps[directory] = _mtime(directory)
+        try:
+            scanner = os.scandir(directory)
+        except OSError:
+            continue
+        with scanner:
+            for entry in scanner:
+                relative_path = f"{relative_directory}/{entry.name}" if relative_directory else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if chain is not None:
+                    rule_path = f"{base}/{relative_path}" if base else relative_path
+                    if chain.is_ignored(rule_path, is_dir):
+                        continue
+                if not is_dir:
+                    paths.append(relative_path)
+                    if entry.name == IGNORE_FILE_NAME:
+                        stamps[entry.path] = _mtime(entry.path)
+                elif not entry.is_symlink():
+                    child_chain = chain.descend(entry.path, rule_path) if chain is not None else None
+                    pending.append((entry.path, relative_path, child_chain))
+    paths.sort()
+    return paths
+
+def _glob_rank(paths: list[str], pattern: str, max_results: int) -> tuple[list[str], int]:
+    regex = compile_glob(pattern, ignore_case=True)
+    if regex is None:
+        return [], 0
+    matches = list(filter(regex.fullmatch, paths))
+    # the shallow files first
+    return heapq.nsmallest(max_results, matches, key=lambda path: (path.count("/"), path)), len(matches)
+
+def _subsequence_regex(query: str) -> re.Pattern[str]:
+    # `[^c]*c` for each character finds the subsequence without backtracking,
+    # the group spans from the first character of the query to the last one
+    parts = [f"[^{re.escape(char)}]*" + (f"({re.escape(char)}" if index == 0 else re.escape(char))
+             for index, char in enumerate(query)]
+    return re.compile("".join(parts) + ")", re.DOTALL)
+
+def _fuzzy_rank(paths: list[str], lowered: list[str], pattern: str, max_results: int) -> tuple[list[str], int]:
+    query = "".join(pattern.lower().split())
+    subsequence = _subsequence_regex(query)
+    selected = list(compress(range(len(paths)), map(subsequence.match, lowered)))
+
+    def rank(index: int) -> tuple[int, int, int, str]:
+        path = lowered[index]
+        name = path[path.rfind("/") + 1:]
+        span = len(query)
+        if name == query or os.path.splitext(name)[0] == query:
+            tier = 0
+        elif name.startswith(query):
+            tier = 1
+        elif query in name:
+            tier = 2
+        elif query in path:
+            tier = 3
+        else:
+            # the characters of the query spread over the name, or over the whole path
+            match = subsequence.match(name)
+            tier = 4 if match is not None else 5
+            if match is None:
+                match = subsequence.match(path)
+            assert match is not None
+            span = match.end(1) - match.start(1)
+        return tier, span, len(path), paths[index]
+
+    return [paths[index] for index in heapq.nsmallest(max_results, selected, key=rank)], len(selected)
+
+class PathList:
+    """
+    The file paths below a directory, kept in memory so that repeated lookups do not walk the disk.
+    With the workspace index, the changes notified by the index are applied to the list,
+    otherwise the list is reloaded when the mtime of one of the walked directories or ignore files changed.
+    """
+    # results of the recent lookups, dropped when the list changes
+    MAX_CACHED_RESULTS = 64
+
+    def __init__(self, root: str, index: WorkspaceIndex | None = None, ignore_rules: IgnoreRules | None = None):
+        self.root = root
+        self.index = index
+        self._ignore_rules = ignore_rules
+        self._lock = threading.Lock()
+        # relative to the root, sorted
+        self._paths: list[str] = []
+        self._lowered: list[str] = []
+        self._loaded = False
+        # the mtimes of the directories and ignore files of the walk, without the index
+        self._stamps: dict[str, int] = {}
+        # the paths changed in the index since the list was loaded, "" when the whole index changed
+        self._changes_lock = threading.Lock()
+        self._changed: set[str] = set()
+        self._results: OrderedDict[tuple[str, str, int], FindResult] = OrderedDict()
+        if index is not None:
+            index.add_listener(self._on_index_changed)
+
+    def _on_index_changed(self, paths: list[str]):
+        with self._changes_lock:
+            for path in paths:
+                name = path.rpartition("/")[2]
+                # the ignore file changes the entries of its whole directory
+                self._changed.add(path.rpartition("/")[0] if name == IGNORE_FILE_NAME else path)
+
+    def _take_changes(self) -> set[str]:
+        with self._changes_lock:
+            changed = self._changed
+            self._changed = set()
+        return changed
+
+    def _load(self) -> bool:
+        if self.index is not None:
+            self._take_changes()
+            paths = self.index.file_paths()
+            if paths is None:
+                return False
+            self._paths = paths
+        else:
+            stamps: dict[str, int] = {}
+            self._paths = _walk_paths(self.root, self._ignore_rules, stamps)
+            self._stamps = stamps
+        self._lowered = [path.lower() for path in self._paths]
+        self._loaded = True
+        self._results.clear()
+        return True
+
+    def _apply_changes(self, changed: set[str]) -> bool:
+        """Replace the changed paths and the files below them with the content of the index"""
+        assert self.index is not None
+        for path in sorted(changed):
+            start = bisect_left(self._paths, path)
+            if start < len(self._paths) and self._paths[start] == path:
+                del self._paths[start], self._lowered[start]
+            start = bisect_left(self._paths, f"{path}/")
+            end = bisect_left(self._paths, f"{path}0")
+            del self._paths[start:end], self._lowered[start:end]
+            added = self.index.file_paths(path)
+            if added is None:
+                return False
+            for added_path in added:
+                index = bisect_left(self._paths, added_path)
+                self._paths.insert(index, added_path)
+                self._lowered.insert(index, added_path.lower())
+        self._results.clear()
+        return True
+
+    def _refresh(self) -> bool:
+        """Bring the list up to date, False if the index is not ready"""
+        if not self._loaded:
+            return self._load()
+        if self.index is None:
+            if any(_mtime(path) != mtime_ns for path, mtime_ns in self._stamps.items()):
+                return self._load()
+            return True
+        if len(changed := self._take_changes()) == 0:
+            return True
+        if "" in changed or len(changed) > 1000 or not self._apply_changes(changed):
+            return self._load()
+        return True
+
+    def _subtree(self, relative_root: str) -> tuple[list[str], list[str]]:
+        if relative_root == "":
+            return self._paths, self._lowered
+        start = bisect_left(self._paths, f"{relative_root}/")
+        end = bisect_left(self._paths, f"{relative_root}0")
+        prefix_length = len(relative_root) + 1
+        return ([path[prefix_length:] for path in self._paths[start:end]],
+                [path[prefix_length:] for path in self._lowered[start:end]])
+
+    def find(self, pattern: str, relative_root: str = "", max_results: int = 50) -> FindResult | None:
+        """
+        The files below `relative_root` matching a glob or a fuzzy pattern, best match first.
+        None if the workspace index is not ready.
+        """
+        key = (pattern, relative_root, max_results)
+        with self._lock:
+            if not self._refresh():
+                return None
+            if (cached := self._results.get(key)) is not None:
+                self._results.move_to_end(key)
+                return cached
+            paths, lowered = self._subtree(relative_root)
+            if is_glob(pattern):
+                matches, match_count = _glob_rank(paths, pattern, max_results)
+            else:
+                matches, match_count = _fuzzy_rank(paths, lowered, pattern, max_results)
+            result = self._results[key] = FindResult(matches, match_count, len(paths))
+            if len(self._results) > self.MAX_CACHED_RESULTS:
+                self._results.popitem(last=False)
+            return result
+
+_path_lists: OrderedDict[tuple[str, bool], PathList] = OrderedDict()
+_path_lists_lock = threading.Lock()
+_MAX_PATH_LISTS = 16
+
+def use_path_list(root: str, index: WorkspaceIndex | None = None, ignore_rules: IgnoreRules | None = None) -> PathList:
+    """
+    The path list of a directory, shared by all tasks.
+    With the workspace index `root` should be the root of the index, otherwise the directory is walked.
+    """
+    key = (root, index is not None)
+    with _path_lists_lock:
+        path_list = _path_lists.get(key)
+        if path_list is None or path_list.index is not index:
+            path_list = _path_lists[key] = PathList(root, index, ignore_rules)
+        _path_lists.move_to_end(key)
+        if len(_path_lists) > _MAX_PATH_LISTS:
+            _path_lists.popitem(last=False)
+        return path_list
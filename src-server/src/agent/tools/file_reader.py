@@ -0,0 +1,211 @@
+import bisect
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+# Lines are skipped by counting the line breaks of chunks of this size,
+# the (line number, byte offset) at the end of each skipped chunk is remembered per file,
+# so that paging deep into a large file does not rescan it from the start.
+SKIP_CHUNK_BYTES = 1 << 20
+
+# The line breaks of the universal newlines mode: "\r\n", a bare "\r" and "\n"
+_LINE_BREAK = re.compile(rb"\r\n?|\n")
+
+@dataclass
+class TextSlice:
+    lines: list[str]
+    # 1-based number of the first line in `lines`
+    start_line: int
+    # whether the file has more content after the slice
+    has_more: bool
+    # whether the slice was cut by the byte limit rather than the line limit
+    truncated_by_bytes: bool = False
+    # whether the last line itself was longer than the byte limit and was cut
+    line_cut: bool = False
+
+    @property
+    def end_line(self) -> int:
+        return self.start_line + len(self.lines) - 1
+
+class _LineCheckpoints:
+    def __init__(self, max_files: int = 32):
+        self._lock = threading.Lock()
+        self._files: OrderedDict[tuple[str, int, int], list[tuple[int, int]]] = OrderedDict()
+        self._max_files = max_files
+
+    def get(self, key: tuple[str, int, int], start: int = 0) -> list[tuple[int, int]]:
+        with self._lock:
+            if (checkpoints := self._files.get(key)) is None:
+                return [(1, start)]
+            self._files.move_to_end(key)
+            return list(checkpoints)
+
+    def put(self, key: tuple[str, int, int], checkpoints: list[tuple[int, int]]):
+        with self._lock:
+            current = self._files.get(key)
+            if current is not None and len(current) >= len(checkpoints):
+                return
+            self._files[key] = checkpoints
+            self._files.move_to_end(key)
+            if len(self._files) > self._max_files:
+                self._files.popitem(last=False)
+
+_line_checkpoints = _LineCheckpoints()
+
+def _decode_line(raw: bytes, encoding: str, errors: str, cut: bool) -> str:
+    raw = raw.removesuffix(b"\n").removesuffix(b"\r")
+    # a line cut at the byte limit may end in the middle of a character
+    return raw.decode(encoding, errors="ignore" if cut else errors)
+
+def split_lines(text: str) -> list[str]:
+    """
+    Split on `\r\n`, `\r` and `\n` like the line by line reading does,
+    unlike `str.splitlines` the other Unicode line breaks stay in the lines.
+    """
+    lines = re.split(r"\r\n|\r|\n", text) if "\r" in text else text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+def _skip_lines(mm: mmap.mmap, key: tuple[str, int, int], offset: int, start: int) -> int:
+    """Return the byte position of the line `offset` (1-based), or the file size if it is beyond the end"""
+    checkpoints = _line_checkpoints.get(key, start)
+    line, position = checkpoints[bisect.bisect_right(checkpoints, (offset, float("inf"))) - 1]
+    size = len(mm)
+    while line < offset and position < size:
+        chunk = mm[position:position + SKIP_CHUNK_BYTES]
+        if chunk.endswith(b"\r"):
+            # keep a "\r\n" in one chunk, it is a single line break
+            chunk = mm[position:position + len(chunk) + 1]
+        # the end of every line break, only needed when a bare "\r" may be one
+        ends = [match.end() for match in _LINE_BREAK.finditer(chunk)] if b"\r" in chunk else None
+        count = chunk.count(b"\n") if ends is None else len(ends)
+        if count < offset - line:
+            if count == 0:
+                # inside a very long line
+                position += len(chunk)
+                continue
+            position += chunk.rfind(b"\n") + 1 if ends is None else ends[-1]
+            line += count
+            bisect.insort(checkpoints, (line, position))
+            continue
+        if ends is None:
+            local_position = 0
+            for _ in range(offset - line):
+                local_position = chunk.find(b"\n", local_position) + 1
+            position += local_position
+        else:
+            position += ends[offset - line - 1]
+        line = offset
+    _line_checkpoints.put(key, checkpoints)
+    return min(position, size)
+
+def read_text_lines(path: Path,
+                    offset: int = 1,
+                    limit: int | None = None,
+                    max_bytes: int | None = None,
+                    encoding: str = "utf-8",
+                    errors: str = "strict",
+                    start: int = 0) -> TextSlice:
+    """
+    Read `limit` lines starting from the line `offset` (1-based) of a text file,
+    stopping before the slice exceeds `max_bytes` bytes.
+    The file is memory-mapped, only the bytes up to the end of the slice are touched.
+    `start` is the number of leading bytes to skip, e.g. a byte order mark.
+    Lines end at `\r\n`, `\r` or `\n`, the encoding must keep them single bytes,
+    see `FileSniff.is_wide_encoding`.
+    """
+    if offset < 1:
+        raise ValueError(f"Invalid offset: {offset}, line numbers start from 1")
+    if limit is not None and limit < 1:
+        raise ValueError(f"Invalid limit: {limit}")
+
+    stat = os.stat(path)
+    if stat.st_size <= start:
+        return TextSlice([], offset, has_more=False)
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        position = _skip_lines(mm, (str(path), stat.st_size, stat.st_mtime_ns), offset, start)
+
+        if max_bytes is None or size - position <= max_bytes:
+            # the rest of the file is within the byte limit, decode it at once instead of line by line
+            lines = split_lines(mm[position:].decode(encoding, errors))
+            if limit is not None and len(lines) > limit:
+                return TextSlice(lines[:limit], offset, has_more=True)
+            return TextSlice(lines, offset, has_more=False)
+
+        lines: list[str] = []
+        used_bytes = 0
+        truncated_by_bytes = line_cut = False
+        while position < size and (limit is None or len(lines) < limit):
+            line_break = _LINE_BREAK.search(mm, position)
+            line_end = end = size if line_break is None else line_break.end()
+            if max_bytes is not None and used_bytes + (line_end - position) > max_bytes:
+                truncated_by_bytes = True
+                if len(lines) > 0:
+                    break
+                # the first line alone is over the limit, return its beginning
+                end = position + max_bytes
+                line_cut = True
+            lines.append(_decode_line(mm[position:end], encoding, errors, line_cut))
+            used_bytes += end - position
+            position = line_end
+            if line_cut:
+                break
+
+    return TextSlice(lines, offset,
+                     has_more=position < size,
+                     truncated_by_bytes=truncated_by_bytes,
+                     line_cut=line_cut)
+
+def slice_lines(all_lines: list[str],
+                offset: int = 1,
+                limit: int | None = None,
+                max_bytes: int | None = None) -> TextSlice:
+    """Apply the same range and byte limit as `read_text_lines` to lines already in memory"""
+    if offset < 1:
+        raise ValueError(f"Invalid offset: {offset}, line numbers start from 1")
+    if limit is not None and limit < 1:
+        raise ValueError(f"Invalid limit: {limit}")
+
+    stop = len(all_lines) if limit is None else min(len(all_lines), offset - 1 + limit)
+    lines: list[str] = []
+    used_bytes = 0
+    truncated_by_bytes = line_cut = False
+    for line in all_lines[offset - 1:stop]:
+        line_bytes = len(line.encode("utf-8")) + 1
+        if max_bytes is not None and used_bytes + line_bytes > max_bytes:
+            truncated_by_bytes = True
+            if len(lines) == 0:
+                lines.append(line.encode("utf-8")[:max_bytes].decode("utf-8", errors="ignore"))
+                line_cut = True
+            break
+        lines.append(line)
+        used_bytes += line_bytes
+
+    return TextSlice(lines, offset,
+                     has_more=offset - 1 + len(lines) < len(all_lines),
+                     truncated_by_bytes=truncated_by_bytes,
+                     line_cut=line_cut)
+
+def format_truncation_footer(text_slice: TextSlice, max_bytes: int | None) -> str | None:
+    """A hint for the model about how to read the rest of the file, None if nothing was left out"""
+    if len(text_slice.lines) == 0 and text_slice.start_line > 1:
+        return f"[No lines at offset {text_slice.start_line}, the file has fewer lines.]"
+    if not (text_slice.has_more or text_slice.line_cut):
+        return None
+    if text_slice.line_cut:
+        reason = f"line {text_slice.end_line} is longer than {max_bytes} bytes and was cut"
+    elif text_slice.truncated_by_bytes:
+        reason = f"output limited to {max_bytes} bytes"
+    else:
+        reason = "line limit reached"
+    footer = f"[Truncated: showing lines {text_slice.start_line}-{text_slice.end_line}, {reason}."
+    if text_slice.has_more:
+        footer += f" Call read_file with offset={text_slice.end_line + 1} to read more."
+    return footer + "]"
@@ -0,0 +1,123 @@
+import codecs
+import mimetypes
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from charset_normalizer import from_bytes
+
+# Only this many bytes from the beginning of a file are inspected
+SNIFF_BYTES = 8192
+
+# Share of control characters above which a file without NUL bytes is still considered binary
+_CONTROL_CHARS_THRESHOLD = 0.3
+_TEXT_CONTROL_CHARS = frozenset(b"\t\n\r\f\b\x1b")
+
+_BOMS = (
+    # UTF-32 must be checked before UTF-16, they share the leading bytes
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+_MAGIC_NUMBERS = (
+    (b"\x89PNG\r\n\x1a\n", "PNG image"),
+    (b"\xff\xd8\xff", "JPEG image"),
+    (b"GIF87a", "GIF image"),
+    (b"GIF89a", "GIF image"),
+    (b"BM", "BMP image"),
+    (b"%PDF-", "PDF document"),
+    (b"PK\x03\x04", "ZIP archive (or a format based on it)"),
+    (b"\x1f\x8b", "gzip archive"),
+    (b"BZh", "bzip2 archive"),
+    (b"\xfd7zXZ\x00", "xz archive"),
+    (b"7z\xbc\xaf\x27\x1c", "7-Zip archive"),
+    (b"Rar!\x1a\x07", "RAR archive"),
+    (b"\x7fELF", "ELF executable or shared library"),
+    (b"MZ", "Windows executable or DLL"),
+    (b"\xcf\xfa\xed\xfe", "Mach-O binary"),
+    (b"\xca\xfe\xba\xbe", "Mach-O universal binary or Java class"),
+    (b"\x00asm", "WebAssembly module"),
+    (b"SQLite format 3\x00", "SQLite database"),
+    (b"ID3", "MP3 audio"),
+    (b"OggS", "Ogg media"),
+    (b"fLaC", "FLAC audio"),
+)
+
+@dataclass
+class FileSniff:
+    is_binary: bool
+    # encoding to decode the text with, None for binary files
+    encoding: str | None = None
+    # length of the byte order mark to skip
+    bom_length: int = 0
+    # type detected from the magic number, for binary files
+    file_type: str | None = None
+
+    @property
+    def is_wide_encoding(self) -> bool:
+        """Encodings where a line break is more than one byte, lines can not be split on raw bytes"""
+        return self.encoding is not None and self.encoding.startswith(("utf-16", "utf-32"))
+
+def _detect_magic(sample: bytes) -> str | None:
+    for magic, file_type in _MAGIC_NUMBERS:
+        if sample.startswith(magic):
+            return file_type
+    if sample[8:12] in (b"WEBP", b"WAVE", b"AVI "):
+        return f"RIFF {sample[8:12].decode().strip()} media"
+    return None
+
+def _is_utf8(sample: bytes, complete: bool) -> bool:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        # an incomplete file sample may end in the middle of a character
+        decoder.decode(sample, final=complete)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def sniff_file(path: Path) -> FileSniff:
+    """Tell binary files from text files and detect the text encoding from the first few KB"""
+    with open(path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+    complete = len(sample) < SNIFF_BYTES
+
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return FileSniff(is_binary=False, encoding=encoding, bom_length=len(bom))
+
+    if b"\x00" in sample:
+        return FileSniff(is_binary=True, file_type=_detect_magic(sample))
+
+    if _is_utf8(sample, complete):
+        return FileSniff(is_binary=False, encoding="utf-8")
+
+    control_chars = sum(1 for byte in sample if byte < 0x20 and byte not in _TEXT_CONTROL_CHARS)
+    if control_chars > len(sample) * _CONTROL_CHARS_THRESHOLD:
+        return FileSniff(is_binary=True, file_type=_detect_magic(sample))
+
+    # legacy encodings, e.g. GBK, Shift_JIS, Windows-1252
+    best_match = from_bytes(sample).best()
+    if best_match is None:
+        return FileSniff(is_binary=True, file_type=_detect_magic(sample))
+    return FileSniff(is_binary=False, encoding=best_match.encoding)
+
+def _format_size(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{size} B"
+
+def describe_binary_file(path: Path, display_path: str, sniff: FileSniff) -> str:
+    """A short metadata summary returned instead of the content of a binary file"""
+    stat = path.stat()
+    file_type = sniff.file_type or mimetypes.guess_type(path.name)[0] or "unknown binary data"
+    modified_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stat.st_mtime))
+    return (f"[Binary file: {display_path}]\n"
+            f"Type: {file_type}\n"
+            f"Size: {_format_size(stat.st_size)} ({stat.st_size} bytes)\n"
+            f"Modified: {modified_at}\n"
+            "The content of binary files is not shown.")
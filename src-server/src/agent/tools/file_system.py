@@ -1,32 +1,166 @@
-import difflib
+import contextvars
+import itertools
+import os
+import re
 import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from markitdown import MarkItDown
+from ..tool_executor import check_cancelled
+from .file_reader import read_text_lines, slice_lines, format_truncation_footer
+from .file_sniffer import sniff_file, describe_binary_file
+from .conversion_cache import use_conversion_cache
+from .directory_lister import scan_tree, index_tree, render_listing
+from .ignore_rules import DEFAULT_IGNORE_PATTERNS, IgnoreRules
+from .workspace_index import IndexState, WorkspaceIndex
+from .trigram_index import TrigramIndex
+from .content_search import Candidate, PathFilter, collect_candidates, run_search, render_result
+from .file_finder import is_glob, use_path_list
+from .file_tracker import FileTracker, new_digest
+from .file_writer import FsyncPolicy, encode_text, write_atomic
+from .edit_diff import edit_diff
+from .document_index import DocumentIndex, query_tokens
+from ...utils.document_converter import use_document_converter
+from ...utils.text_search import SearchQuery, clip_line
+
+_io_executor: ThreadPoolExecutor | None = None
+_io_executor_lock = threading.Lock()
+
+def _use_io_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FileSystemIO")
+        return _io_executor
 
 class FileSystemTool:
-    def __init__(self, cwd: str):
+    # Upper limit of the content returned by one read_file call, in bytes
+    READ_FILE_MAX_BYTES = 128 * 1024
+    # Upper limit of the content returned by one read_file_batch call, in bytes
+    READ_BATCH_MAX_BYTES = 512 * 1024
+    # Number of threads shared by all batch reads
+    READ_BATCH_WORKERS = 8
+    # Upper limit of the entries returned by one list_directory call
+    LIST_DIRECTORY_MAX_ENTRIES = 2000
+    # Upper limit of the matching lines returned by one search_files call
+    SEARCH_MAX_MATCHES = 200
+    SEARCH_MAX_CONTEXT_LINES = 10
+    # Files larger than this are not searched
+    SEARCH_MAX_FILE_BYTES = 16 * 1024 * 1024
+    # Searches over more bytes than this run in worker processes, one per core
+    SEARCH_PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+    SEARCH_WORKERS = min(os.cpu_count() or 1, 8)
+    # Default and upper limit of the paths returned by one find_files call
+    FIND_DEFAULT_RESULTS = 50
+    FIND_MAX_RESULTS = 500
+    # Default and upper limit of the files returned by one search_documents call
+    DOCUMENTS_DEFAULT_RESULTS = 5
+    DOCUMENTS_MAX_RESULTS = 20
+    # Seconds a search waits for the document index to catch up with the workspace
+    DOCUMENTS_INDEX_WAIT = 5
+    # Lines of a passage shown for each result
+    DOCUMENTS_SNIPPET_LINES = 3
+    DOCUMENTS_SNIPPET_LINE_CHARS = 200
+    # Paths skipped in addition to the .gitignore files of the workspace
+    IGNORE_PATTERNS = DEFAULT_IGNORE_PATTERNS
+    # How far write_file and edit_file flush the written files to disk before returning
+    WRITE_FSYNC = FsyncPolicy.FILE
+    # Upper limit of the diff returned by one edit_file call, and of each of its lines, in characters
+    EDIT_DIFF_MAX_CHARS = 20_000
+    EDIT_DIFF_LINE_CHARS = 1000
+
+    def __init__(self,
+                 cwd: str,
+                 workspace_index: WorkspaceIndex | None = None,
+                 trigram_index: TrigramIndex | None = None,
+                 document_index: DocumentIndex | None = None):
         if cwd == "~":
             cwd = str(Path.home())
         self.cwd = cwd
-        self.md = MarkItDown()
+        self._workspace_index = workspace_index
+        self._trigram_index = trigram_index
+        self._document_index = document_index
+        self.md = use_document_converter()
+        self._conversion_cache = use_conversion_cache()
+
+        # the files read or written by the agent, by absolute path
+        self._read_files = FileTracker()
+
+    def _ignore_rules(self, abs_path: Path) -> IgnoreRules:
+        """Ignore rules rooted at the workspace, or at the path itself if it is outside the workspace"""
+        workspace = Path(self.cwd).resolve()
+        root = workspace if abs_path.is_relative_to(workspace) else abs_path
+        return IgnoreRules(str(root), self.IGNORE_PATTERNS)
+
+    def _index_relative_path(self, abs_path: Path) -> str | None:
+        """Path relative to the root of the workspace index, None if the path is outside of it"""
+        if self._workspace_index is None:
+            return None
+        index_root = Path(self._workspace_index.root)
+        if not abs_path.is_relative_to(index_root):
+            return None
+        relative_path = abs_path.relative_to(index_root).as_posix()
+        return "" if relative_path == "." else relative_path
+
+    def _start_indexes(self):
+        """The indexes are built and watch the workspace from the first search on, until then the tools read the disk"""
+        if self._workspace_index is not None:
+            self._workspace_index.start()
+        if self._trigram_index is not None:
+            self._trigram_index.start()
+
+    def _notify_changed(self, *abs_paths: Path):
+        """Apply the changes made by a tool to the workspace index without waiting for the file system events"""
+        if self._workspace_index is not None:
+            self._workspace_index.apply_changes(str(abs_path.absolute()) for abs_path in abs_paths)
+
+    def _write_text(self, abs_path: Path, text: str, replacement: tuple[int, int, str] | None = None) -> bytes:
+        """
+        Replace the file with `text`, or with `text` where the (start, end, new text) replacement is applied,
+        returns the hash of the written bytes.
+        """
+        digest = new_digest()
+        if replacement is None:
+            parts = encode_text(text)
+        else:
+            start, end, new_text = replacement
+            parts = itertools.chain(encode_text(text, 0, start), encode_text(new_text), encode_text(text, end))
 
-        # this set should stores file absolute path
-        self._read_file_set = set()
+        def chunks():
+            for chunk in parts:
+                # a cancelled write leaves the file as it was
+                check_cancelled()
+                digest.update(chunk)
+                yield chunk
+
+        write_atomic(abs_path, chunks(), self.WRITE_FSYNC)
+        return digest.digest()
 
     def _is_markitdown_convertable_binary(self, path: str) -> bool:
         return Path(path).suffix.lower() in (".pdf", ".docx", ".pptx", ".xlsx", ".epub")
 
-    def read_file(self, path: str, enable_line_numbers: bool = False) -> str:
+    def read_file(self,
+                  path: str,
+                  enable_line_numbers: bool = False,
+                  offset: int = 1,
+                  limit: int | None = None,
+                  max_bytes: int | None = None) -> str:
         """
         Request to read the contents of a file at the specified path.
         For text files, this tool will directly return the file content;
-        for .pdf, .docx, .pptx, .xlsx, .epub files, this tool will convert the file to markdown format and return the markdown text.
+        for .pdf, .docx, .pptx, .xlsx, .epub files, this tool will convert the file to markdown format and return the markdown text;
+        for other binary files, only a short summary of the file type and size is returned.
         Use this when you need to examine the contents of an existing file you do not know the contents of,\
         for example to analyze code, review text files, or extract information from configuration files.
+        Large files are returned in parts, in that case a footer at the end of the result tells the offset to continue reading from.
 
         Args:
             path: (required) The path of the file to read (relative to the current working directory).
             enable_line_numbers: (optional, default: False) Whether to add line numbers to the file content, if you want to edit the read file later, you may need to enable this option.
+            offset: (optional, default: 1) The line number to start reading from, line numbers start from 1.
+            limit: (optional, default: None) The maximum number of lines to read, read to the end of the file if not specified.
+            max_bytes: (optional, default: 131072) The maximum size of the returned content in bytes.
 
         Raises:
             FileNotFoundError: If the specified path does not exist            
@@ -39,19 +173,43 @@ class FileSystemTool:
         if not abs_path.exists():
             raise FileNotFoundError(f"File not found at {path}")
 
+        if max_bytes is None or max_bytes > self.READ_FILE_MAX_BYTES:
+            max_bytes = self.READ_FILE_MAX_BYTES
+
+        # before the content is read, a change made during the read must not be recorded as seen
+        stat = abs_path.stat()
         if self._is_markitdown_convertable_binary(path):
-            result = self.md.convert(abs_path)
-            lines = result.markdown.splitlines()
+            markdown = self._conversion_cache.get_or_convert(
+                abs_path, lambda file_path: self.md.convert(file_path, cancel_check=check_cancelled).markdown)
+            text_slice = slice_lines(markdown.splitlines(), offset, limit, max_bytes)
         else:
-            with open(abs_path, "r", encoding="utf-8") as f:
-                lines = f.read().splitlines()
+            sniff = sniff_file(abs_path)
+            if sniff.is_binary:
+                return describe_binary_file(abs_path, path, sniff)
+            assert sniff.encoding is not None
+            if sniff.is_wide_encoding:
+                # line breaks of UTF-16/32 are not a single byte, decode the whole file
+                text = abs_path.read_bytes()[sniff.bom_length:].decode(sniff.encoding, errors="replace")
+                text_slice = slice_lines(text.splitlines(), offset, limit, max_bytes)
+            else:
+                # the encoding is sniffed from the beginning of the file only,
+                # undecodable bytes later in the file should not fail the whole read
+                text_slice = read_text_lines(abs_path, offset, limit, max_bytes,
+                                             encoding=sniff.encoding,
+                                             errors="replace",
+                                             start=sniff.bom_length)
 
-        self._read_file_set.add(str(abs_path))
+        self._read_files.record_read(abs_path, stat)
 
         if enable_line_numbers:
-            return "\n".join(f"{i:4d} | {line}" for i, line in enumerate(lines, 1))
+            content = "\n".join(f"{i:4d} | {line}"
+                                for i, line in enumerate(text_slice.lines, text_slice.start_line))
         else:
-            return "\n".join(lines)
+            content = "\n".join(text_slice.lines)
+
+        if (footer := format_truncation_footer(text_slice, max_bytes)) is not None:
+            return f"{content}\n\n{footer}" if content else footer
+        return content
 
     def read_file_batch(self, paths: list[str], enable_line_numbers: bool = False) -> str:
         """
@@ -60,6 +218,7 @@ class FileSystemTool:
         for .pdf, .docx, .pptx, .xlsx, .epub files, this tool will convert the file to markdown format and return the markdown text.
         Use this when you need to examine the contents of multiple existing files you do not know the contents of,
         for example to analyze code, review text files, or extract information from configuration files.
+        The total output of one call is limited, files after the limit is reached are skipped and should be read separately.
 
         Args:
             paths: (required) The paths of the files to read (relative to the current working directory).
@@ -100,25 +259,66 @@ class FileSystemTool:
             Error: File not found at not_exist.txt
             </file_content>
         """
-        result = ""
-        for path in paths:
+        def read(path: str, max_bytes: int) -> str:
             try:
-                file_content = self.read_file(path, enable_line_numbers)
+                return self.read_file(path, enable_line_numbers, max_bytes=max_bytes)
             except Exception as e:
-                file_content = f"Error: {e}"
-            result += f"""\
+                return f"Error: {e}"
+
+        # the budget of each file is reserved from its size before any read,
+        # so that no file is read past what is left of the batch output limit
+        budgets: list[int | None] = []
+        remaining = self.READ_BATCH_MAX_BYTES
+        for path in paths:
+            if remaining <= 0:
+                budgets.append(None)
+                continue
+            try:
+                size = (Path(self.cwd) / path).stat().st_size
+            except OSError:
+                # the read reports the error
+                size = 0
+            budget = min(size, remaining, self.READ_FILE_MAX_BYTES)
+            budgets.append(budget)
+            remaining -= budget
+
+        futures: dict[int, Future[str]] = {}
+        if len(paths) > 1:
+            executor = _use_io_executor(self.READ_BATCH_WORKERS)
+            # run each read in a copy of the context, so that it sees the cancellation of the tool call
+            futures = {index: executor.submit(contextvars.copy_context().run, read, path, budget)
+                       for index, (path, budget) in enumerate(zip(paths, budgets)) if budget is not None}
+
+        parts: list[str] = []
+        try:
+            for index, (path, budget) in enumerate(zip(paths, budgets)):
+                check_cancelled()
+                if budget is None:
+                    file_content = ("[Skipped: the output limit of this batch "
+                                    f"({self.READ_BATCH_MAX_BYTES} bytes) was reached, read this file separately.]")
+                else:
+                    file_content = futures[index].result() if futures else read(path, budget)
+                parts.append(f'''\
 <file_content path="{path}">
 {file_content}
 </file_content>
-"""
-        return result
-
-    def list_directory(self, path: str = ".", recursive: bool = False, max_depth: int | None = None) -> str:
+''')
+        finally:
+            for future in futures.values():
+                future.cancel()
+        return "".join(parts)
+
+    def list_directory(self,
+                       path: str = ".",
+                       recursive: bool = False,
+                       max_depth: int | None = None,
+                       max_entries: int | None = None,
+                       include_ignored: bool = False) -> str:
         """
         Request to list files and directories within the specified directory.
 
-        Use this when you need to explore the project structure, understand the codebase organization,
-        or find specific files. The tool provides a numbered list with type indicators ([file], [dir], or [symlink])
+        Use this when you need to explore the project structure or understand the codebase organization.
+        To locate files by name, use find_files instead of listing the whole tree. The tool provides a numbered list with type indicators ([file], [dir], or [symlink])
         for easy reference. Directories are listed before files, and items are sorted alphabetically
         within their type.
 
@@ -133,6 +333,12 @@ class FileSystemTool:
                        - 2: List up to 2 levels deep
                        - n: List up to n levels deep
                        This parameter is only effective when recursive=True.
+            max_entries: (optional, default: 2000) The maximum number of entries to list.
+                         When the limit is reached, the upper levels of the tree are listed first
+                         and a footer at the end of the result tells that the listing is truncated.
+            include_ignored: (optional, default: False) Whether to list the paths ignored by the .gitignore files
+                             and by the default ignore list (.git, node_modules, __pycache__, virtual environments, build output...).
+                             By default ignored files are left out and ignored directories are marked with (ignored) and not expanded.
 
         Returns:
             A formatted string containing:
@@ -183,87 +389,6 @@ class FileSystemTool:
             3 [file] __init__.py
         """
 
-        def format_item(item: Path) -> str:
-            if item.is_symlink():
-                try:
-                    target = item.readlink()
-                    item_type = f"symlink -> {target}"
-                except (OSError, ValueError):
-                    item_type = "symlink -> <unreadable>"
-            elif item.is_dir():
-                item_type = "dir"
-            else:
-                item_type = "file"
-            return f"[{item_type}] {item.name}"
-
-        def format_items_flat(directory: Path) -> list[str]:
-            """Format directory contents in non-recursive mode."""
-            try:
-                items = sorted(
-                    directory.iterdir(),
-                    key=lambda x: (not x.is_dir(), x.name.lower())
-                )
-            except PermissionError:
-                return ["Error: Permission denied"]
-
-            if len(items) == 0:
-                return ["(empty directory)"]
-
-            lines = []
-            for idx, item in enumerate(items, 1):
-                lines.append(f"{idx} {format_item(item)}")
-
-            return lines
-
-        def format_items_recursive(
-            directory: Path,
-            prefix: str,
-            indent: int,
-            current_depth: int,
-            max_depth: int | None
-        ) -> list[str]:
-            """
-            Recursively format directory contents.
-
-            Args:
-                directory: Current directory path
-                prefix: Number prefix (e.g., "1.", "1.1.")
-                indent: Indentation level
-                current_depth: Current depth (starting from 1)
-                max_depth: Maximum depth limit
-            """
-            if max_depth is not None and current_depth > max_depth:
-                return []
-
-            try:
-                items = sorted(
-                    directory.iterdir(),
-                    key=lambda x: (not x.is_dir(), x.name.lower())
-                )
-            except PermissionError:
-                return []
-
-            indent_str = "  " * indent
-
-            if len(items) == 0:
-                return [indent_str + "(empty directory)"]
-
-            lines = []
-            for idx, item in enumerate(items, 1):
-                current_prefix = f"{prefix}{idx}" if prefix else str(idx)
-
-                lines.append(f"{indent_str}{current_prefix} {format_item(item)}")
-                if item.is_dir():
-                    lines.extend(format_items_recursive(
-                        item,
-                        f"{current_prefix}.",
-                        indent + 1,
-                        current_depth + 1,
-                        max_depth
-                    ))
-
-            return lines
-
         if max_depth is not None and max_depth < 1:
             raise ValueError(f"Invalid max_depth: {max_depth}")
 
@@ -274,14 +399,325 @@ class FileSystemTool:
         if not abs_path.is_dir():
             raise NotADirectoryError(f"Path {path} is not a directory")
 
+        if max_entries is None or max_entries > self.LIST_DIRECTORY_MAX_ENTRIES:
+            max_entries = self.LIST_DIRECTORY_MAX_ENTRIES
+
+        abs_path = abs_path.resolve()
+        ignore_rules = None if include_ignored else self._ignore_rules(abs_path)
+
         result_lines = [f"Directory: {path}"]
+        depth_limit = max_depth if recursive else 1
+        if not include_ignored and (relative_path := self._index_relative_path(abs_path)) is not None:
+            assert self._workspace_index is not None
+            try:
+                listing = index_tree(self._workspace_index, relative_path, depth_limit, max_entries)
+            except FileNotFoundError:
+                # the index is not ready, or the directory is ignored
+                pass
+            else:
+                result_lines.extend(render_listing(listing, max_entries))
+                return "\n".join(result_lines)
+
+        try:
+            listing = scan_tree(str(abs_path), depth_limit, max_entries, ignore_rules)
+        except PermissionError:
+            if not recursive:
+                result_lines.append("Error: Permission denied")
+            return "\n".join(result_lines)
+        result_lines.extend(render_listing(listing, max_entries))
+        return "\n".join(result_lines)
+
+    def search_files(self,
+                     pattern: str,
+                     path: str = ".",
+                     literal: bool = False,
+                     case_sensitive: bool = True,
+                     include: list[str] | None = None,
+                     exclude: list[str] | None = None,
+                     context_lines: int = 0,
+                     max_matches: int | None = None,
+                     include_ignored: bool = False) -> str:
+        """
+        Request to search the content of the text files within the specified directory, like grep.
+        Use this to find where a symbol, string or pattern appears in the codebase, instead of reading the files one by one.
+        Binary files, documents (.pdf, .docx...) and the paths ignored by the .gitignore files are not searched.
+
+        Args:
+            pattern: (required) The regular expression (Python syntax) to search for, or the plain text if `literal` is True.
+                     The pattern is matched against each line, `^` and `$` match at the line boundaries.
+            path: (optional, default: ".") The directory or file to search (relative to the current working directory).
+            literal: (optional, default: False) Whether to search for the pattern as plain text.
+            case_sensitive: (optional, default: True) Whether the search is case sensitive.
+            include: (optional, default: None) Only search the files matching one of these globs, e.g. ["*.py", "src/**/*.ts"].
+                     A glob without a slash matches the file name at any level, a glob with a slash is relative to `path`.
+            exclude: (optional, default: None) Skip the files matching one of these globs, e.g. ["*_test.go"].
+            context_lines: (optional, default: 0, at most 10) The number of lines to show before and after each matching line.
+            max_matches: (optional, default: 200) Stop after this number of matching lines.
+            include_ignored: (optional, default: False) Whether to also search the paths ignored by the .gitignore files
+                             and by the default ignore list (.git, node_modules, __pycache__, virtual environments, build output...).
+
+        Returns:
+            A summary line, then for each file with matches its path followed by its lines,
+            `number:line` for the matching lines and `number-line` for the context lines,
+            with `--` between non-adjacent blocks when there are context lines. Files are sorted by path.
+
+        Raises:
+            FileNotFoundError: If the specified path does not exist
+            ValueError: If the pattern is not a valid regular expression
+
+        Examples:
+            Search a symbol in the Python files with one line of context:
+            >>> search_files("handle_request", "src", include=["*.py"], context_lines=1)
+            Found 3 matching lines in 2 files (35 files searched).
+
+            src/app.py
+            11-
+            12:def handle_request(request):
+            13-    session = open_session()
+            --
+            40-    try:
+            41:        return handle_request(request)
+            42-    except TimeoutError:
+
+            src/server.py
+            7:from .app import handle_request
 
-        if recursive:
-            result_lines.extend(format_items_recursive(abs_path, "", 0, 1, max_depth))
+            - - -
+
+            Literal search, case insensitive:
+            >>> search_files("TODO(", literal=True, case_sensitive=False)
+            No matches found in 120 files.
+        """
+        self._start_indexes()
+        abs_path = Path(self.cwd) / path
+        if not abs_path.exists():
+            raise FileNotFoundError(f"Path not found at {path}")
+        if max_matches is None or max_matches > self.SEARCH_MAX_MATCHES:
+            max_matches = self.SEARCH_MAX_MATCHES
+        max_matches = max(max_matches, 1)
+        context_lines = min(max(context_lines, 0), self.SEARCH_MAX_CONTEXT_LINES)
+
+        query = SearchQuery(pattern,
+                            literal=literal,
+                            case_sensitive=case_sensitive,
+                            context_lines=context_lines,
+                            max_matches=max_matches,
+                            max_file_bytes=self.SEARCH_MAX_FILE_BYTES)
+        try:
+            query.compile()
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}")
+
+        abs_path = abs_path.resolve()
+        index_relative_path = None
+        if abs_path.is_file():
+            stat = abs_path.stat()
+            candidates = [Candidate(abs_path.name, str(abs_path), stat.st_size, stat.st_mtime_ns)]
         else:
-            result_lines.extend(format_items_flat(abs_path))
+            ignore_rules = None if include_ignored else self._ignore_rules(abs_path)
+            index_relative_path = None if include_ignored else self._index_relative_path(abs_path)
+            candidates = collect_candidates(str(abs_path),
+                                            PathFilter(include, exclude),
+                                            ignore_rules,
+                                            self._workspace_index if index_relative_path is not None else None,
+                                            index_relative_path or "")
+        candidates = [candidate for candidate in candidates
+                      if not self._is_markitdown_convertable_binary(candidate.path)]
+        files_searched = len(candidates)
+        if self._trigram_index is not None and index_relative_path is not None:
+            # only the files which contain the literal parts of the pattern can match,
+            # the others count as searched
+            candidates = self._trigram_index.narrow(
+                candidates, index_relative_path, pattern, literal, case_sensitive)
+
+        result = run_search(candidates, query, max_matches, self.SEARCH_WORKERS, self.SEARCH_PARALLEL_MIN_BYTES)
+        result.files_searched = files_searched
+        cwd = Path(self.cwd).resolve()
+
+        def display_path(absolute_path: str) -> str:
+            try:
+                return Path(absolute_path).relative_to(cwd).as_posix()
+            except ValueError:
+                return absolute_path
 
-        return "\n".join(result_lines)
+        return render_result(result, display_path, max_matches, context_lines)
+
+    def find_files(self, pattern: str, path: str = ".", max_results: int | None = None) -> str:
+        """
+        Request to find files by name or path within the specified directory, like the file finder of an editor.
+        Use this to locate a file instead of listing the directories recursively.
+        The paths ignored by the .gitignore files are not searched.
+
+        Args:
+            pattern: (required) A glob if it contains `*`, `?` or `[`, e.g. "*.py" or "src/**/test_*.ts":
+                     a glob without a slash matches the file name at any level, a glob with a slash is relative to `path`.
+                     Otherwise a fuzzy pattern: its characters must appear in the path in this order, e.g. "fsys" finds file_system.py.
+                     Both are case insensitive.
+            path: (optional, default: ".") The directory to search (relative to the current working directory).
+            max_results: (optional, default: 50, at most 500) The number of paths to return.
+
+        Returns:
+            A summary line, then the matching file paths (relative to the current working directory), best match first.
+            Fuzzy matches are ranked by where the pattern appears: the file name itself, the start of the name,
+            inside the name, as a substring of the path, then spread over the name or the path. Glob matches are listed
+            from the shallowest.
+
+        Raises:
+            FileNotFoundError: If the specified path does not exist
+            NotADirectoryError: If the specified path is not a directory
+            ValueError: If the pattern is empty
+
+        Examples:
+            >>> find_files("fsys")
+            Found 2 files matching "fsys" (412 files searched).
+            src/agent/tools/file_system.py
+            tests/test_file_system.py
+
+            - - -
+
+            >>> find_files("*.toml", max_results=1)
+            Found 3 files matching "*.toml" (412 files searched).
+            pyproject.toml
+            [Showing the best 1 of 3 matches. Use a more specific pattern or path to see the others.]
+        """
+        if pattern.strip() == "" or (is_glob(pattern) and pattern.strip("/") == ""):
+            raise ValueError("The pattern is empty")
+        self._start_indexes()
+        abs_path = Path(self.cwd) / path
+        if not abs_path.exists():
+            raise FileNotFoundError(f"Directory not found at {path}")
+        if not abs_path.is_dir():
+            raise NotADirectoryError(f"Path {path} is not a directory")
+        if max_results is None:
+            max_results = self.FIND_DEFAULT_RESULTS
+        max_results = min(max(max_results, 1), self.FIND_MAX_RESULTS)
+
+        abs_path = abs_path.resolve()
+        result = None
+        if (relative_path := self._index_relative_path(abs_path)) is not None:
+            assert self._workspace_index is not None
+            path_list = use_path_list(self._workspace_index.root, self._workspace_index)
+            result = path_list.find(pattern, relative_path, max_results)
+        if result is None:
+            # the index is not ready, or the directory is outside of the workspace
+            path_list = use_path_list(str(abs_path), ignore_rules=self._ignore_rules(abs_path))
+            result = path_list.find(pattern, "", max_results)
+        assert result is not None
+
+        if result.match_count == 0:
+            return f'No files matching "{pattern}" found in {result.files_searched} files.'
+        cwd = Path(self.cwd).resolve()
+        if abs_path.is_relative_to(cwd):
+            prefix = abs_path.relative_to(cwd).as_posix()
+            prefix = "" if prefix == "." else prefix + "/"
+        else:
+            prefix = abs_path.as_posix() + "/"
+        lines = [f'Found {result.match_count} files matching "{pattern}" ({result.files_searched} files searched).']
+        lines.extend(prefix + relative_path for relative_path in result.paths)
+        if result.match_count > len(result.paths):
+            lines.append(f"[Showing the best {len(result.paths)} of {result.match_count} matches. "
+                         "Use a more specific pattern or path to see the others.]")
+        return "\n".join(lines)
+
+    def search_documents(self, query: str, path: str = ".", max_results: int | None = None) -> str:
+        """
+        Request to find the text files and documents (.pdf, .docx, .pptx, .xlsx, .epub) most relevant to a query,
+        ranked like a search engine (BM25) over passages of a few lines.
+        Use this to find which notes or documents talk about a topic, then read only the best results,
+        instead of reading whole directories. To find exact text or symbols, use search_files instead.
+
+        Args:
+            query: (required) Words describing what you are looking for, e.g. "quarterly budget review".
+                   Files containing more of the words, and the rarer ones, rank higher.
+            path: (optional, default: ".") The directory to search (relative to the current working directory).
+            max_results: (optional, default: 5, at most 20) The number of files to return.
+
+        Returns:
+            A summary line, then for each file, best first: its path, the line range of its most relevant passage,
+            and the lines of the passage with the most query words as `number:line`.
+            The line numbers of a document refer to its markdown conversion, as returned by read_file.
+
+        Raises:
+            FileNotFoundError: If the specified path does not exist
+            NotADirectoryError: If the specified path is not a directory
+            ValueError: If the query has no words, or the path is outside of the workspace
+
+        Examples:
+            >>> search_documents("release schedule")
+            Found 2 relevant files for "release schedule" (130 files indexed).
+
+            notes/planning.md (lines 21-40)
+            23:The release schedule was moved to April.
+            31:Review the schedule every Monday.
+
+            reports/roadmap.pdf (lines 101-118)
+            104:## Release plan
+        """
+        words = query_tokens(query)
+        if len(words) == 0:
+            raise ValueError("The query has no words")
+        abs_path = Path(self.cwd) / path
+        if not abs_path.exists():
+            raise FileNotFoundError(f"Directory not found at {path}")
+        if not abs_path.is_dir():
+            raise NotADirectoryError(f"Path {path} is not a directory")
+        if max_results is None:
+            max_results = self.DOCUMENTS_DEFAULT_RESULTS
+        max_results = min(max(max_results, 1), self.DOCUMENTS_MAX_RESULTS)
+
+        index = self._document_index
+        if index is None or index.state is IndexState.DISABLED:
+            reason = index.disabled_reason if index is not None else "there is no document index"
+            return f"Document search is not available in this workspace ({reason}). Use search_files instead."
+        abs_path = abs_path.resolve()
+        if (relative_root := self._index_relative_path(abs_path)) is None:
+            raise ValueError(f"Path {path} is outside of the workspace, only the workspace is indexed")
+        self._start_indexes()
+        index.start()
+        deadline = time.monotonic() + self.DOCUMENTS_INDEX_WAIT
+        while not index.wait_idle(timeout=0.1) and time.monotonic() < deadline:
+            check_cancelled()
+
+        hits = index.search(words, relative_root, max_results)
+        files_indexed = index.usage()["files"]
+        if len(hits) == 0:
+            lines = [f'No relevant files found for "{query}" ({files_indexed} files indexed).']
+        else:
+            lines = [f'Found {len(hits)} relevant files for "{query}" ({files_indexed} files indexed).']
+        terms = {token for tokens in words for token in tokens}
+        cwd = Path(self.cwd).resolve()
+        for hit in hits:
+            file_path = Path(index.workspace_index.root) / hit.path
+            display_path = file_path.relative_to(cwd).as_posix() if file_path.is_relative_to(cwd) else str(file_path)
+            lines.append("")
+            lines.append(f"{display_path} (lines {hit.start_line}-{hit.start_line + hit.line_count - 1})")
+            passage = None
+            try:
+                stat = file_path.stat()
+                if index.record(hit.path) == (stat.st_size, stat.st_mtime_ns) and\
+                   (content := index.read_lines(hit.path, convert=False)) is not None:
+                    passage = content[hit.start_line - 1:hit.start_line - 1 + hit.line_count]
+            except OSError:
+                pass
+            if passage is None:
+                lines.append("(changed since it was indexed, read the file to see the passage)")
+                continue
+            # the lines with the most query words, in their order
+            counts = [(sum(term in line.lower() for term in terms), number)
+                      for number, line in enumerate(passage, hit.start_line)]
+            best = sorted(number for count, number in
+                          sorted(counts, key=lambda item: (-item[0], item[1]))[:self.DOCUMENTS_SNIPPET_LINES]
+                          if count > 0)
+            for number in best:
+                line = passage[number - hit.start_line]
+                column = min((position for term in terms if (position := line.lower().find(term)) >= 0), default=0)
+                lines.append(f"{number}:{clip_line(line, column, self.DOCUMENTS_SNIPPET_LINE_CHARS)}")
+        if index.state is not IndexState.READY or not index.wait_idle(timeout=0):
+            done, total = index.progress
+            lines.append("")
+            lines.append(f"[The document index is still being built ({done} of {total} files indexed), "
+                         "the results may be incomplete.]")
+        return "\n".join(lines)
 
     def write_file(self, path: str, content: str) -> str:
         """
@@ -302,11 +738,17 @@ class FileSystemTool:
         """
         abs_path = Path(self.cwd) / path
 
-        if abs_path.exists() and str(abs_path) not in self._read_file_set:
-            raise PermissionError(f"File already exists and was not read before: {path}")
+        if abs_path.exists():
+            if abs_path not in self._read_files:
+                raise PermissionError(f"File already exists and was not read before: {path}")
+            if not self._read_files.is_unchanged(abs_path):
+                raise PermissionError(f"File changed on disk since it was last read: {path}, "
+                                      "read it again before overwriting it")
 
         abs_path.parent.mkdir(parents=True, exist_ok=True)
-        abs_path.write_text(content, encoding="utf-8")
+        digest = self._write_text(abs_path, content)
+        self._read_files.record_write(abs_path, digest, content if "\r" not in content else None)
+        self._notify_changed(abs_path)
         return "File written successfully."
 
     def edit_file(self, path: str, old_content: str, new_content: str) -> str:
@@ -324,33 +766,35 @@ class FileSystemTool:
             The diff of the old content and the new content.
         """
 
-        def generate_diff(old_content: str, new_content: str, file_name: str) -> str:
-            diff = difflib.unified_diff(
-                old_content.splitlines(),
-                new_content.splitlines(),
-                fromfile=f"a/{file_name}",
-                tofile=f"b/{file_name}",
-            )
-            return "\n".join(diff)
-
         abs_path = Path(self.cwd) / path
 
         if not abs_path.exists():
             raise FileNotFoundError(f"File not found at {path}")
 
-        with open(abs_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        # the text of the previous edit, unless the file changed since
+        content = self._read_files.cached_text(abs_path)
+        if content is None:
+            with open(abs_path, "r", encoding="utf-8") as f:
+                content = f.read()
 
-        count = content.count(old_content)
-        if count == 0:
+        start = content.find(old_content)
+        if start == -1:
             raise ValueError(f"Content not found in file: {path}")
-        if count > 1:
+        if content.find(old_content, start + max(len(old_content), 1)) != -1:
             raise ValueError(f"Content found multiple times in file: {path}")
 
-        old_file_content = content
-        new_file_content = content.replace(old_content, new_content, 1)
-        abs_path.write_text(new_file_content, encoding="utf-8")
-        return generate_diff(old_file_content, new_file_content, path)
+        end = start + len(old_content)
+        # the file is written from the parts around the replacement, without building the new content first
+        digest = self._write_text(abs_path, content, (start, end, new_content))
+        # the new text is only built when it is small enough to be kept for the next edit
+        new_size = len(content) - len(old_content) + len(new_content)
+        new_file_content = (content[:start] + new_content + content[end:]
+                            if "\r" not in new_content and new_size <= self._read_files.max_text_bytes else None)
+        self._read_files.record_write(abs_path, digest, new_file_content)
+        self._notify_changed(abs_path)
+        # the diff is built from the lines around the replacement, not from both versions of the whole file
+        return edit_diff(content, start, end, new_content, path,
+                         max_chars=self.EDIT_DIFF_MAX_CHARS, max_line_chars=self.EDIT_DIFF_LINE_CHARS)
 
     def delete(self, path: str) -> str:
         """
@@ -370,9 +814,9 @@ class FileSystemTool:
         if abs_path.is_dir():
             shutil.rmtree(abs_path)
         else:
-            if str(abs_path) in self._read_file_set:
-                self._read_file_set.remove(str(abs_path))
+            self._read_files.forget(abs_path)
             abs_path.unlink()
+        self._notify_changed(abs_path)
         return f"'{path}' deleted successfully."
 
     def copy(self, src: str, dest: str) -> str:
@@ -407,4 +851,5 @@ class FileSystemTool:
             shutil.copytree(src_path, dest_path)
         else:
             shutil.copy2(src_path, dest_path)
+        self._notify_changed(dest_path)
         return f"Successfully copied '{src}' to '{dest}'"
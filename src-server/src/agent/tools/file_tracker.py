@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+HASH_CHUNK_BYTES = 1 << 20
+
+def new_digest():
+    """The hash object whose digest `record_write` expects, to hash content while it is written"""
+    return hashlib.blake2b(digest_size=16)
+
+def _digest_file(f) -> bytes:
+    digest = new_digest()
+    while chunk := f.read(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    return digest.digest()
+
+@dataclass(slots=True)
+class FileSnapshot:
+    size: int
+    mtime_ns: int
+    # hash of the content written by the agent, None for files only read or too large to hash
+    digest: bytes | None
+
+class FileTracker:
+    """
+    The files read or written by a tool instance, with the size and mtime they had at that time,
+    so that writes can tell with one `stat` whether a file changed on disk since the agent saw it.
+    Reads record the `stat` only, files may be large and read in parts.
+    Writes also record the hash of the written bytes, computed while writing,
+    so a written file whose mtime changed but whose content did not, e.g. after a `touch`, is still unchanged.
+
+    The text of recently written files is kept too, so that consecutive edits of a file do not read it again.
+    """
+
+    def __init__(self, max_hash_bytes: int = 16 * 1024 * 1024, max_text_bytes: int = 8 * 1024 * 1024):
+        self.max_hash_bytes = max_hash_bytes
+        self.max_text_bytes = max_text_bytes
+        self._lock = threading.Lock()
+        self._snapshots: dict[str, FileSnapshot] = {}
+        self._texts: OrderedDict[str, str] = OrderedDict()
+        self._text_bytes = 0
+
+    def __contains__(self, path: object) -> bool:
+        return str(path) in self._snapshots
+
+    def _drop_text(self, key: str):
+        text = self._texts.pop(key, None)
+        if text is not None:
+            self._text_bytes -= len(text)
+
+    def record_read(self, path: Path, stat: os.stat_result):
+        """
+        Remember the state of a file the agent read, `stat` must be taken before the content is read,
+        so that a change made during the read makes the file stale.
+        """
+        key = str(path)
+        with self._lock:
+            self._snapshots[key] = FileSnapshot(stat.st_size, stat.st_mtime_ns, None)
+            self._drop_text(key)
+
+    def record_write(self, path: Path, digest: bytes, text: str | None = None):
+        """
+        Remember a file the agent just wrote, `digest` is the hash of the written bytes from `new_digest`.
+        `text` is what reading the file back as text returns, it is kept for the next edit.
+        """
+        key = str(path)
+        stat = path.stat()
+        with self._lock:
+            self._snapshots[key] = FileSnapshot(stat.st_size, stat.st_mtime_ns,
+                                                digest if stat.st_size <= self.max_hash_bytes else None)
+            self._drop_text(key)
+            if text is not None and len(text) <= self.max_text_bytes:
+                self._texts[key] = text
+                self._text_bytes += len(text)
+                while self._text_bytes > self.max_text_bytes:
+                    _, dropped = self._texts.popitem(last=False)
+                    self._text_bytes -= len(dropped)
+
+    def forget(self, path: Path):
+        key = str(path)
+        with self._lock:
+            self._snapshots.pop(key, None)
+            self._drop_text(key)
+
+    def is_unchanged(self, path: Path) -> bool:
+        """Whether the file is as the agent last saw it, False for a file that was never read"""
+        key = str(path)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return False
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if (stat.st_size, stat.st_mtime_ns) == (snapshot.size, snapshot.mtime_ns):
+            return True
+        if stat.st_size != snapshot.size or snapshot.digest is None:
+            return False
+        # same size, another mtime: compare the content
+        try:
+            with open(path, "rb") as f:
+                digest = _digest_file(f)
+        except OSError:
+            return False
+        if digest != snapshot.digest:
+            return False
+        with self._lock:
+            if self._snapshots.get(key) is snapshot:
+                snapshot.mtime_ns = stat.st_mtime_ns
+        return True
+
+    def cached_text(self, path: Path) -> str | None:
+        """The text of a file written by the agent, None if it is not kept or the file changed since"""
+        key = str(path)
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+        if text is None or not self.is_unchanged(path):
+            return None
+        return text
@@ -0,0 +1,97 @@
+import os
+import stat
+import tempfile
+from collections.abc import Iterable, Iterator
+from enum import Enum
+from pathlib import Path
+
+# Text is encoded and written in chunks of this many characters,
+# so that writing a large file does not hold a second, encoded copy of it in memory.
+WRITE_CHUNK_CHARS = 1 << 20
+
+class FsyncPolicy(Enum):
+    # leave the flushing to the operating system, a crash may lose the last writes
+    NONE = "none"
+    # flush the content before the rename, a crash leaves either the old or the new file
+    FILE = "file"
+    # flush the directory after the rename as well, the rename itself survives a crash
+    FULL = "full"
+
+def _read_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# read once at import, changing the umask later is not thread-safe
+_UMASK = _read_umask()
+
+def encode_text(text: str, start: int = 0, end: int | None = None,
+                chunk_chars: int = WRITE_CHUNK_CHARS) -> Iterator[bytes]:
+    """The bytes `Path.write_text` writes for `text[start:end]`, with the line breaks of the platform"""
+    end = len(text) if end is None else end
+    for chunk_start in range(start, end, chunk_chars):
+        chunk = text[chunk_start:min(chunk_start + chunk_chars, end)]
+        if os.linesep != "\n":
+            chunk = chunk.replace("\n", os.linesep)
+        yield chunk.encode("utf-8")
+
+def _copy_metadata(source: os.stat_result, temp_path: str):
+    os.chmod(temp_path, stat.S_IMODE(source.st_mode))
+    if hasattr(os, "chown") and (source.st_uid, source.st_gid) != (os.geteuid(), os.getegid()):
+        try:
+            os.chown(temp_path, source.st_uid, source.st_gid)
+        except PermissionError:
+            # only root can give a file away, the new file keeps the owner of the process
+            pass
+
+def _fsync_directory(directory: Path):
+    if os.name == "nt":
+        # directories can not be opened for flushing on Windows
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_atomic(path: Path, chunks: Iterable[bytes], fsync: FsyncPolicy = FsyncPolicy.FILE) -> int:
+    """
+    Write the chunks to a temporary file next to `path` and rename it over `path`,
+    so that readers and crashes see either the old or the new content, never a truncated file.
+    An existing file keeps its mode and, when the process may set it, its owner;
+    a symlink is kept and its target is replaced.
+
+    Returns the number of bytes written.
+    """
+    path = Path(os.path.realpath(path)) if os.path.islink(path) else path
+    try:
+        source = os.stat(path)
+    except FileNotFoundError:
+        source = None
+
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        size = 0
+        with open(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+            if fsync is not FsyncPolicy.NONE:
+                f.flush()
+                os.fsync(f.fileno())
+        if source is not None:
+            _copy_metadata(source, temp_path)
+        else:
+            # `mkstemp` creates the file readable by the owner only
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if fsync is FsyncPolicy.FULL:
+        _fsync_directory(path.parent)
+    return size
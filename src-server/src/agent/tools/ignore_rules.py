@@ -0,0 +1,249 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Paths skipped by the file system tools even without a .gitignore,
+# a .gitignore can re-include them with a negated pattern
+DEFAULT_IGNORE_PATTERNS = (
+    ".git/",
+    ".svn/",
+    ".hg/",
+    "node_modules/",
+    "bower_components/",
+    "__pycache__/",
+    "*.pyc",
+    ".venv/",
+    "venv/",
+    ".tox/",
+    ".nox/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+    ".ruff_cache/",
+    "*.egg-info/",
+    "dist/",
+    "build/",
+    "target/",
+    ".next/",
+    ".nuxt/",
+    ".gradle/",
+    ".idea/",
+    ".DS_Store",
+)
+
+IGNORE_FILE_NAME = ".gitignore"
+
+@dataclass(frozen=True)
+class _Rule:
+    regex: str
+    negated: bool
+    dir_only: bool
+
+def _translate_class(pattern: str, start: int) -> tuple[str, int] | None:
+    """Translate the bracket expression starting at `start`, None if it is not closed"""
+    index = start + 1
+    if index < len(pattern) and pattern[index] in "!^":
+        index += 1
+    if index < len(pattern) and pattern[index] == "]":
+        index += 1
+    end = pattern.find("]", index)
+    if end == -1:
+        return None
+    content = pattern[start + 1:end]
+    if content[0] in "!^":
+        content = "^" + content[1:]
+    return "[" + content.replace("\\", "\\\\") + "]", end + 1
+
+def _translate(pattern: str) -> str:
+    parts = []
+    index = 0
+    length = len(pattern)
+    while index < length:
+        char = pattern[index]
+        if pattern.startswith("**/", index) and (index == 0 or pattern[index - 1] == "/"):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("/**", index) and index + 3 == length:
+            parts.append("/.*")
+            index += 3
+        elif char == "*":
+            while index < length and pattern[index] == "*":
+                index += 1
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+            index += 1
+        elif char == "[" and (translated := _translate_class(pattern, index)) is not None:
+            parts.append(translated[0])
+            index = translated[1]
+        elif char == "\\" and index + 1 < length:
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
+        else:
+            parts.append(re.escape(char))
+            index += 1
+    return "".join(parts)
+
+def _parse_line(line: str) -> _Rule | None:
+    line = line.rstrip("\r\n")
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    if line == "" or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\#") or line.startswith("\\!"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if line == "":
+        return None
+    # a pattern with a slash is relative to the directory of the ignore file,
+    # otherwise it matches a name at any level below it
+    anchored = "/" in line
+    regex = _translate(line.lstrip("/"))
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return _Rule(regex, negated, dir_only)
+
+def _compile(rules: list[_Rule]) -> tuple[re.Pattern[str] | None, list[bool]]:
+    """
+    Compile the rules into one alternation, the last rule of the file comes first
+    so that the group which matches is the rule that decides
+    """
+    if len(rules) == 0:
+        return None, []
+    ordered = rules[::-1]
+    regex = "|".join(f"(?P<r{index}>{rule.regex})" for index, rule in enumerate(ordered))
+    return re.compile(regex, re.DOTALL), [rule.negated for rule in ordered]
+
+class RuleSet:
+    """The compiled patterns of one ignore file"""
+
+    def __init__(self, lines: list[str] | tuple[str, ...]):
+        rules = [rule for line in lines if (rule := _parse_line(line)) is not None]
+        self._dir_regex, self._dir_negated = _compile(rules)
+        self._file_regex, self._file_negated = _compile([rule for rule in rules if not rule.dir_only])
+
+    def match(self, relative_path: str, is_dir: bool) -> bool | None:
+        """True if the path is ignored, False if it is re-included by a negated pattern, None if no pattern matches"""
+        regex, negated = (self._dir_regex, self._dir_negated) if is_dir else\
+                         (self._file_regex, self._file_negated)
+        if regex is None or (match := regex.fullmatch(relative_path)) is None:
+            return None
+        assert match.lastgroup is not None
+        return not negated[int(match.lastgroup[1:])]
+
+def compile_glob(pattern: str, ignore_case: bool = False) -> re.Pattern[str] | None:
+    """
+    A regex which fullmatches the relative file paths selected by the glob, with the .gitignore syntax.
+    None if the glob is empty.
+    """
+    if pattern.startswith(("!", "#")):
+        # not a negation or a comment here
+        pattern = "\\" + pattern
+    rule = _parse_line(pattern)
+    if rule is None:
+        return None
+    return re.compile(rule.regex, re.DOTALL | (re.IGNORECASE if ignore_case else 0))
+
+class _RuleSetCache:
+    """Compiled ignore files, validated by the size and mtime of the file on every lookup"""
+
+    def __init__(self, max_files: int = 4096):
+        self._lock = threading.Lock()
+        self._files: OrderedDict[str, tuple[int, int, RuleSet]] = OrderedDict()
+        self._max_files = max_files
+
+    def get(self, directory: str) -> RuleSet | None:
+        path = os.path.join(directory, IGNORE_FILE_NAME)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                self._files.move_to_end(path)
+                return cached[2]
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                rule_set = RuleSet(f.readlines())
+        except OSError:
+            return None
+        with self._lock:
+            self._files[path] = (stat.st_size, stat.st_mtime_ns, rule_set)
+            self._files.move_to_end(path)
+            if len(self._files) > self._max_files:
+                self._files.popitem(last=False)
+        return rule_set
+
+_rule_set_cache = _RuleSetCache()
+
+@lru_cache(maxsize=16)
+def _default_rule_set(patterns: tuple[str, ...]) -> RuleSet:
+    return RuleSet(patterns)
+
+class IgnoreChain:
+    """
+    The rules that apply inside one directory: the default patterns
+    and the ignore files of the directory and its parents up to the root.
+    """
+
+    def __init__(self, levels: tuple[tuple[str, RuleSet], ...]):
+        # (directory relative to the root, rules), from the root down
+        self._levels = levels
+
+    def descend(self, directory: str, relative_directory: str) -> "IgnoreChain":
+        rule_set = _rule_set_cache.get(directory)
+        if rule_set is None:
+            return self
+        return IgnoreChain((*self._levels, (relative_directory, rule_set)))
+
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """Whether the path (relative to the root, with `/` separators) is ignored, its parents are not checked"""
+        for base, rule_set in reversed(self._levels):
+            path = relative_path[len(base) + 1:] if base else relative_path
+            if (result := rule_set.match(path, is_dir)) is not None:
+                return result
+        return False
+
+class IgnoreRules:
+    """Ignore matcher of a directory tree, following the nested .gitignore files and the default patterns"""
+
+    def __init__(self, root: str, default_patterns: tuple[str, ...] = DEFAULT_IGNORE_PATTERNS):
+        self.root = root
+        self._default_chain = IgnoreChain((("", _default_rule_set(tuple(default_patterns))),))
+
+    @property
+    def _root_chain(self) -> IgnoreChain:
+        # looked up on every use, so that a long-lived instance sees changes of the root .gitignore
+        return self._default_chain.descend(self.root, "")
+
+    def chain_for(self, relative_directory: str) -> IgnoreChain:
+        """The rules inside a directory, `relative_directory` is relative to the root"""
+        chain = self._root_chain
+        if relative_directory in ("", "."):
+            return chain
+        current = ""
+        for part in relative_directory.split("/"):
+            current = f"{current}/{part}" if current else part
+            chain = chain.descend(os.path.join(self.root, current), current)
+        return chain
+
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        """Whether the path or any of its parent directories is ignored"""
+        chain = self._root_chain
+        parts = relative_path.split("/")
+        current = ""
+        for index, part in enumerate(parts):
+            current = f"{current}/{part}" if current else part
+            is_last = index == len(parts) - 1
+            if chain.is_ignored(current, is_dir if is_last else True):
+                return True
+            if not is_last:
+                chain = chain.descend(os.path.join(self.root, current), current)
+        return False
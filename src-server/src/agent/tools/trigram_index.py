@@ -0,0 +1,515 @@
+import array
+import bisect
+import hashlib
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from itertools import repeat
+from pathlib import Path
+from loguru import logger
+from .content_search import Candidate
+from .workspace_index import IndexState, WorkspaceIndex
+from ...db import data_dir
+from ...utils.text_search import use_search_pool
+from ...utils.trigrams import (
+    MATCH_ALL, TrigramQuery, build_query, decode_postings, encode_postings, extract_file, extract_files)
+
+# changes of the layout or of the trigram encoding invalidate the stored indexes
+_FORMAT = f"1-{sys.byteorder}"
+
+def _contains_all(trigrams: array.array, required: frozenset[int]) -> bool:
+    """Whether the sorted trigrams contain all the required ones"""
+    for trigram in required:
+        index = bisect.bisect_left(trigrams, trigram)
+        if index == len(trigrams) or trigrams[index] != trigram:
+            return False
+    return True
+
+@dataclass(slots=True)
+class _FileRecord:
+    size: int
+    mtime_ns: int
+    is_text: bool
+    # the id of the file in the stored postings, None while the file is pending
+    id: int | None = None
+    # the trigrams of a pending file, not stored yet
+    trigrams: array.array | None = None
+
+class TrigramIndex:
+    """
+    An on-disk trigram index of the text files of a workspace, which narrows the candidate files
+    of a content search to the ones that contain the literal parts of the pattern.
+
+    The files come from the workspace index and follow its updates. Changed files are extracted
+    into a pending set, which is stored as a new segment of postings when it grows large enough,
+    the postings of the previous version of a file are dropped when the index is rebuilt.
+    A file whose size or mtime differs from its record is always searched, so the index never hides a match.
+    """
+    _logger = logger.bind(name="TrigramIndex")
+
+    # source bytes of the files stored in one segment
+    SEGMENT_BYTES = 64 * 1024 * 1024
+    # pending files are stored as a segment beyond this number
+    MAX_PENDING_FILES = 256
+    # the index is rebuilt when this share of the stored file ids belongs to old versions
+    MAX_DEAD_RATIO = 0.5
+    # files larger than this are not indexed, and always searched
+    MAX_FILE_BYTES = 16 * 1024 * 1024
+    # files are extracted in worker processes when more than this number changed at once
+    PARALLEL_MIN_FILES = 64
+    EXTRACT_WORKERS = min(os.cpu_count() or 1, 8)
+    # intersecting the postings stops once the candidates are this few, the search verifies them anyway
+    ENOUGH_CANDIDATES = 64
+
+    def __init__(self, workspace_index: WorkspaceIndex, db_path: Path, max_bytes: int):
+        self.workspace_index = workspace_index
+        self.db_path = db_path
+        # the index is disabled when its database grows beyond this size
+        self.max_bytes = max_bytes
+        self.state = IndexState.EMPTY
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._records: dict[str, _FileRecord] = {}
+        self._paths_by_id: dict[int, str] = {}
+        self._pending_bytes = 0
+        self._next_id = 1
+        self._next_segment = 1
+        self._dead = 0
+        self._changes: queue.Queue[list[str] | None] = queue.Queue()
+        # batches of changes received but not applied yet
+        self._unapplied = 0
+        self._stopped = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker: threading.Thread | None = None
+
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    is_text INTEGER NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS postings (
+                    trigram INTEGER NOT NULL,
+                    segment INTEGER NOT NULL,
+                    ids BLOB NOT NULL,
+                    PRIMARY KEY (trigram, segment)
+                ) WITHOUT ROWID;
+            """)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'format'").fetchone()
+            if row is None or row[0] != _FORMAT:
+                self._clear(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _clear(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM files")
+        conn.execute("DELETE FROM postings")
+        conn.execute("DELETE FROM meta")
+        conn.execute("INSERT INTO meta (key, value) VALUES ('format', ?), ('dead', '0'), ('next_id', '1')",
+                     (_FORMAT,))
+        with self._lock:
+            self._records.clear()
+            self._paths_by_id.clear()
+            self._pending_bytes = 0
+            self._next_id = 1
+            self._next_segment = 1
+            self._dead = 0
+
+    def _load(self):
+        conn = self._connect()
+        records = {}
+        paths_by_id = {}
+        for file_id, path, size, mtime_ns, is_text in conn.execute(
+                "SELECT id, path, size, mtime_ns, is_text FROM files"):
+            records[path] = _FileRecord(size, mtime_ns, bool(is_text), file_id)
+            paths_by_id[file_id] = path
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        max_segment = conn.execute("SELECT MAX(segment) FROM postings").fetchone()[0] or 0
+        with self._lock:
+            self._records = records
+            self._paths_by_id = paths_by_id
+            # ids are never reused, the postings of the removed files still hold theirs
+            self._next_id = int(meta["next_id"])
+            self._next_segment = max_segment + 1
+            self._dead = int(meta["dead"])
+
+    def _database_bytes(self) -> int:
+        conn = self._connect()
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+    def _disable(self, reason: str):
+        self._logger.warning("Trigram index of {} disabled: {}", self.workspace_index.root, reason)
+        self.state = IndexState.DISABLED
+        # nothing reads the changes any more
+        self.workspace_index.remove_listener(self._on_workspace_changed)
+        conn = self._connect()
+        with conn:
+            self._clear(conn)
+        conn.execute("VACUUM")
+
+    # --- --- --- --- --- ---
+    # --- Updates -----------
+    # --- --- --- --- --- ---
+
+    def _extract(self, paths: list[str]) -> Iterator[tuple[str, tuple[int, int, bool, array.array] | None]]:
+        """The extracted files in order, in the worker processes when there are many"""
+        root = self.workspace_index.root
+        if len(paths) < self.PARALLEL_MIN_FILES or self.EXTRACT_WORKERS <= 1:
+            for path in paths:
+                if self._stopped.is_set():
+                    return
+                yield path, extract_file(os.path.join(root, path), self.MAX_FILE_BYTES)
+            return
+
+        pool = use_search_pool(self.EXTRACT_WORKERS)
+        chunks = [paths[i:i + 64] for i in range(0, len(paths), 64)]
+        in_flight: deque[tuple[list[str], Future]] = deque()
+        next_chunk = 0
+        try:
+            while next_chunk < len(chunks) or len(in_flight) > 0:
+                if self._stopped.is_set():
+                    return
+                while next_chunk < len(chunks) and len(in_flight) < self.EXTRACT_WORKERS * 2:
+                    chunk = chunks[next_chunk]
+                    absolute_paths = [os.path.join(root, path) for path in chunk]
+                    in_flight.append((chunk, pool.submit(extract_files, absolute_paths, self.MAX_FILE_BYTES)))
+                    next_chunk += 1
+                chunk, future = in_flight.popleft()
+                for path, result in zip(chunk, future.result()):
+                    if result is None:
+                        yield path, None
+                        continue
+                    trigrams = array.array("I")
+                    trigrams.frombytes(result[3])
+                    yield path, (result[0], result[1], result[2], trigrams)
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+
+    def _forget(self, path: str) -> bool:
+        """Drop the record of a file, returns whether it had stored postings"""
+        with self._lock:
+            record = self._records.pop(path, None)
+            if record is None:
+                return False
+            if record.id is None:
+                self._pending_bytes -= record.size
+                return False
+            del self._paths_by_id[record.id]
+            self._dead += 1
+            return True
+
+    def update(self, paths: list[str]):
+        """Bring the records of the files at or below the paths up to date with the workspace index"""
+        if self.state is IndexState.DISABLED:
+            return
+        removed: list[str] = []
+        changed: list[str] = []
+        for path in sorted(set(paths)):
+            files = self.workspace_index.files(path)
+            if files is None:
+                return
+            current = {entry.path: entry for entry in files}
+            prefix = f"{path}/"
+            with self._lock:
+                if path in self._records or (len(files) == 1 and files[0].path == path):
+                    recorded = [path] if path in self._records else []
+                else:
+                    recorded = [recorded_path for recorded_path in self._records
+                                if path == "" or recorded_path.startswith(prefix)]
+                for recorded_path in recorded:
+                    if recorded_path not in current:
+                        removed.append(recorded_path)
+                for entry in files:
+                    record = self._records.get(entry.path)
+                    if record is None or (record.size, record.mtime_ns) != (entry.size, entry.mtime_ns):
+                        changed.append(entry.path)
+
+        stored_removed = [path for path in removed if self._forget(path)]
+        for path, extracted in self._extract(changed):
+            if self._forget(path):
+                stored_removed.append(path)
+            if extracted is not None:
+                size, mtime_ns, is_text, trigrams = extracted
+                with self._lock:
+                    self._records[path] = _FileRecord(size, mtime_ns, is_text, trigrams=trigrams)
+                    self._pending_bytes += size
+            if self._pending_bytes >= self.SEGMENT_BYTES:
+                self._store_pending()
+                if self.state is IndexState.DISABLED:
+                    return
+        self._delete_stored(stored_removed)
+        if self._pending_count() > self.MAX_PENDING_FILES:
+            self._store_pending()
+        if self.state is not IndexState.DISABLED and self._dead > len(self._paths_by_id) * self.MAX_DEAD_RATIO:
+            self._rebuild()
+
+    def _pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for record in self._records.values() if record.id is None)
+
+    def _delete_stored(self, paths: list[str]):
+        """Delete the stored records of removed files, their postings stay until the index is rebuilt"""
+        if len(paths) == 0:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in paths))
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'dead'", (str(self._dead),))
+
+    def _store_pending(self):
+        """Store the pending files as a new segment of postings, the records only change on the updating thread"""
+        with self._lock:
+            pending = [(path, record) for path, record in self._records.items() if record.id is None]
+            segment = self._next_segment
+            first_id = self._next_id
+        postings: defaultdict[int, array.array] = defaultdict(partial(array.array, "I"))
+        rows = []
+        for file_id, (path, record) in enumerate(pending, first_id):
+            assert record.trigrams is not None
+            # append the id to the postings of every trigram of the file without a loop in Python
+            deque(map(array.array.append, map(postings.__getitem__, record.trigrams), repeat(file_id)), 0)
+            rows.append((file_id, path, record.size, record.mtime_ns, record.is_text))
+
+        conn = self._connect()
+        with conn:
+            # the previous versions of the files, if they were stored
+            conn.executemany("DELETE FROM files WHERE path = ?", ((row[1],) for row in rows))
+            conn.executemany("INSERT INTO files (id, path, size, mtime_ns, is_text) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO postings (trigram, segment, ids) VALUES (?, ?, ?)",
+                             ((trigram, segment, encode_postings(ids)) for trigram, ids in postings.items()))
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'dead'", (str(self._dead),))
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'next_id'", (str(first_id + len(pending)),))
+        with self._lock:
+            for file_id, (path, record) in enumerate(pending, first_id):
+                record.id = file_id
+                record.trigrams = None
+                self._paths_by_id[file_id] = path
+                self._pending_bytes -= record.size
+            self._next_id = first_id + len(pending)
+            self._next_segment = segment + 1
+
+        if (database_bytes := self._database_bytes()) > self.max_bytes:
+            self._disable(f"the index takes {database_bytes} bytes, the limit is {self.max_bytes}")
+
+    def _rebuild(self):
+        self._logger.info("Rebuilding the trigram index of {}", self.workspace_index.root)
+        conn = self._connect()
+        with conn:
+            self._clear(conn)
+        self.update([""])
+
+    # --- --- --- --- --- ---
+    # --- Lifecycle ---------
+    # --- --- --- --- --- ---
+
+    def start(self):
+        """Load the stored index, catch up with the workspace and follow its updates in the background"""
+        if self._worker is not None:
+            return
+        self._idle.clear()
+        self._worker = threading.Thread(target=self._run, name="TrigramIndex", daemon=True)
+        self._worker.start()
+
+    def _on_workspace_changed(self, paths: list[str]):
+        with self._lock:
+            self._unapplied += 1
+            self._idle.clear()
+        # a changed .gitignore may hide or reveal the files of its directory
+        self._changes.put([path.rpartition("/")[0] if path.rpartition("/")[2] == ".gitignore" else path
+                           for path in paths])
+
+    def _run(self):
+        try:
+            self._build()
+            if self.state is not IndexState.DISABLED:
+                self._follow_changes()
+        finally:
+            self._idle.set()
+
+    def _build(self):
+        start = time.perf_counter()
+        self._load()
+        self.state = IndexState.BUILDING if len(self._records) == 0 else IndexState.READY
+        if not self.workspace_index.wait_ready():
+            self._disable("the workspace index is disabled")
+            return
+        self.workspace_index.add_listener(self._on_workspace_changed)
+        try:
+            self.update([""])
+            if self._pending_count() > 0:
+                self._store_pending()
+        except Exception as e:
+            self._logger.exception("Failed to build the trigram index: {}", e)
+            self._disable(str(e))
+            return
+        if self.state is IndexState.DISABLED:
+            return
+        self.state = IndexState.READY
+        self._logger.info("Trigram index of {} is ready in {:.2f}s, {} files",
+                          self.workspace_index.root, time.perf_counter() - start, len(self._records))
+        with self._lock:
+            if self._unapplied == 0:
+                self._idle.set()
+
+    def _follow_changes(self):
+        while not self._stopped.is_set():
+            batch = self._changes.get()
+            if batch is None:
+                return
+            paths = list(batch)
+            batches = 1
+            while not self._changes.empty():
+                more = self._changes.get()
+                if more is None:
+                    self._stopped.set()
+                    break
+                paths.extend(more)
+                batches += 1
+            try:
+                self.update(paths)
+            except Exception as e:
+                self._logger.exception("Failed to update the trigram index: {}", e)
+            with self._lock:
+                self._unapplied -= batches
+                if self._unapplied == 0:
+                    self._idle.set()
+            if self.state is IndexState.DISABLED:
+                return
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait until the index caught up with the changes it received"""
+        return self._idle.wait(timeout)
+
+    def stop(self):
+        self.workspace_index.remove_listener(self._on_workspace_changed)
+        self._stopped.set()
+        self._changes.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    # --- --- --- --- --- ---
+    # --- Queries -----------
+    # --- --- --- --- --- ---
+
+    def _postings(self, trigrams: frozenset[int]) -> set[int] | None:
+        """Ids of the stored files with all the trigrams, None for no condition"""
+        if len(trigrams) == 0:
+            return None
+        conn = self._connect()
+        lists: dict[int, list[bytes]] = {trigram: [] for trigram in trigrams}
+        placeholders = ", ".join("?" * len(trigrams))
+        for trigram, blob in conn.execute(
+                f"SELECT trigram, ids FROM postings WHERE trigram IN ({placeholders})", tuple(trigrams)):
+            lists[trigram].append(blob)
+        # the rarest trigrams first, so that the set is small early
+        ordered = sorted(lists.values(), key=lambda blobs: sum(map(len, blobs)))
+        result: set[int] | None = None
+        for blobs in ordered:
+            ids: set[int] = set()
+            for blob in blobs:
+                ids.update(decode_postings(blob))
+            result = ids if result is None else result & ids
+            if len(result) <= self.ENOUGH_CANDIDATES:
+                break
+        return result
+
+    def _matching_paths(self, query: TrigramQuery) -> set[str] | None:
+        """Paths of the recorded files that may match, None if every file may"""
+        if query == MATCH_ALL:
+            return None
+        ids: set[int] = set()
+        for alternative in query:
+            alternative_ids = self._postings(alternative)
+            if alternative_ids is None:
+                return None
+            ids |= alternative_ids
+        with self._lock:
+            paths = {self._paths_by_id[file_id] for file_id in ids if file_id in self._paths_by_id}
+            for path, record in self._records.items():
+                if record.id is None and record.trigrams is not None and\
+                   any(_contains_all(record.trigrams, alternative) for alternative in query):
+                    paths.add(path)
+        return paths
+
+    def narrow(self,
+               candidates: list[Candidate],
+               relative_root: str,
+               pattern: str,
+               literal: bool,
+               case_sensitive: bool) -> list[Candidate]:
+        """
+        The candidates that may match the pattern, in the same order.
+        `relative_root` is the path of the search root in the workspace, the candidate paths are relative to it.
+        Files without an up-to-date record are kept.
+        """
+        if self.state is IndexState.DISABLED or self.state is IndexState.EMPTY:
+            return candidates
+        matching = self._matching_paths(build_query(pattern, literal, case_sensitive))
+        if matching is None:
+            return candidates
+        prefix = f"{relative_root}/" if relative_root else ""
+        narrowed = []
+        with self._lock:
+            for candidate in candidates:
+                path = prefix + candidate.path
+                record = self._records.get(path)
+                if path in matching or record is None or\
+                   (record.size, record.mtime_ns) != (candidate.size, candidate.mtime_ns):
+                    narrowed.append(candidate)
+        return narrowed
+
+    def usage(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "files": len(self._records),
+                "pending_files": sum(1 for record in self._records.values() if record.id is None),
+                "dead_ids": self._dead,
+                "bytes": self._database_bytes(),
+            }
+
+_indexes: dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+def use_trigram_index(workspace_index: WorkspaceIndex, max_bytes: int) -> TrigramIndex | None:
+    """
+    The trigram index of a workspace, it is started by the first search. None when `max_bytes` is 0,
+    a changed limit starts the index again with the stored data.
+    """
+    root = workspace_index.root
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is not None and index.max_bytes == max_bytes and index.workspace_index is workspace_index:
+            return index
+        if index is not None:
+            index.stop()
+            del _indexes[root]
+        if max_bytes <= 0:
+            return None
+        index_dir = data_dir / "trigram_index"
+        index_dir.mkdir(exist_ok=True)
+        db_name = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+        index = _indexes[root] = TrigramIndex(workspace_index, index_dir / f"{db_name}.db", max_bytes)
+        return index
@@ -0,0 +1,542 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from loguru import logger
+from watchdog.events import FileSystemEvent, FileSystemEventHandler
+from watchdog.observers import Observer
+from watchdog.observers.api import ObservedWatch
+from .ignore_rules import DEFAULT_IGNORE_PATTERNS, IGNORE_FILE_NAME, IgnoreChain, IgnoreRules
+from ...db import data_dir
+
+class IndexState(Enum):
+    EMPTY = "empty"
+    BUILDING = "building"
+    READY = "ready"
+    # the workspace is too large or can not be watched, the tools read the disk
+    DISABLED = "disabled"
+
+@dataclass(slots=True)
+class IndexEntry:
+    # relative to the workspace root, with `/` separators
+    path: str
+    name: str
+    is_dir: bool
+    is_symlink: bool
+    # ignored directories are recorded without their content, ignored files are not recorded
+    ignored: bool
+    size: int
+    mtime_ns: int
+
+_ROW_COLUMNS = "path, name, is_dir, is_symlink, ignored, size, mtime_ns"
+_INSERT_SQL = f"INSERT OR REPLACE INTO entries (parent, {_ROW_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+_INSERT_BATCH = 10_000
+# stored indexes written with another version are built again
+_SCHEMA_VERSION = "1"
+
+class _TooManyEntriesError(Exception): pass
+
+def _parent_of(path: str) -> str:
+    return path.rpartition("/")[0]
+
+def _subtree_bounds(path: str) -> tuple[str, str]:
+    """Range of the paths below `path` in the sort order of the primary key, `0` sorts right after `/`"""
+    return f"{path}/", f"{path}0"
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, index: "WorkspaceIndex"):
+        self._index = index
+
+    def on_any_event(self, event: FileSystemEvent):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        self._index._events.put(str(event.src_path))
+        if event.dest_path:
+            self._index._events.put(str(event.dest_path))
+
+class WorkspaceIndex:
+    """
+    Paths, types, sizes and mtimes of the files of a workspace, stored in a SQLite database,
+    so that listing and searching the workspace does not walk the disk.
+
+    The index is built in the background and updated from file system events,
+    the paths ignored by the .gitignore files and the default ignore list are not indexed.
+    The index stored by a previous run is loaded instead of being built again,
+    then brought up to date with the changes made while nothing watched the workspace.
+    Queries return None until the index is ready, the callers read the disk in that case.
+
+    The workspace is only watched once the index is built and enabled. The root and each of its
+    non-ignored directories are watched separately, so that the watcher never walks the ignored
+    top-level trees (.git, node_modules, .venv...), with inotify that walk costs one watch per directory.
+    """
+    _logger = logger.bind(name="WorkspaceIndex")
+
+    # workspaces with more entries are not indexed
+    MAX_ENTRIES = 500_000
+    # file system events are applied in batches collected within this time
+    EVENT_BATCH_WINDOW = 0.05
+    # top-level directories watched one by one, with more of them the root is watched recursively
+    MAX_WATCHES = 64
+    # directories modified this long before a build are checked again once the workspace is watched
+    MTIME_GRANULARITY_NS = 2 * 10**9
+
+    def __init__(self,
+                 root: str,
+                 db_path: Path,
+                 ignore_patterns: tuple[str, ...] = DEFAULT_IGNORE_PATTERNS,
+                 max_entries: int = MAX_ENTRIES):
+        self.root = root
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ignore_patterns = ignore_patterns
+        self.ignore_rules = IgnoreRules(root, ignore_patterns)
+        self.state = IndexState.EMPTY
+        # incremented whenever the content of the index changes
+        self.version = 0
+        # when the last build started, changes before it are in the index
+        self._built_ns = 0
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._events: queue.Queue[str | None] = queue.Queue()
+        self._observer = None
+        # the watches of the top-level directories by path, None when the root is watched recursively
+        self._watches: dict[str, ObservedWatch] | None = None
+        self._worker: threading.Thread | None = None
+        # called with the changed paths after each update, "" after a rebuild
+        self._listeners: list[Callable[[list[str]], None]] = []
+
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    is_dir INTEGER NOT NULL,
+                    is_symlink INTEGER NOT NULL,
+                    ignored INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn: sqlite3.Connection | None = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- --- --- --- --- ---
+    # --- Building ----------
+    # --- --- --- --- --- ---
+
+    def _walk(self, relative_directory: str, chain: IgnoreChain) -> Iterator[tuple]:
+        """Rows of the entries below the directory, pruned at ignored directories"""
+        pending = [(relative_directory, chain)]
+        while len(pending) > 0:
+            if self._stopped.is_set():
+                return
+            directory, chain = pending.pop()
+            try:
+                scanner = os.scandir(os.path.join(self.root, directory))
+            except OSError:
+                continue
+            with scanner:
+                for directory_entry in scanner:
+                    path = f"{directory}/{directory_entry.name}" if directory else directory_entry.name
+                    try:
+                        is_dir = directory_entry.is_dir()
+                        stat = directory_entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    is_symlink = directory_entry.is_symlink()
+                    ignored = chain.is_ignored(path, is_dir)
+                    if ignored and not is_dir:
+                        continue
+                    yield (directory, path, directory_entry.name, is_dir, is_symlink, ignored,
+                           stat.st_size, stat.st_mtime_ns)
+                    if is_dir and not is_symlink and not ignored:
+                        pending.append((path, chain.descend(directory_entry.path, path)))
+
+    def _insert_subtree(self, conn: sqlite3.Connection, relative_directory: str) -> int:
+        chain = self.ignore_rules.chain_for(relative_directory)
+        count = 0
+        batch = []
+        for row in self._walk(relative_directory, chain):
+            batch.append(row)
+            count += 1
+            if count > self.max_entries:
+                raise _TooManyEntriesError()
+            if len(batch) >= _INSERT_BATCH:
+                conn.executemany(_INSERT_SQL, batch)
+                batch.clear()
+        conn.executemany(_INSERT_SQL, batch)
+        return count
+
+    def build(self) -> int:
+        """Rebuild the whole index from the disk and mark it ready, returns the number of entries"""
+        start = time.perf_counter()
+        conn = self._connect()
+        with self._write_lock:
+            self._built_ns = time.time_ns()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM entries")
+                    count = self._insert_subtree(conn, "")
+                    conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                                     self._stored_meta().items())
+            except _TooManyEntriesError:
+                self._disable(f"more than {self.max_entries} entries")
+                return 0
+            self.version += 1
+        self.state = IndexState.READY
+        self._ready.set()
+        self._logger.info("Indexed {} entries of {} in {:.2f}s", count, self.root, time.perf_counter() - start)
+        self._notify([""])
+        return count
+
+    def _stored_meta(self) -> dict[str, str]:
+        """What a stored index must have been built with to be loaded"""
+        return {
+            "schema": _SCHEMA_VERSION,
+            "root": self.root,
+            "ignore_patterns": "\n".join(self.ignore_patterns),
+            "built_ns": str(self._built_ns),
+        }
+
+    def load(self) -> bool:
+        """
+        Mark the index stored by a previous run ready, returns False if there is none
+        or it was built with other settings, the index must then be built.
+        The stored index is not up to date, see `_catch_up`.
+        """
+        conn = self._connect()
+        with self._write_lock:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+            expected = self._stored_meta()
+            if any(meta.get(key) != expected[key] for key in ("schema", "root", "ignore_patterns")):
+                return False
+            if conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] > self.max_entries:
+                return False
+            self._built_ns = int(meta["built_ns"])
+            self.version += 1
+        self.state = IndexState.READY
+        self._ready.set()
+        self._logger.info("Loaded the stored index of {}", self.root)
+        self._notify([""])
+        return True
+
+    def _disable(self, reason: str):
+        self._logger.warning("Workspace index of {} disabled: {}", self.root, reason)
+        self.state = IndexState.DISABLED
+        self._ready.set()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM meta")
+
+    # --- --- --- --- --- ---
+    # --- Incremental updates
+    # --- --- --- --- --- ---
+
+    def _relative(self, absolute_path: str) -> str | None:
+        relative = os.path.relpath(absolute_path, self.root)
+        if relative in (".", "..") or relative.startswith(".." + os.sep):
+            return None
+        return relative.replace(os.sep, "/")
+
+    def _delete_subtree(self, conn: sqlite3.Connection, path: str):
+        low, high = _subtree_bounds(path)
+        conn.execute("DELETE FROM entries WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+
+    def _refresh(self, conn: sqlite3.Connection, path: str):
+        parent = _parent_of(path)
+        if parent and self.ignore_rules.is_ignored(parent, True):
+            return
+        if os.path.basename(path) == IGNORE_FILE_NAME:
+            # the rules below the directory changed, index it again
+            if parent:
+                self._delete_subtree(conn, parent)
+                self._refresh(conn, parent)
+            else:
+                conn.execute("DELETE FROM entries")
+                self._insert_subtree(conn, "")
+            return
+
+        absolute_path = os.path.join(self.root, path)
+        try:
+            stat = os.lstat(absolute_path)
+        except OSError:
+            self._delete_subtree(conn, path)
+            return
+        is_symlink = os.path.islink(absolute_path)
+        is_dir = os.path.isdir(absolute_path)
+        ignored = self.ignore_rules.chain_for(parent).is_ignored(path, is_dir)
+        if ignored and not is_dir:
+            self._delete_subtree(conn, path)
+            return
+
+        previous = conn.execute("SELECT is_dir, ignored FROM entries WHERE path = ?", (path,)).fetchone()
+        if previous is None or (bool(previous[0]), bool(previous[1])) != (is_dir, ignored):
+            # a new, moved or re-included directory, or a changed type
+            self._delete_subtree(conn, path)
+            if is_dir and not is_symlink and not ignored:
+                self._insert_subtree(conn, path)
+        conn.execute(_INSERT_SQL, (parent, path, os.path.basename(path), is_dir, is_symlink, ignored,
+                                   stat.st_size, stat.st_mtime_ns))
+
+    def apply_changes(self, absolute_paths: Iterable[str]):
+        """Update the index for paths that were created, modified, moved or deleted"""
+        if self.state is not IndexState.READY:
+            return
+        paths = sorted({relative for path in absolute_paths
+                        if (relative := self._relative(path)) is not None})
+        if len(paths) == 0:
+            return
+        with self._write_lock:
+            try:
+                with self._connect() as conn:
+                    for path in paths:
+                        self._refresh(conn, path)
+            except _TooManyEntriesError:
+                self._disable(f"more than {self.max_entries} entries")
+                return
+            self.version += 1
+        self._notify(paths)
+
+    def add_listener(self, listener: Callable[[list[str]], None]):
+        """Call `listener` with the paths of every update, it should return quickly"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[list[str]], None]):
+        """Stop calling a listener added with `add_listener`, nothing happens if it was not added"""
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify(self, paths: list[str]):
+        # listeners may be removed from other threads meanwhile
+        for listener in list(self._listeners):
+            try:
+                listener(paths)
+            except Exception as e:
+                self._logger.exception("Workspace index listener failed: {}", e)
+
+    # --- --- --- --- --- ---
+    # --- Lifecycle ---------
+    # --- --- --- --- --- ---
+
+    def start(self):
+        """Load the stored index or build it unless it is ready, then keep it updated in the background"""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name="WorkspaceIndex", daemon=True)
+        self._worker.start()
+
+    def _watched_directories(self) -> list[str] | None:
+        """The top-level directories to watch, None if there are too many to watch them one by one"""
+        directories = [entry.path for entry in self.children("") or []
+                       if entry.is_dir and not entry.is_symlink and not entry.ignored]
+        return directories if len(directories) <= self.MAX_WATCHES else None
+
+    def _watch(self):
+        observer = Observer()
+        handler = _EventHandler(self)
+        directories = self._watched_directories()
+        if directories is None:
+            observer.schedule(handler, self.root, recursive=True)
+        else:
+            observer.schedule(handler, self.root, recursive=False)
+            self._watches = {directory: observer.schedule(handler, os.path.join(self.root, directory), recursive=True)
+                             for directory in directories}
+        observer.start()
+        self._observer = observer
+
+    def _update_watches(self, paths: list[str]):
+        """Watch the top-level directories created since the last update, stop watching the removed ones"""
+        if self._watches is None or self._observer is None:
+            return
+        for path in paths:
+            if "/" in path or path == "":
+                continue
+            entry = self.get(path)
+            watchable = entry is not None and entry.is_dir and not entry.is_symlink and not entry.ignored
+            watch = self._watches.get(path)
+            if watch is not None and not watchable:
+                self._observer.unschedule(self._watches.pop(path))
+            elif watch is None and watchable:
+                self._watches[path] = self._observer.schedule(
+                    _EventHandler(self), os.path.join(self.root, path), recursive=True)
+
+    def _catch_up(self, check_files: bool = False):
+        """
+        Apply the changes made since the index was built, before the workspace was watched,
+        from the directories modified since then: their created, deleted and moved entries.
+        With `check_files`, the files modified in place are found too from their size and mtime,
+        for a stored index that was not watched for a while.
+        """
+        # with a margin, directory mtimes are coarse on some file systems
+        since_ns = self._built_ns - self.MTIME_GRANULARITY_NS
+        conn = self._connect()
+        changed = []
+        if check_files:
+            for path, size, mtime_ns in conn.execute("SELECT path, size, mtime_ns FROM entries WHERE is_dir = 0"):
+                absolute_path = os.path.join(self.root, path)
+                try:
+                    stat = os.lstat(absolute_path)
+                except OSError:
+                    changed.append(absolute_path)
+                    continue
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                    changed.append(absolute_path)
+        rows = conn.execute(
+            "SELECT path FROM entries WHERE is_dir = 1 AND is_symlink = 0 AND ignored = 0").fetchall()
+        for directory in ["", *(row[0] for row in rows)]:
+            absolute_directory = os.path.join(self.root, directory)
+            try:
+                if os.stat(absolute_directory).st_mtime_ns < since_ns:
+                    continue
+                names = os.listdir(absolute_directory)
+            except OSError:
+                changed.append(absolute_directory)
+                continue
+            changed.extend(os.path.join(absolute_directory, name) for name in names)
+            changed.extend(os.path.join(self.root, entry.path) for entry in self.children(directory) or [])
+        self.apply_changes(changed)
+
+    def _run(self):
+        loaded = False
+        if self.state is not IndexState.READY:
+            self.state = IndexState.BUILDING
+            loaded = self.load()
+            if not loaded:
+                self.build()
+        if self.state is IndexState.DISABLED:
+            return
+        try:
+            self._watch()
+        except Exception as e:
+            self._disable(f"can not watch the workspace: {e}")
+            return
+        try:
+            self._catch_up(check_files=loaded)
+        except Exception as e:
+            self._logger.exception("Failed to catch up with the workspace: {}", e)
+
+        while not self._stopped.is_set():
+            first = self._events.get()
+            if first is None:
+                break
+            paths = [first]
+            deadline = time.monotonic() + self.EVENT_BATCH_WINDOW
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    path = self._events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if path is None:
+                    self._stopped.set()
+                    break
+                paths.append(path)
+            try:
+                self.apply_changes(paths)
+                self._update_watches([relative for path in paths if (relative := self._relative(path)) is not None])
+            except Exception as e:
+                self._logger.exception("Failed to update the workspace index: {}", e)
+            if self.state is IndexState.DISABLED:
+                break
+        self._observer.stop()
+
+    def wait_ready(self, timeout: float | None = None) -> bool:
+        return self._ready.wait(timeout) and self.state is IndexState.READY
+
+    def stop(self):
+        self._stopped.set()
+        self._events.put(None)
+        if self._observer is not None:
+            self._observer.stop()
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    # --- --- --- --- --- ---
+    # --- Queries -----------
+    # --- --- --- --- --- ---
+
+    @staticmethod
+    def _to_entry(row: tuple) -> IndexEntry:
+        return IndexEntry(row[0], row[1], bool(row[2]), bool(row[3]), bool(row[4]), row[5], row[6])
+
+    def get(self, path: str) -> IndexEntry | None:
+        if self.state is not IndexState.READY:
+            return None
+        row = self._connect().execute(f"SELECT {_ROW_COLUMNS} FROM entries WHERE path = ?", (path,)).fetchone()
+        return None if row is None else self._to_entry(row)
+
+    def children(self, directory: str) -> list[IndexEntry] | None:
+        """Entries of a directory, None if the index is not ready or the directory is not indexed"""
+        if self.state is not IndexState.READY:
+            return None
+        conn = self._connect()
+        if directory:
+            row = conn.execute("SELECT is_dir, ignored FROM entries WHERE path = ?", (directory,)).fetchone()
+            if row is None or not row[0] or row[1]:
+                return None
+        rows = conn.execute(f"SELECT {_ROW_COLUMNS} FROM entries WHERE parent = ?", (directory,)).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def files(self, path: str = "") -> list[IndexEntry] | None:
+        """The indexed files at or below `path`, in path order, None if the index is not ready"""
+        if self.state is not IndexState.READY:
+            return None
+        if path == "":
+            rows = self._connect().execute(
+                f"SELECT {_ROW_COLUMNS} FROM entries WHERE is_dir = 0 ORDER BY path").fetchall()
+        else:
+            low, high = _subtree_bounds(path)
+            rows = self._connect().execute(
+                f"SELECT {_ROW_COLUMNS} FROM entries "
+                "WHERE is_dir = 0 AND (path = ? OR (path >= ? AND path < ?)) ORDER BY path",
+                (path, low, high)).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def file_paths(self, path: str = "") -> list[str] | None:
+        """The paths of `files`, without the other columns"""
+        if self.state is not IndexState.READY:
+            return None
+        if path == "":
+            rows = self._connect().execute("SELECT path FROM entries WHERE is_dir = 0 ORDER BY path").fetchall()
+        else:
+            low, high = _subtree_bounds(path)
+            rows = self._connect().execute(
+                "SELECT path FROM entries WHERE is_dir = 0 AND (path = ? OR (path >= ? AND path < ?)) ORDER BY path",
+                (path, low, high)).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+_indexes: dict[str, WorkspaceIndex] = {}
+_indexes_lock = threading.Lock()
+
+def use_workspace_index(directory: str) -> WorkspaceIndex:
+    """The index of a workspace directory, shared by all tasks of the workspace, it is started by the first search"""
+    root = str(Path(directory).expanduser().resolve())
+    with _indexes_lock:
+        if (index := _indexes.get(root)) is None:
+            index_dir = data_dir / "workspace_index"
+            index_dir.mkdir(exist_ok=True)
+            db_name = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+            index = _indexes[root] = WorkspaceIndex(root, index_dir / f"{db_name}.db")
+        return index
@@ -35,6 +35,13 @@ class ToolExecutedEvent:
     result: str | None
     event_id: Literal["TOOL_EXECUTED"] = "TOOL_EXECUTED"
 
+@dataclass(frozen=True)
+class ToolProgressEvent:
+    """Heartbeat event sent periodically while a tool is running"""
+    tool_call_id: str
+    elapsed: float
+    event_id: Literal["TOOL_PROGRESS"] = "TOOL_PROGRESS"
+
 @dataclass(frozen=True)
 class ToolRequireUserResponseEvent:
     """Event for tools that require user response"""
@@ -60,6 +67,7 @@ AgentEvent = (
     TaskDoneEvent |
     TaskInterruptedEvent |
     ToolExecutedEvent |
+    ToolProgressEvent |
     ToolRequireUserResponseEvent |
     ToolRequirePermissionEvent |
     ErrorEvent
@@ -0,0 +1,73 @@
+import asyncio
+from a2wsgi import WSGIMiddleware
+from flask import Flask
+from typing import TypeVar
+from pydantic import BaseModel, ValidationError
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route, request_response
+from .routes.task import ContinueTaskBody, ToolAnswerBody, agent_stream_async, task_pool
+
+BODY = TypeVar("BODY", bound=BaseModel)
+
+async def _parse_body(request: Request, model: type[BODY]) -> BODY | Response:
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        # keep the same error shape as flask_pydantic
+        return JSONResponse({
+            "validation_error": {"body_params": e.errors(include_context=False)}
+        }, status_code=400)
+
+async def continue_task(request: Request) -> Response:
+    """
+    Async version of the `/api/tasks/<task_id>/continue` endpoint
+    """
+    task_id = request.path_params["task_id"]
+    body = await _parse_body(request, ContinueTaskBody)
+    if isinstance(body, Response):
+        return body
+
+    task = await asyncio.to_thread(task_pool.add, task_id)
+    if body.message is not None:
+        # counts the tokens of the message, which may be long
+        await asyncio.to_thread(task.append_message, body.message)
+
+    return StreamingResponse(agent_stream_async(task_id, task),
+                             media_type="text/event-stream")
+
+async def tool_answer(request: Request) -> Response:
+    """
+    Async version of the `/api/tasks/<task_id>/tool_answer` endpoint
+    """
+    task_id = request.path_params["task_id"]
+    body = await _parse_body(request, ToolAnswerBody)
+    if isinstance(body, Response):
+        return body
+
+    task = await asyncio.to_thread(task_pool.add, task_id)
+    task.set_tool_call_result(body.tool_call_id, body.answer)
+    return StreamingResponse(agent_stream_async(task_id, task),
+                             media_type="text/event-stream")
+
+def _stream_route(path: str, endpoint) -> Route:
+    app = CORSMiddleware(request_response(endpoint),
+                         allow_origins=["*"],
+                         allow_methods=["*"],
+                         allow_headers=["*"])
+    return Route(path, app, methods=["POST", "OPTIONS"])
+
+def create_asgi_app(flask_app: Flask) -> Starlette:
+    """
+    Wrap the Flask app into an ASGI app.
+    The task streaming endpoints are served natively as async generators,
+    so an idle stream costs a coroutine instead of a worker thread;
+    all of the other routes are delegated to the Flask app.
+    """
+    return Starlette(routes=[
+        _stream_route("/api/tasks/{task_id:int}/continue", continue_task),
+        _stream_route("/api/tasks/{task_id:int}/tool_answer", tool_answer),
+        Mount("/", WSGIMiddleware(flask_app)),
+    ])
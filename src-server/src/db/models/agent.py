@@ -11,6 +11,9 @@ class Agent(Base):
     # name of lucide icon, default is "bot"
     icon_name: Mapped[str] = mapped_column(default="bot")
     system_prompt: Mapped[str]
+    # allow multiple tool calls per assistant turn,
+    # the read-only ones are executed concurrently
+    parallel_tool_calls: Mapped[bool] = mapped_column(default=False)
     model_id: Mapped[int] = mapped_column(
         ForeignKey(LlmModel.id, ondelete="SET NULL"), nullable=True)
     model = relationship("LlmModel", back_populates="agents")
@@ -2,7 +2,7 @@ import enum
 import time
 from typing import Annotated
 from liteai_sdk import SystemMessage, UserMessage, AssistantMessage, ToolMessage
-from pydantic import Discriminator, TypeAdapter
+from pydantic import BaseModel, Discriminator, TypeAdapter
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from . import Base
@@ -17,6 +17,19 @@ TaskMessage = Annotated[
 message_adapter = TypeAdapter(TaskMessage)
 messages_adapter = TypeAdapter(list[TaskMessage])
 
+class CompactedHistory(BaseModel):
+    """
+    Compacted view of the leading part of a task transcript,
+    `messages` replace the first `source_length` messages of the transcript.
+    """
+    messages: list[TaskMessage]
+    source_length: int
+
+    def apply(self, transcript: list[TaskMessage]) -> list[TaskMessage]:
+        return [*self.messages, *transcript[self.source_length:]]
+
+compacted_history_adapter = TypeAdapter(CompactedHistory)
+
 class TaskType(str, enum.Enum):
     Agent = "agent"
     Orchestration = "orchestration"
@@ -28,6 +41,11 @@ class Task(Base):
     type: Mapped[TaskType]
     title: Mapped[str]
     messages: Mapped[list[TaskMessage]] = mapped_column(PydanticJSON(messages_adapter), default=list)
+    # the view sent to the model when the transcript no longer fits in the context window
+    compacted_history: Mapped[CompactedHistory | None] = mapped_column(
+        PydanticJSON(compacted_history_adapter), nullable=True)
+    # estimated tokens of the next request, recorded when the task is persisted
+    context_tokens: Mapped[int] = mapped_column(default=0)
     last_run_at: Mapped[int] = mapped_column(default=lambda: int(time.time()))
     agent_id: Mapped[int] = mapped_column(ForeignKey(Agent.id, ondelete="SET NULL"), nullable=True)
     agent = relationship("Agent", back_populates="tasks")
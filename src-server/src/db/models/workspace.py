@@ -14,6 +14,9 @@ class Workspace(Base):
         back_populates="workspaces"
     )
     workspace_background: Mapped[str]
+    # size limit of the trigram index used by the content search, in bytes,
+    # the index is disabled beyond it, 0 does not build it at all
+    search_index_max_bytes: Mapped[int] = mapped_column(default=1024 * 1024 * 1024)
     tasks = relationship("Task", back_populates="workspace", cascade="all, delete-orphan",)
 
 def init(session: Session):
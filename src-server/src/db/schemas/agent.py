@@ -6,6 +6,7 @@ class AgentBase(DTOBase):
     name: str
     icon_name: str
     system_prompt: str
+    parallel_tool_calls: bool = False
 
 class AgentBrief(DTOBase):
     id: int
@@ -23,4 +24,5 @@ class AgentUpdate(DTOBase):
     name: str | None = None
     icon_name: str | None = None
     system_prompt: str | None = None
+    parallel_tool_calls: bool | None = None
     model_id: int | None = None
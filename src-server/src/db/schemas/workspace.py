@@ -8,6 +8,7 @@ if TYPE_CHECKING:
 class WorkspaceBase(DTOBase):
     name: str
     directory: str
+    search_index_max_bytes: int = 1024 * 1024 * 1024
 
 class WorkspaceRead(WorkspaceBase):
     id: int
@@ -19,4 +20,5 @@ class WorkspaceCreate(WorkspaceBase):
 class WorkspaceUpdate(DTOBase):
     name: str | None = None
     directory: str | None = None
+    search_index_max_bytes: int | None = None
     usable_agent_ids: list[int] | None = None
@@ -7,9 +7,16 @@ from .db import migrate_db
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--port", type=int, default=1460)
+    parser.add_argument("--asgi", action="store_true",
+                        help="Serve with the async server, so that task streams do not hold worker threads")
     args = parser.parse_args()
 
     migrate_db()
     app = App()
     logger.info("Starting server on port {}", args.port)
-    serve(app, host="localhost", port=args.port)
+    if args.asgi:
+        import uvicorn
+        from .asgi import create_asgi_app
+        uvicorn.run(create_asgi_app(app), host="localhost", port=args.port)
+    else:
+        serve(app, host="localhost", port=args.port)
@@ -1,4 +1,4 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from dataclasses import asdict
 from loguru import logger
 from flask import Blueprint, Response, jsonify, stream_with_context
@@ -8,14 +8,15 @@ from flask_pydantic import validate
 from .types import FlaskResponse, PaginatedResponse
 from ..agent import AgentTask, AgentTaskPool
 from ..agent.types import (
+    AgentEvent,
     MessageChunkEvent, MessageStartEvent, MessageEndEvent,
     TaskDoneEvent, TaskInterruptedEvent,
-    ToolExecutedEvent, ToolRequireUserResponseEvent,
+    ToolExecutedEvent, ToolProgressEvent, ToolRequireUserResponseEvent,
     ToolRequirePermissionEvent, ErrorEvent
 )
 from ..services.task import TaskService
 from ..db.schemas import task as task_schemas
-from ..utils.sse import format_sse
+from ..utils.sse import encode_sse, SseObjectTemplate
 
 tasks_bp = Blueprint("tasks", __name__)
 task_pool = AgentTaskPool()
@@ -56,6 +57,27 @@ def get_task(task_id: int) -> FlaskResponse:
                                    .model_validate(task)
                                    .model_dump(mode="json"))
 
+@tasks_bp.route("/<int:task_id>/context_usage", methods=["GET"])
+def get_task_context_usage(task_id: int) -> FlaskResponse:
+    """
+    Estimated tokens of the next request of the task and the context size of the model,
+    read from the running task or from the value recorded when it was persisted.
+    """
+    if (agent_task := task_pool.get(task_id)) is not None:
+        return jsonify({
+            "used_tokens": agent_task.context_tokens,
+            "max_tokens": agent_task.context_size,
+        })
+
+    with TaskService() as service:
+        task = service.get_task_by_id(task_id)
+        if not task:
+            return jsonify({"error": "Task not found"}), 404
+        return jsonify({
+            "used_tokens": task.context_tokens,
+            "max_tokens": task.agent.model.context_size if task.agent and task.agent.model else 0,
+        })
+
 @tasks_bp.route("/", methods=["POST"])
 @validate()
 def new_task(body: task_schemas.TaskCreate) -> FlaskResponse:
@@ -86,66 +108,80 @@ class ToolAnswerBody(BaseModel):
     tool_call_id: str
     answer: str
 
-def agent_stream(async_task_id: int, agent_task: AgentTask) -> Generator[str]:
+_text_chunk_sse = SseObjectTemplate("MESSAGE_CHUNK", {"type": "text"}, "content")
+
+def encode_agent_event(agent_task: AgentTask, event: AgentEvent) -> bytes | None:
     """
-    Process agent event stream and convert to SSE format
+    Encode an agent event into an SSE frame
     """
-    try:
-        for event in agent_task.run():
-            match event:
-                case MessageChunkEvent(chunk):
-                    match chunk:
-                        case TextChunk(content):
-                            yield format_sse(event=event.event_id, data={
-                                "type": "text",
-                                "content": content,
-                            })
-                        case UsageChunk() as chunk:
-                            yield format_sse(event=event.event_id, data={
-                                "type": "usage",
-                                "max_tokens": agent_task._ctx.model.context_size,
-                                **asdict(chunk),
-                            })
-                        case ToolCallChunk() as chunk:
-                            yield format_sse(event=event.event_id, data={
-                                "type": "tool_call",
-                                "data": asdict(chunk),
-                            })
-
-                case MessageStartEvent():
-                    yield format_sse(event=event.event_id, data=None)
-
-                case MessageEndEvent():
-                    yield format_sse(event=event.event_id, data=None)
-
-                case ToolExecutedEvent(tool_call_id=tool_call_id, result=result):
-                    yield format_sse(event=event.event_id, data={
-                        "tool_call_id": tool_call_id,
-                        "result": result,
+    match event:
+        case MessageChunkEvent(chunk):
+            match chunk:
+                case TextChunk(content):
+                    return _text_chunk_sse(content)
+                case UsageChunk() as chunk:
+                    return encode_sse(event=event.event_id, data={
+                        "type": "usage",
+                        "max_tokens": agent_task._ctx.model.context_size,
+                        **asdict(chunk),
                     })
-
-                case ToolRequireUserResponseEvent(tool_name=tool_name):
-                    yield format_sse(event=event.event_id, data={
-                        "tool_name": tool_name,
+                case ToolCallChunk() as chunk:
+                    return encode_sse(event=event.event_id, data={
+                        "type": "tool_call",
+                        "data": asdict(chunk),
                     })
 
-                case ToolRequirePermissionEvent(tool_call_id=tool_call_id):
-                    yield format_sse(event=event.event_id, data={
-                        "tool_call_id": tool_call_id,
-                    })
+        case MessageStartEvent():
+            return encode_sse(event=event.event_id, data=None)
+
+        case MessageEndEvent():
+            return encode_sse(event=event.event_id, data=None)
 
-                case TaskDoneEvent():
-                    yield format_sse(event=event.event_id, data=None)
+        case ToolExecutedEvent(tool_call_id=tool_call_id, result=result):
+            return encode_sse(event=event.event_id, data={
+                "tool_call_id": tool_call_id,
+                "result": result,
+            })
 
-                case TaskInterruptedEvent():
-                    yield format_sse(event=event.event_id, data=None)
+        case ToolProgressEvent(tool_call_id=tool_call_id, elapsed=elapsed):
+            return encode_sse(event=event.event_id, data={
+                "tool_call_id": tool_call_id,
+                "elapsed": round(elapsed, 1),
+            })
 
-                case ErrorEvent(error=error):
-                    _logger.exception("Task failed: {}", error)
-                    _logger.debug("Task openai messages: {}",
-                                [m.to_litellm_message() for m in agent_task._messages])
-                    yield format_sse(event=event.event_id, data={"message": str(error)})
-                    break
+        case ToolRequireUserResponseEvent(tool_name=tool_name):
+            return encode_sse(event=event.event_id, data={
+                "tool_name": tool_name,
+            })
+
+        case ToolRequirePermissionEvent(tool_call_id=tool_call_id):
+            return encode_sse(event=event.event_id, data={
+                "tool_call_id": tool_call_id,
+            })
+
+        case TaskDoneEvent():
+            return encode_sse(event=event.event_id, data=None)
+
+        case TaskInterruptedEvent():
+            return encode_sse(event=event.event_id, data=None)
+
+        case ErrorEvent(error=error):
+            _logger.exception("Task failed: {}", error)
+            _logger.debug("Task openai messages: {}",
+                        [m.to_litellm_message() for m in agent_task._messages])
+            return encode_sse(event=event.event_id, data={"message": str(error)})
+    return None
+
+def agent_stream(async_task_id: int, agent_task: AgentTask) -> Generator[bytes]:
+    """
+    Process agent event stream and convert to SSE format
+    """
+    try:
+        for event in agent_task.run():
+            if (sse := encode_agent_event(agent_task, event)) is not None:
+                yield sse
+            if isinstance(event, ErrorEvent):
+                break
 
         task_pool.remove(async_task_id)
     except GeneratorExit:
@@ -153,6 +189,24 @@ def agent_stream(async_task_id: int, agent_task: AgentTask) -> Generator[str]:
         task_pool.stop(async_task_id)
         return
 
+async def agent_stream_async(async_task_id: int, agent_task: AgentTask) -> AsyncGenerator[bytes]:
+    """
+    Asynchronous version of `agent_stream`, used by the ASGI server
+    """
+    finished = False
+    try:
+        async for event in agent_task.run_async():
+            if (sse := encode_agent_event(agent_task, event)) is not None:
+                yield sse
+            if isinstance(event, ErrorEvent):
+                break
+        finished = True
+        task_pool.remove(async_task_id)
+    finally:
+        if not finished:
+            # When client disconnects
+            task_pool.stop(async_task_id)
+
 @tasks_bp.route("/<int:task_id>/continue", methods=["POST"])
 @validate()
 def continue_task(task_id: int, body: ContinueTaskBody) -> FlaskResponse:
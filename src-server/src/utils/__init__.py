@@ -1 +1,2 @@
 from .async_task_pool import use_async_task_pool, TaskId, TaskNotFoundError
+from .event_channel import EventChannel, ChannelClosedError
\ No newline at end of file
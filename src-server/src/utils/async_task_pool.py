@@ -40,7 +40,7 @@ class AsyncTaskPool(threading.Thread):
             return result
         finally:
             with self._lock:
-                del self._tasks[task_id]
+                self._tasks.pop(task_id, None)
 
     def cancel(self, task_id: TaskId) -> bool:
         with self._lock:
@@ -49,7 +49,8 @@ class AsyncTaskPool(threading.Thread):
             future = self._tasks[task_id]
 
         was_cancelled = future.cancel()
-        self._tasks.pop(task_id)
+        with self._lock:
+            self._tasks.pop(task_id, None)
         return was_cancelled
 
     def run(self):
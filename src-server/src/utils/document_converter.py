@@ -0,0 +1,241 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from loguru import logger
+
+# exit code of a worker that stopped itself for exceeding the memory limit
+_MEMORY_LIMIT_EXIT_CODE = 86
+_RSS_CHECK_INTERVAL = 0.1
+
+class DocumentConversionError(Exception): pass
+class DocumentConversionTimeoutError(DocumentConversionError): pass
+
+@dataclass
+class ConversionResult:
+    markdown: str
+    title: str | None = None
+
+_markitdown = None
+
+def convert_with_markitdown(path: str) -> ConversionResult:
+    global _markitdown
+    if _markitdown is None:
+        from markitdown import MarkItDown
+        _markitdown = MarkItDown()
+    result = _markitdown.convert(path)
+    return ConversionResult(markdown=result.markdown, title=result.title)
+
+def _warm_up_markitdown():
+    # import the converter before the first job arrives
+    global _markitdown
+    from markitdown import MarkItDown
+    _markitdown = MarkItDown()
+
+def _current_rss() -> int | None:
+    """Resident set size of the current process in bytes, None if it can not be measured"""
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD),
+                        ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    if sys.platform == "darwin":
+        import resource
+        # the peak RSS, in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None
+
+def _watch_memory(max_rss: int):
+    while True:
+        rss = _current_rss()
+        if rss is None:
+            return
+        if rss > max_rss:
+            os._exit(_MEMORY_LIMIT_EXIT_CODE)
+        time.sleep(_RSS_CHECK_INTERVAL)
+
+def _worker_main(conn: Connection,
+                 job: Callable[[str], ConversionResult],
+                 warm_up: Callable[[], None] | None,
+                 max_rss: int | None):
+    if warm_up is not None:
+        warm_up()
+    if max_rss is not None:
+        threading.Thread(target=_watch_memory, args=(max_rss,), daemon=True).start()
+    while True:
+        try:
+            path = conn.recv()
+        except (EOFError, OSError):
+            return
+        if path is None:
+            return
+        try:
+            conn.send(("ok", job(path)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+@dataclass
+class _Worker:
+    process: BaseProcess
+    conn: Connection
+    jobs: int = 0
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+class DocumentConverter:
+    """
+    Convert documents in a small pool of worker processes,
+    so that a huge or malformed document can not exhaust the memory or hold the GIL of the server.
+
+    Workers import the converter once and are reused, and replaced after `max_jobs_per_worker` jobs.
+    A worker is killed when its job exceeds the timeout, when its RSS exceeds `max_rss` bytes,
+    or when `cancel_check` raises.
+    """
+    _logger = logger.bind(name="DocumentConverter")
+
+    def __init__(self,
+                 max_workers: int = 2,
+                 timeout: float = 120,
+                 max_rss: int | None = 2 * 1024 * 1024 * 1024,
+                 max_jobs_per_worker: int = 20,
+                 poll_interval: float = 0.1,
+                 job: Callable[[str], ConversionResult] = convert_with_markitdown,
+                 warm_up: Callable[[], None] | None = _warm_up_markitdown):
+        self.timeout = timeout
+        self.max_rss = max_rss
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.poll_interval = poll_interval
+        self._job = job
+        self._warm_up = warm_up
+        # always spawn, forking the multi-threaded server is not safe
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._idle: list[_Worker] = []
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main,
+                                        args=(child_conn, self._job, self._warm_up, self.max_rss),
+                                        name="DocumentConverterWorker",
+                                        daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def _acquire_worker(self) -> _Worker:
+        with self._lock:
+            while len(self._idle) > 0:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.kill()
+        return self._spawn()
+
+    def _release_worker(self, worker: _Worker):
+        if worker.jobs >= self.max_jobs_per_worker:
+            # recycle the worker to release the memory it accumulated
+            worker.conn.send(None)
+            worker.process.join(timeout=1)
+            worker.kill()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def _wait_result(self,
+                     worker: _Worker,
+                     path: Path,
+                     timeout: float,
+                     cancel_check: Callable[[], object] | None) -> tuple[str, object]:
+        deadline = time.monotonic() + timeout
+        while not worker.conn.poll(self.poll_interval):
+            if cancel_check is not None:
+                cancel_check()
+            if time.monotonic() > deadline:
+                raise DocumentConversionTimeoutError(
+                    f"Converting {path.name} timed out after {timeout} seconds")
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            if worker.process.exitcode == _MEMORY_LIMIT_EXIT_CODE:
+                raise DocumentConversionError(
+                    f"Converting {path.name} exceeded the memory limit of {self.max_rss} bytes")
+            raise DocumentConversionError(
+                f"The conversion worker exited unexpectedly with code {worker.process.exitcode}")
+
+    def convert(self,
+                path: str | Path,
+                timeout: float | None = None,
+                cancel_check: Callable[[], object] | None = None) -> ConversionResult:
+        """
+        Convert the document in a worker process.
+        `cancel_check` is called periodically while waiting, the job is aborted if it raises.
+        """
+        path = Path(path)
+        timeout = self.timeout if timeout is None else timeout
+        with self._slots:
+            worker = self._acquire_worker()
+            succeeded = False
+            try:
+                worker.conn.send(str(path.absolute()))
+                status, value = self._wait_result(worker, path, timeout, cancel_check)
+                succeeded = True
+            finally:
+                if succeeded:
+                    worker.jobs += 1
+                    self._release_worker(worker)
+                else:
+                    self._logger.warning("Killing the conversion worker of {}", path)
+                    worker.kill()
+
+        if status == "error":
+            raise DocumentConversionError(f"Failed to convert {path.name}: {value}")
+        assert isinstance(value, ConversionResult)
+        return value
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.kill()
+
+__instance: DocumentConverter | None = None
+__instance_lock = threading.Lock()
+
+def use_document_converter() -> DocumentConverter:
+    global __instance
+    with __instance_lock:
+        if __instance is None:
+            __instance = DocumentConverter()
+        return __instance
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from typing import Generic, TypeVar
+
+ITEM = TypeVar("ITEM")
+
+class ChannelClosedError(Exception): pass
+
+class EventChannel(Generic[ITEM]):
+    """
+    A notification-driven channel between a producer running on an asyncio loop
+    (usually the AsyncTaskPool loop) and a consumer that is either a plain thread
+    or a coroutine running on another loop.
+
+    Consumers are woken up exactly when an item is put or the channel is closed,
+    there is no timeout based polling involved.
+    Closing the channel from either side wakes up all of the waiting consumers,
+    `close` returns whether the channel was still open, so that the consumer side
+    can tell whether it should cancel a producer that has not finished yet.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._items: deque[ITEM] = deque()
+        self._closed = False
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _wake_async_waiters(self):
+        # must be called with self._cond held
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_resolve_waiter, waiter)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def put(self, item: ITEM) -> bool:
+        """
+        Put an item into the channel and notify the consumer.
+        Returns False if the channel is already closed and the item was dropped.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            self._items.append(item)
+            self._cond.notify()
+            if self._async_waiters:
+                self._wake_async_waiters()
+        return True
+
+    def close(self) -> bool:
+        """
+        Close the channel, the remaining items can still be consumed.
+        Returns True if this call closed the channel, False if it was already closed.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            self._closed = True
+            self._cond.notify_all()
+            self._wake_async_waiters()
+        return True
+
+    def get(self, timeout: float | None = None) -> ITEM:
+        """
+        Block the current thread until an item is available.
+
+        Raises:
+            ChannelClosedError: If the channel is closed and drained
+            TimeoutError: If `timeout` is given and no item arrived in time
+        """
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    raise ChannelClosedError()
+                if not self._cond.wait(timeout):
+                    raise TimeoutError()
+            return self._items.popleft()
+
+    async def get_async(self) -> ITEM:
+        """
+        Asynchronous version of `get`, can be awaited from any event loop.
+
+        Raises:
+            ChannelClosedError: If the channel is closed and drained
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._items:
+                    return self._items.popleft()
+                if self._closed:
+                    raise ChannelClosedError()
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def __iter__(self) -> Iterator[ITEM]:
+        while True:
+            try:
+                yield self.get()
+            except ChannelClosedError:
+                return
+
+    async def __aiter__(self) -> AsyncIterator[ITEM]:
+        while True:
+            try:
+                yield await self.get_async()
+            except ChannelClosedError:
+                return
+
+def _resolve_waiter(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
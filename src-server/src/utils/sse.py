@@ -1,31 +1,111 @@
 import json
+from functools import lru_cache
+from json.encoder import encode_basestring
 from ..types import JsonSerializable
 
-def format_sse(data: JsonSerializable,
-               event: str | None = None,
-               event_id: str | None = None,
-               retry: int | None = None) -> str:
-    buffer = []
+try:
+    # orjson escapes strings exactly like `json.dumps(ensure_ascii=False)`,
+    # and is much faster on long strings, use it when it is installed.
+    import orjson
+except ImportError:
+    orjson = None
 
-    if event_id is not None:
-        buffer.append(f"id: {event_id}")
+# ensure_ascii=False 可以让中文不显示为 \uXXXX，减小体积且可读性更好
+_json_encoder = json.JSONEncoder(ensure_ascii=False)
 
-    if event is not None:
-        buffer.append(f"event: {event}")
+# All of the characters that `str.splitlines` splits on,
+# a few substring checks are much faster than a regex search here.
+_LINE_BREAKS = ("\n", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029")
+# Line breaks that are not escaped by the JSON encoder
+_JSON_UNESCAPED_LINE_BREAKS = ("\x85", "\u2028", "\u2029")
 
+def _contains_any(text: str, chars: tuple[str, ...]) -> bool:
+    for char in chars:
+        if char in text:
+            return True
+    return False
+
+def _dumps_str(value: str) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            # orjson rejects lone surrogates, let the standard library handle them
+            pass
+    return encode_basestring(value).encode("utf-8")
+
+@lru_cache(maxsize=64)
+def _encode_header(event_id: str | None, event: str | None, retry: int | None) -> bytes:
+    buffer = []
+    if event_id is not None:
+        buffer.append(f"id: {event_id}\n")
+    if event is not None:
+        buffer.append(f"event: {event}\n")
     if retry is not None:
-        buffer.append(f"retry: {retry}")
+        buffer.append(f"retry: {retry}\n")
+    return "".join(buffer).encode("utf-8")
+
+def _encode_frame(header: bytes, payload: str, line_breaks: tuple[str, ...]) -> bytes:
+    if not _contains_any(payload, line_breaks):
+        if payload:
+            return b"".join((header, b"data: ", payload.encode("utf-8"), b"\n\n"))
+        lines = []
+    else:
+        # SSE 规范要求：如果数据包含换行，每一行都必须以 "data: " 开头
+        lines = payload.splitlines()
+
+    if len(lines) == 0:
+        # 每一块数据结束必须有两个换行符
+        return header + b"\n" if header else b"\n\n"
+    return header + "\n".join(f"data: {line}" for line in lines).encode("utf-8") + b"\n\n"
+
+def encode_sse(data: JsonSerializable,
+               event: str | None = None,
+               event_id: str | None = None,
+               retry: int | None = None) -> bytes:
+    """
+    Encode an SSE frame directly into bytes.
+    The field lines are cached per (event_id, event, retry) combination,
+    and payloads without line breaks skip the line splitting.
+    """
+    header = _encode_header(event_id, event, retry)
+
+    if data is None:
+        return header + b"data: null\n\n"
 
     # 如果数据不是字符串，尝试将其序列化为 JSON
     if not isinstance(data, str):
-        # ensure_ascii=False 可以让中文不显示为 \uXXXX，减小体积且可读性更好
-        payload = json.dumps(data, ensure_ascii=False)
-    else:
-        payload = data
+        return _encode_frame(header, _json_encoder.encode(data), _JSON_UNESCAPED_LINE_BREAKS)
+    return _encode_frame(header, data, _LINE_BREAKS)
+
+def format_sse(data: JsonSerializable,
+               event: str | None = None,
+               event_id: str | None = None,
+               retry: int | None = None) -> str:
+    return encode_sse(data, event, event_id, retry).decode("utf-8")
+
+class SseObjectTemplate:
+    """
+    Pre-encoded SSE frame of a JSON object with constant leading fields
+    and one trailing string field, which is the only part encoded per call.
+
+    Example:
+        >>> text_chunk = SseObjectTemplate("MESSAGE_CHUNK", {"type": "text"}, "content")
+        >>> text_chunk("Hello")
+        b'event: MESSAGE_CHUNK\\ndata: {"type": "text", "content": "Hello"}\\n\\n'
+    """
+
+    def __init__(self, event: str, constant_fields: dict[str, JsonSerializable], field: str):
+        self._event = event
+        self._constant_fields = constant_fields
+        self._field = field
 
-    # SSE 规范要求：如果数据包含换行，每一行都必须以 "data: " 开头
-    for line in payload.splitlines():
-        buffer.append(f"data: {line}")
+        empty_object = _json_encoder.encode({**constant_fields, field: ""})
+        object_prefix = empty_object[:-len('""}')]
+        self._prefix = _encode_header(None, event, None) + b"data: " + object_prefix.encode("utf-8")
 
-    # 每一块数据结束必须有两个换行符
-    return "\n".join(buffer) + "\n\n"
+    def __call__(self, value: str) -> bytes:
+        if _contains_any(value, _JSON_UNESCAPED_LINE_BREAKS):
+            # these characters are not escaped by JSON but split into lines
+            return encode_sse({**self._constant_fields, self._field: value}, event=self._event)
+        return b"".join((self._prefix, _dumps_str(value), b"}\n\n"))
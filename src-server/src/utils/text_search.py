@@ -0,0 +1,132 @@
+import multiprocessing
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+# like git grep, a file with a NUL byte in its first bytes is treated as binary
+BINARY_SNIFF_BYTES = 8192
+
+@dataclass(frozen=True)
+class SearchQuery:
+    pattern: str
+    # match the pattern as plain text instead of a regular expression
+    literal: bool = False
+    case_sensitive: bool = True
+    context_lines: int = 0
+    # matches collected from one file at most
+    max_matches: int = 100
+    # files larger than this are skipped
+    max_file_bytes: int = 16 * 1024 * 1024
+    # longer lines are clipped around the match
+    max_line_chars: int = 300
+
+    def compile(self) -> re.Pattern[str]:
+        """
+        Raises:
+            re.error: If the pattern is not a valid regular expression
+        """
+        pattern = re.escape(self.pattern) if self.literal else self.pattern
+        flags = re.MULTILINE | (0 if self.case_sensitive else re.IGNORECASE)
+        return re.compile(pattern, flags)
+
+@dataclass
+class FileMatches:
+    path: str
+    # (line number, line, whether the line matches) of the matching lines and their context,
+    # a gap in the line numbers separates two blocks
+    lines: list[tuple[int, str, bool]] = field(default_factory=list)
+    match_count: int = 0
+    # whether the file has more matches than `max_matches`
+    truncated: bool = False
+
+def clip_line(line: str, column: int, max_chars: int) -> str:
+    if len(line) <= max_chars:
+        return line
+    start = max(0, min(column - max_chars // 4, len(line) - max_chars))
+    clipped = line[start:start + max_chars]
+    return ("…" if start > 0 else "") + clipped + ("…" if start + max_chars < len(line) else "")
+
+def search_file(path: str, query: SearchQuery, regex: re.Pattern[str] | None = None) -> FileMatches | None:
+    """The matching lines of a text file, None if it does not match or is binary, too large or unreadable"""
+    if regex is None:
+        regex = query.compile()
+    try:
+        with open(path, "rb") as f:
+            head = f.read(BINARY_SNIFF_BYTES)
+            if b"\0" in head:
+                return None
+            data = head + f.read(query.max_file_bytes + 1 - len(head))
+    except OSError:
+        return None
+    if len(data) > query.max_file_bytes:
+        return None
+    text = data.decode("utf-8", errors="replace")
+
+    match = regex.search(text)
+    if match is None:
+        return None
+
+    # (line number, column of the match) of every matching line
+    matched_lines: list[tuple[int, int]] = []
+    line_number = 1
+    counted_until = 0
+    truncated = False
+    while match is not None:
+        if match.start() == len(text) and text.endswith("\n"):
+            # the empty string after the last line break is not a line
+            break
+        if len(matched_lines) >= query.max_matches:
+            truncated = True
+            break
+        line_start = text.rfind("\n", 0, match.start()) + 1
+        line_number += text.count("\n", counted_until, line_start)
+        counted_until = line_start
+        matched_lines.append((line_number, match.start() - line_start))
+        line_end = text.find("\n", match.start())
+        if line_end == -1:
+            break
+        # one match per line, continue on the next line
+        match = regex.search(text, line_end + 1)
+
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    result = FileMatches(path, match_count=len(matched_lines), truncated=truncated)
+    columns = dict(matched_lines)
+    context = query.context_lines
+    last_emitted = 0
+    for matched_line_number, _ in matched_lines:
+        first = max(matched_line_number - context, last_emitted + 1)
+        last = min(matched_line_number + context, len(lines))
+        for number in range(first, last + 1):
+            line = lines[number - 1].removesuffix("\r")
+            is_match = number in columns
+            result.lines.append((number, clip_line(line, columns.get(number, 0), query.max_line_chars), is_match))
+        last_emitted = max(last_emitted, last)
+    return result
+
+def search_files(paths: list[str], query: SearchQuery) -> list[FileMatches]:
+    """Search the files in order, the job run in the worker processes"""
+    regex = query.compile()
+    return [matches for path in paths if (matches := search_file(path, query, regex)) is not None]
+
+__pool: ProcessPoolExecutor | None = None
+__pool_lock = threading.Lock()
+
+def use_search_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Worker processes shared by all searches, the regular expressions run outside of the GIL of the server"""
+    global __pool
+    with __pool_lock:
+        if __pool is None:
+            # always spawn, forking the multi-threaded server is not safe
+            __pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return __pool
+
+def reset_search_pool():
+    """Drop the pool after a worker died, the next search starts a new one"""
+    global __pool
+    with __pool_lock:
+        pool, __pool = __pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,201 @@
+import array
+import operator
+import os
+import re
+import sys
+import zlib
+from itertools import accumulate, chain, repeat
+from loguru import logger
+from .text_search import BINARY_SNIFF_BYTES
+
+# Regex patterns are read with the parser of `re`, a private module of the standard library
+# that exists under these names from Python 3.11 on and whose output may change between releases.
+# Without it, or if its output can not be read, the queries match all files.
+try:
+    from re import _constants as sre_constants, _parser as sre_parser
+except ImportError:
+    sre_constants = sre_parser = None
+
+_logger = logger.bind(name="Trigrams")
+
+# A trigram is three bytes of the ASCII-lowercased file content, packed into an int.
+# Queries are answered with the lowercased trigrams too, so one index serves
+# both the case sensitive and the case insensitive searches.
+
+# A query in disjunctive normal form: a file may match if it contains all the trigrams
+# of at least one of the sets. An empty set is satisfied by every file.
+TrigramQuery = list[frozenset[int]]
+MATCH_ALL: TrigramQuery = [frozenset()]
+
+# queries with more alternatives are relaxed, the result is still a superset of the matches
+_MAX_ALTERNATIVES = 16
+# character classes with up to this number of literals are expanded into alternatives
+_MAX_CLASS_EXPANSION = 8
+
+def _pack(trigram: bytes) -> int:
+    return int.from_bytes(trigram, sys.byteorder)
+
+def trigrams_of(data: bytes) -> array.array:
+    """The sorted distinct trigrams of the content"""
+    data = data.lower()
+    length = len(data)
+    if length < 4:
+        return array.array("I", sorted({_pack(data[i:i + 3]) for i in range(length - 2)}))
+    # read the content as 4-byte words at the 4 alignments, which covers every 4-gram,
+    # then split each 4-gram into its two trigrams, all of it without a loop in Python
+    quadgrams: set[int] = set()
+    for offset in range(4):
+        words = array.array("I")
+        words.frombytes(data[offset:offset + (length - offset) // 4 * 4])
+        quadgrams.update(words)
+    if sys.byteorder == "little":
+        low, high = map(operator.and_, quadgrams, repeat(0xFFFFFF)), map(operator.rshift, quadgrams, repeat(8))
+    else:
+        low, high = map(operator.rshift, quadgrams, repeat(8)), map(operator.and_, quadgrams, repeat(0xFFFFFF))
+    trigrams = set(low)
+    trigrams.update(high)
+    return array.array("I", sorted(trigrams))
+
+def extract_file(path: str, max_file_bytes: int) -> tuple[int, int, bool, array.array] | None:
+    """
+    (size, mtime_ns, is_text, trigrams) of a file, with the binary detection of the content search.
+    None if the file is larger than `max_file_bytes` or can not be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size > max_file_bytes:
+                return None
+            head = f.read(BINARY_SNIFF_BYTES)
+            if b"\0" in head:
+                return stat.st_size, stat.st_mtime_ns, False, array.array("I")
+            data = head + f.read()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns, True, trigrams_of(data)
+
+def extract_files(paths: list[str], max_file_bytes: int) -> list[tuple[int, int, bool, bytes] | None]:
+    """`extract_file` for a chunk of files, the job run in the worker processes"""
+    results = []
+    for path in paths:
+        extracted = extract_file(path, max_file_bytes)
+        results.append(None if extracted is None else (*extracted[:3], extracted[3].tobytes()))
+    return results
+
+def encode_postings(ids: array.array) -> bytes:
+    """Sorted file ids, delta encoded and compressed"""
+    deltas = array.array("I", map(operator.sub, ids, chain((0,), ids)))
+    return zlib.compress(deltas.tobytes(), 1)
+
+def decode_postings(blob: bytes) -> array.array:
+    deltas = array.array("I")
+    deltas.frombytes(zlib.decompress(blob))
+    return array.array("I", accumulate(deltas))
+
+# --- --- --- --- --- ---
+# --- Queries -----------
+# --- --- --- --- --- ---
+
+def _and(left: TrigramQuery, right: TrigramQuery) -> TrigramQuery:
+    if left == MATCH_ALL:
+        return right
+    if right == MATCH_ALL:
+        return left
+    if len(left) * len(right) > _MAX_ALTERNATIVES:
+        # either side alone is a weaker but valid condition, keep the one with fewer alternatives
+        return left if len(left) <= len(right) else right
+    return [a | b for a in left for b in right]
+
+def _or(left: TrigramQuery, right: TrigramQuery) -> TrigramQuery:
+    combined = left + right
+    if len(combined) > _MAX_ALTERNATIVES or any(len(alternative) == 0 for alternative in combined):
+        return MATCH_ALL
+    return combined
+
+def _string_query(text: str, ignore_case: bool) -> TrigramQuery:
+    # with IGNORECASE, a non-ASCII letter may match a letter with other bytes,
+    # only the ASCII runs are used, they are case folded by the lowercasing
+    runs = re.split(r"[^\x00-\x7f]+", text) if ignore_case else [text]
+    required: set[int] = set()
+    for run in runs:
+        encoded = run.encode("utf-8").lower()
+        required.update(_pack(encoded[i:i + 3]) for i in range(len(encoded) - 2))
+    return [frozenset(required)]
+
+def _strings_query(strings: set[str], ignore_case: bool) -> TrigramQuery:
+    query: TrigramQuery | None = None
+    for string in strings:
+        alternative = _string_query(string, ignore_case)
+        query = alternative if query is None else _or(query, alternative)
+    return MATCH_ALL if query is None else query
+
+def _class_literals(items) -> list[str] | None:
+    literals = []
+    for op, value in items:
+        if op is not sre_constants.LITERAL:
+            return None
+        literals.append(chr(value))
+    return literals
+
+def _sequence_query(items, ignore_case: bool) -> TrigramQuery:
+    query = MATCH_ALL
+    # the strings the current run of literals may be
+    exact: set[str] | None = None
+
+    def flush():
+        nonlocal query, exact
+        if exact is not None:
+            query = _and(query, _strings_query(exact, ignore_case))
+            exact = None
+
+    for op, value in items:
+        if op is sre_constants.LITERAL:
+            exact = {s + chr(value) for s in exact} if exact is not None else {chr(value)}
+        elif op is sre_constants.IN and (literals := _class_literals(value)) is not None and\
+                len(literals) * len(exact or ("",)) <= _MAX_CLASS_EXPANSION:
+            exact = {s + c for s in (exact or {""}) for c in literals}
+        elif op is sre_constants.AT:
+            # anchors do not consume characters
+            continue
+        else:
+            flush()
+            if op is sre_constants.SUBPATTERN:
+                _, add_flags, del_flags, sub = value
+                sub_ignore_case = (ignore_case or bool(add_flags & re.IGNORECASE)) and\
+                                  not del_flags & re.IGNORECASE
+                query = _and(query, _sequence_query(sub, sub_ignore_case))
+            elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, sre_constants.POSSESSIVE_REPEAT):
+                minimum, _, sub = value
+                if minimum >= 1:
+                    query = _and(query, _sequence_query(sub, ignore_case))
+            elif op is sre_constants.BRANCH:
+                branches: TrigramQuery | None = None
+                for branch in value[1]:
+                    branch_query = _sequence_query(branch, ignore_case)
+                    branches = branch_query if branches is None else _or(branches, branch_query)
+                if branches is not None:
+                    query = _and(query, branches)
+            elif op is sre_constants.ATOMIC_GROUP:
+                query = _and(query, _sequence_query(value, ignore_case))
+    flush()
+    return query
+
+def build_query(pattern: str, literal: bool, case_sensitive: bool) -> TrigramQuery:
+    """
+    The trigrams a file must contain to match the search,
+    MATCH_ALL if the pattern does not require any literal text of three bytes or more.
+    """
+    if literal:
+        return _string_query(pattern, not case_sensitive)
+    if sre_parser is None:
+        return MATCH_ALL
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        parsed = sre_parser.parse(pattern, flags)
+    except re.error:
+        return MATCH_ALL
+    try:
+        return _sequence_query(parsed, bool(parsed.state.flags & re.IGNORECASE))
+    except Exception as e:
+        _logger.warning("Can not read the parsed pattern {!r}, the search is not narrowed: {}", pattern, e)
+        return MATCH_ALL
@@ -1,5 +1,13 @@
 import pytest
 from pathlib import Path
+from src.agent.tools import conversion_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_conversion_cache(tmp_path, monkeypatch):
+    cache = conversion_cache.ConversionCache(tmp_path / "conversion_cache.db")
+    monkeypatch.setattr(conversion_cache, "__instance", cache)
+    yield cache
 
 
 @pytest.fixture
@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from liteai_sdk import AssistantMessage, SystemMessage
+from src.agent import AgentTask
+from src.agent.chunk_coalescer import CoalesceStats
+from src.agent.tools import ask_user, finish_task
+from src.agent.types import ErrorEvent, MessageEndEvent, MessageStartEvent, TaskDoneEvent,\
+                           ToolExecutedEvent, ToolRequireUserResponseEvent
+
+
+class StubAgentTask(AgentTask):
+    """An agent task without database, workspace indexes and context window"""
+    SPECULATIVE_TOOL_EXECUTION = False
+
+    def __init__(self, llm=None, read_only_tools=(), other_tools=(), parallel_tool_calls=True):
+        self._lock = threading.Lock()
+        self._ctx = SimpleNamespace(agent=SimpleNamespace(parallel_tool_calls=parallel_tool_calls))
+        self.llm = llm
+        self.task_id = 0
+        self.model_id = "stub"
+        self._system_message = SystemMessage(content="You are a test agent.")
+        self._cache_args = None
+        self._is_running = True
+        self._current_task_id = None
+        self._current_channel = None
+        self._tool_speculator = None
+        self._messages = []
+        self._compacted_history = None
+        self.coalesce_stats = CoalesceStats()
+        self._read_only_tools = {tool.__name__: tool for tool in read_only_tools}
+        self._tools = [*read_only_tools, *other_tools]
+
+    def __del__(self): pass
+
+    def persist(self): pass
+
+    def _update_context_tokens(self): pass
+
+    async def _compact_history(self): pass
+
+
+class FailingLoopTask(StubAgentTask):
+    """Fails outside of the LLM call, after the message of the turn was streamed"""
+    async def _create_llm_call(self, event_channel):
+        event_channel.put(MessageStartEvent())
+        event_channel.put(MessageEndEvent())
+        return [SimpleNamespace(name="broken")]
+
+    async def _process_tool_calls(self, tool_call_messages, event_channel):
+        return tool_call_messages[0].tool_def
+
+
+class TestErrorPropagation:
+    def test_run_reports_loop_errors(self):
+        events = list(FailingLoopTask().run())
+        assert [type(event) for event in events] == [MessageStartEvent, MessageEndEvent, ErrorEvent]
+        assert isinstance(events[-1].error, AttributeError)
+
+    def test_run_async_reports_loop_errors(self):
+        async def collect():
+            return [event async for event in FailingLoopTask().run_async()]
+
+        events = asyncio.run(collect())
+        assert [type(event) for event in events] == [MessageStartEvent, MessageEndEvent, ErrorEvent]
+        assert isinstance(events[-1].error, AttributeError)
+
+    def test_run_finishes_without_errors(self):
+        class DoneTask(StubAgentTask):
+            async def _create_llm_call(self, event_channel):
+                return []
+
+        assert [type(event) for event in DoneTask().run()] == [TaskDoneEvent]
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.events = []
+
+    def put(self, item):
+        self.events.append(item)
+        return True
+
+
+def tool_call(call_id, tool_def, arguments="{}"):
+    return SimpleNamespace(id=call_id, name=tool_def.__name__, tool_def=tool_def,
+                           arguments=arguments, result=None, error=None)
+
+
+# both reads wait for each other, they fail with BrokenBarrierError unless executed concurrently
+read_barrier = threading.Barrier(2, timeout=5)
+calls: list[str] = []
+
+def read_slow(path: str) -> str:
+    read_barrier.wait()
+    time.sleep(0.1)
+    calls.append(f"read {path}")
+    return f"slow {path}"
+
+def read_fast(path: str) -> str:
+    read_barrier.wait()
+    calls.append(f"read {path}")
+    return f"fast {path}"
+
+def write(path: str) -> str:
+    calls.append(f"write {path}")
+    return f"wrote {path}"
+
+
+class TestParallelToolCalls:
+    @pytest.fixture(autouse=True)
+    def reset_calls(self):
+        calls.clear()
+        read_barrier.reset()
+
+    def process(self, task, tool_call_messages):
+        channel = RecordingChannel()
+        proceed = asyncio.run(task._process_tool_calls(tool_call_messages, channel))
+        return proceed, channel.events
+
+    def test_read_only_calls_run_concurrently_in_order(self):
+        task = StubAgentTask(read_only_tools=(read_slow, read_fast), other_tools=(write,))
+        messages = [tool_call("1", read_slow, '{"path": "a"}'),
+                    tool_call("2", read_fast, '{"path": "b"}'),
+                    tool_call("3", write, '{"path": "c"}')]
+        proceed, events = self.process(task, messages)
+
+        assert proceed
+        # the fast read finished first, its result is still reported after the slow one
+        assert calls == ["read b", "read a", "write c"]
+        assert events == [ToolExecutedEvent(tool_call_id="1", result="slow a"),
+                          ToolExecutedEvent(tool_call_id="2", result="fast b"),
+                          ToolExecutedEvent(tool_call_id="3", result="wrote c")]
+        assert [message.error for message in messages] == [None, None, None]
+
+    def test_one_event_per_call(self):
+        task = StubAgentTask(read_only_tools=(read_slow, read_fast), other_tools=(write,))
+        messages = [tool_call("1", write, '{"path": "a"}'),
+                    tool_call("2", read_slow, '{"path": "b"}'),
+                    tool_call("3", read_fast, '{"path": "c"}'),
+                    tool_call("4", write, '{"path": "d"}'),
+                    tool_call("5", write, '{"path": "e"}')]
+        _, events = self.process(task, messages)
+        assert [event.tool_call_id for event in events] == ["1", "2", "3", "4", "5"]
+        assert all(isinstance(event, ToolExecutedEvent) for event in events)
+
+    @pytest.mark.parametrize("stop_tool", [ask_user, finish_task])
+    def test_calls_after_a_user_response_are_skipped(self, stop_tool):
+        task = StubAgentTask(other_tools=(write, stop_tool))
+        messages = [tool_call("1", write, '{"path": "a"}'),
+                    tool_call("2", stop_tool),
+                    tool_call("3", write, '{"path": "b"}'),
+                    tool_call("4", write, '{"path": "c"}')]
+        proceed, events = self.process(task, messages)
+
+        assert not proceed
+        assert calls == ["write a"]
+        assert events == [ToolExecutedEvent(tool_call_id="1", result="wrote a"),
+                          ToolRequireUserResponseEvent(tool_name=stop_tool.__name__)]
+        assert messages[1].result is None
+        for message in messages[2:]:
+            assert "skipped" in message.result
+
+    @pytest.mark.skipif(not hasattr(AssistantMessage, "get_partial_tool_messages"),
+                        reason="the installed liteai_sdk can not build the tool messages")
+    @pytest.mark.parametrize("parallel_tool_calls, expected", [(True, ["write", "write"]), (False, ["write"])])
+    def test_tool_calls_truncated_without_parallel_calls(self, parallel_tool_calls, expected):
+        assistant_message = AssistantMessage(content="", tool_calls=[
+            {"id": f"call_{i}", "type": "function",
+             "function": {"name": "write", "arguments": f'{{"path": "{i}"}}'}}
+            for i in range(2)
+        ])
+
+        class StubLLM:
+            async def stream_text(self, params):
+                async def stream():
+                    return
+                    yield
+                queue = asyncio.Queue()
+                queue.put_nowait(assistant_message)
+                return stream(), queue
+
+        task = StubAgentTask(llm=StubLLM(), other_tools=(write,), parallel_tool_calls=parallel_tool_calls)
+        tool_call_messages = asyncio.run(task._create_llm_call(RecordingChannel()))
+
+        assert [message.name for message in tool_call_messages] == expected
+        assert len(assistant_message.tool_calls) == len(expected)
+        assert task._messages == [assistant_message, *tool_call_messages]
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from flask import Flask
+from starlette.testclient import TestClient
+from src import asgi
+from src.agent.types import ErrorEvent, MessageEndEvent, MessageStartEvent, TaskDoneEvent
+
+
+class FakeAgentTask:
+    def __init__(self, events):
+        self.events = events
+        self.messages = []
+        self.appended_on_loop = []
+        self.tool_results = {}
+        # logged by the route on errors
+        self._messages = []
+
+    def append_message(self, message):
+        try:
+            asyncio.get_running_loop()
+            self.appended_on_loop.append(True)
+        except RuntimeError:
+            self.appended_on_loop.append(False)
+        self.messages.append(message)
+
+    def set_tool_call_result(self, tool_call_id, result):
+        self.tool_results[tool_call_id] = result
+
+    async def run_async(self):
+        for event in self.events:
+            yield event
+
+
+class FakeTaskPool:
+    def __init__(self, task):
+        self.task = task
+        self.added, self.removed, self.stopped = [], [], []
+
+    def add(self, task_id):
+        self.added.append(task_id)
+        return self.task
+
+    def remove(self, task_id):
+        self.removed.append(task_id)
+
+    def stop(self, task_id):
+        self.stopped.append(task_id)
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    def create(events):
+        pool = FakeTaskPool(FakeAgentTask(events))
+        monkeypatch.setattr(asgi, "task_pool", pool)
+        monkeypatch.setattr("src.routes.task.task_pool", pool)
+        return TestClient(asgi.create_asgi_app(Flask(__name__))), pool
+    return create
+
+
+def sse_events(response) -> list[str]:
+    return [line.removeprefix("event: ") for line in response.text.splitlines() if line.startswith("event: ")]
+
+
+class TestStreamingRoutes:
+    def test_continue_task(self, client_for):
+        client, pool = client_for([MessageStartEvent(), MessageEndEvent(), TaskDoneEvent()])
+        response = client.post("/api/tasks/7/continue",
+                               json={"message": {"role": "user", "content": "Hello"}})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        assert sse_events(response) == ["MESSAGE_START", "MESSAGE_END", "TASK_DONE"]
+        assert pool.added == [7] and pool.removed == [7] and pool.stopped == []
+        assert [message.role for message in pool.task.messages] == ["user"]
+        # the message is tokenized off the event loop
+        assert pool.task.appended_on_loop == [False]
+
+    def test_continue_task_without_message(self, client_for):
+        client, pool = client_for([TaskDoneEvent()])
+        response = client.post("/api/tasks/7/continue", json={})
+        assert sse_events(response) == ["TASK_DONE"]
+        assert pool.task.messages == []
+
+    def test_tool_answer(self, client_for):
+        client, pool = client_for([MessageStartEvent(), TaskDoneEvent()])
+        response = client.post("/api/tasks/3/tool_answer", json={"tool_call_id": "call_1", "answer": "yes"})
+        assert sse_events(response) == ["MESSAGE_START", "TASK_DONE"]
+        assert pool.task.tool_results == {"call_1": "yes"}
+
+    def test_stream_stops_at_error(self, client_for):
+        client, pool = client_for([MessageStartEvent(), ErrorEvent(error=ValueError("boom")), TaskDoneEvent()])
+        response = client.post("/api/tasks/3/continue", json={})
+        assert sse_events(response) == ["MESSAGE_START", "ERROR"]
+        assert '"message": "boom"' in response.text
+        assert pool.removed == [3]
+
+    def test_invalid_body(self, client_for):
+        client, pool = client_for([])
+        response = client.post("/api/tasks/3/tool_answer", json={"answer": "yes"})
+        assert response.status_code == 400
+        assert "validation_error" in response.json()
+        assert pool.added == []
+
+    def test_cors_preflight(self, client_for):
+        client, _ = client_for([])
+        response = client.options("/api/tasks/3/continue", headers={
+            "Origin": "http://localhost:1420", "Access-Control-Request-Method": "POST"})
+        assert response.status_code == 200
+        assert response.headers["access-control-allow-origin"] == "*"
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+from liteai_sdk import TextChunk, UsageChunk
+from src.agent.chunk_coalescer import TextChunkCoalescer
+from src.agent.types import MessageChunkEvent, MessageStartEvent, MessageEndEvent
+from src.utils.event_channel import EventChannel
+
+
+def make_channel(*events):
+    channel = EventChannel()
+    for event in events:
+        channel.put(event)
+    channel.close()
+    return channel
+
+def text(content: str) -> MessageChunkEvent:
+    return MessageChunkEvent(TextChunk(content))
+
+def texts_of(events) -> list[str]:
+    return [e.chunk.content for e in events
+            if isinstance(e, MessageChunkEvent) and isinstance(e.chunk, TextChunk)]
+
+
+class TestTextChunkCoalescer:
+    def test_merges_adjacent_text_chunks(self):
+        coalescer = TextChunkCoalescer(window=1)
+        events = list(coalescer.iter(make_channel(
+            MessageStartEvent(), text("Hel"), text("lo"), text("!"), MessageEndEvent())))
+
+        assert isinstance(events[0], MessageStartEvent)
+        assert texts_of(events) == ["Hello!"]
+        assert isinstance(events[-1], MessageEndEvent)
+        assert coalescer.stats.frames_in == 3
+        assert coalescer.stats.frames_out == 1
+        assert coalescer.stats.frames_saved == 2
+
+    def test_other_chunks_flush_immediately(self):
+        usage = MessageChunkEvent(UsageChunk(input_tokens=1, output_tokens=2, total_tokens=3))
+        coalescer = TextChunkCoalescer(window=1)
+        events = list(coalescer.iter(make_channel(text("a"), text("b"), usage, text("c"))))
+
+        assert texts_of(events[:1]) == ["ab"]
+        assert events[1] is usage
+        assert texts_of(events[2:]) == ["c"]
+
+    def test_flush_when_max_bytes_reached(self):
+        coalescer = TextChunkCoalescer(window=1, max_bytes=4)
+        events = list(coalescer.iter(make_channel(text("ab"), text("cd"), text("ef"))))
+        assert texts_of(events) == ["abcd", "ef"]
+
+    def test_flush_when_window_expires(self):
+        channel = EventChannel()
+        coalescer = TextChunkCoalescer(window=0.01)
+        received = []
+
+        def consume():
+            for event in coalescer.iter(channel):
+                received.append((time.perf_counter(), event))
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        channel.put(text("first"))
+        time.sleep(0.2)
+        assert texts_of(e for _, e in received) == ["first"]
+        channel.put(text("second"))
+        channel.close()
+        consumer.join(timeout=1)
+        assert texts_of(e for _, e in received) == ["first", "second"]
+        assert coalescer.stats.max_delay < 0.2
+
+    def test_disabled_window_passes_through(self):
+        coalescer = TextChunkCoalescer(window=0)
+        events = list(coalescer.iter(make_channel(text("a"), text("b"))))
+        assert texts_of(events) == ["a", "b"]
+
+    def test_iter_async(self):
+        async def consume():
+            coalescer = TextChunkCoalescer(window=1)
+            channel = make_channel(MessageStartEvent(), text("a"), text("b"), MessageEndEvent())
+            return [event async for event in coalescer.iter_async(channel)]
+
+        events = asyncio.run(consume())
+        assert len(events) == 3
+        assert texts_of(events) == ["ab"]
@@ -0,0 +1,115 @@
+import asyncio
+from liteai_sdk import AssistantMessage, SystemMessage, ToolMessage, UserMessage
+from src.agent.context_window import CompactionPolicy, ContextWindowManager
+from src.agent.prompts import HISTORY_SUMMARY_PREFIX
+
+
+class FakeLLM:
+    def __init__(self, summary: str = "summary of the early turns"):
+        self.summary = summary
+        self.requests = []
+
+    async def generate_text(self, params):
+        self.requests.append(params)
+        return [AssistantMessage(content=self.summary)]
+
+def read_file(path: str) -> str:
+    """Read a file"""
+    return path
+
+def make_transcript(step_count: int, result_size: int = 2000) -> list:
+    messages = [UserMessage(content="Read all of the files")]
+    for i in range(step_count):
+        messages.append(AssistantMessage(content=f"Reading file {i}", tool_calls=[{
+            "id": f"call_{i}",
+            "type": "function",
+            "function": {"name": "read_file", "arguments": f'{{"path": "{i}.txt"}}'},
+        }]))
+        messages.append(ToolMessage(tool_call_id=f"call_{i}", name="read_file",
+                                    arguments=f'{{"path": "{i}.txt"}}',
+                                    result=f"content {i} " * (result_size // 10)))
+    return messages
+
+def make_manager(llm, context_size: int, **policy) -> ContextWindowManager:
+    return ContextWindowManager(llm, "gpt-4", context_size, CompactionPolicy(**policy),
+                                fixed_messages=[SystemMessage(content="You are an agent.")],
+                                tools=[read_file])
+
+
+class TestContextWindowManager:
+    def test_no_compaction_under_trigger(self):
+        manager = make_manager(FakeLLM(), 1_000_000)
+        transcript = make_transcript(5)
+        assert asyncio.run(manager.compact(transcript, None)) is None
+
+    def test_elides_old_tool_results_first(self):
+        llm = FakeLLM()
+        transcript = make_transcript(10)
+        full_tokens = make_manager(llm, 1).count_request_tokens(transcript)
+        manager = make_manager(llm, int(full_tokens * 1.5), trigger_ratio=0.6, target_ratio=0.6,
+                               keep_recent_steps=3)
+        history = asyncio.run(manager.compact(transcript, None))
+
+        assert history is not None
+        assert llm.requests == []
+        view = history.apply(transcript)
+        assert len(view) == len(transcript)
+        assert manager.count_request_tokens(view) < full_tokens
+        # the newest steps are kept verbatim
+        assert view[-4:] == transcript[-4:]
+        assert "elided" in view[2].result
+        # the transcript itself is not changed
+        assert "elided" not in transcript[2].result
+
+    def test_summarizes_when_eliding_is_not_enough(self):
+        llm = FakeLLM()
+        transcript = make_transcript(30, result_size=100)
+        full_tokens = make_manager(llm, 1).count_request_tokens(transcript)
+        manager = make_manager(llm, full_tokens, target_ratio=0.4, keep_recent_steps=2, summary_tokens=200)
+        history = asyncio.run(manager.compact(transcript, None))
+
+        assert history is not None
+        assert len(llm.requests) == 1
+        assert history.messages[0].content.startswith(HISTORY_SUMMARY_PREFIX)
+        view = history.apply(transcript)
+        assert view[1:] == transcript[-4:]
+
+    def test_summarizes_once(self):
+        llm = FakeLLM()
+        transcript = make_transcript(30, result_size=100)
+        full_tokens = make_manager(llm, 1).count_request_tokens(transcript)
+        kept_tokens = make_manager(llm, 1).count_request_tokens(transcript[-6:])
+        # leaves room for the three newest steps and the summary, eliding is never enough
+        manager = make_manager(llm, full_tokens, target_ratio=(kept_tokens + 200) / full_tokens,
+                               keep_recent_steps=6, summary_tokens=200)
+        history = asyncio.run(manager.compact(transcript, None))
+
+        assert history is not None
+        assert len(llm.requests) == 1
+        assert history.apply(transcript)[1:] == transcript[-6:]
+
+    def test_summarizes_once_with_the_fewest_steps_if_nothing_fits(self):
+        llm = FakeLLM()
+        transcript = make_transcript(30, result_size=100)
+        full_tokens = make_manager(llm, 1).count_request_tokens(transcript)
+        manager = make_manager(llm, full_tokens, target_ratio=0.01, keep_recent_steps=6)
+        history = asyncio.run(manager.compact(transcript, None))
+
+        assert history is not None
+        assert len(llm.requests) == 1
+        assert history.apply(transcript)[1:] == transcript[-2:]
+
+    def test_compacts_on_top_of_previous_history(self):
+        llm = FakeLLM()
+        transcript = make_transcript(30, result_size=100)
+        full_tokens = make_manager(llm, 1).count_request_tokens(transcript)
+        manager = make_manager(llm, full_tokens, target_ratio=0.4, keep_recent_steps=2)
+        history = asyncio.run(manager.compact(transcript, None))
+        assert history is not None
+
+        transcript.extend(make_transcript(40, result_size=100)[1:])
+        new_history = asyncio.run(manager.compact(transcript, history))
+        assert new_history is not None
+        assert new_history.source_length > history.source_length
+        # the previous summary is part of the new summary request
+        assert HISTORY_SUMMARY_PREFIX.strip() in llm.requests[-1].messages[1].content
@@ -0,0 +1,91 @@
+import os
+from pathlib import Path
+from src.agent.tools.conversion_cache import ConversionCache
+
+
+class CountingConverter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path: Path) -> str:
+        self.calls += 1
+        return f"# {path.name}\n" + path.read_text()
+
+
+class TestConversionCache:
+    def test_hit_after_miss(self, tmp_path):
+        doc = tmp_path / "doc.pdf"
+        doc.write_text("content")
+        cache = ConversionCache(tmp_path / "cache.db")
+        convert = CountingConverter()
+
+        assert cache.get_or_convert(doc, convert) == "# doc.pdf\ncontent"
+        assert cache.get_or_convert(doc, convert) == "# doc.pdf\ncontent"
+        assert convert.calls == 1
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    def test_shared_between_instances(self, tmp_path):
+        doc = tmp_path / "doc.pdf"
+        doc.write_text("content")
+        convert = CountingConverter()
+        ConversionCache(tmp_path / "cache.db").get_or_convert(doc, convert)
+
+        other = ConversionCache(tmp_path / "cache.db")
+        assert other.get_or_convert(doc, convert) == "# doc.pdf\ncontent"
+        assert convert.calls == 1
+        assert other.stats.hits == 1
+
+    def test_changed_file_is_converted_again(self, tmp_path):
+        doc = tmp_path / "doc.pdf"
+        doc.write_text("old")
+        cache = ConversionCache(tmp_path / "cache.db")
+        convert = CountingConverter()
+        cache.get_or_convert(doc, convert)
+
+        doc.write_text("new content")
+        os.utime(doc, ns=(0, doc.stat().st_mtime_ns + 1_000_000))
+        assert cache.get_or_convert(doc, convert) == "# doc.pdf\nnew content"
+        assert convert.calls == 2
+
+    def test_copy_hits_by_content_hash(self, tmp_path):
+        doc = tmp_path / "doc.pdf"
+        doc.write_text("content")
+        copy = tmp_path / "copy.pdf"
+        copy.write_text("content")
+        cache = ConversionCache(tmp_path / "cache.db")
+        convert = CountingConverter()
+
+        cache.get_or_convert(doc, convert)
+        # the text converted from the first file is returned
+        assert cache.get_or_convert(copy, convert) == "# doc.pdf\ncontent"
+        assert convert.calls == 1
+
+    def test_least_recently_used_is_evicted(self, tmp_path):
+        docs = []
+        for i in range(3):
+            doc = tmp_path / f"doc{i}.pdf"
+            doc.write_bytes(os.urandom(2000))
+            docs.append(doc)
+        cache = ConversionCache(tmp_path / "cache.db", max_bytes=5000)
+        convert = lambda path: path.read_bytes().hex()
+
+        cache.get_or_convert(docs[0], convert)
+        cache.get_or_convert(docs[1], convert)
+        cache.get_or_convert(docs[0], convert)
+        cache.get_or_convert(docs[2], convert)
+
+        assert cache.stats.evictions == 1
+        assert cache.usage()[0] == 2
+        hits = cache.stats.hits
+        cache.get_or_convert(docs[0], convert)
+        assert cache.stats.hits == hits + 1
+        cache.get_or_convert(docs[1], convert)
+        assert cache.stats.hits == hits + 1
+
+    def test_namespace_separates_converters(self, tmp_path):
+        doc = tmp_path / "doc.pdf"
+        doc.write_text("content")
+        convert = CountingConverter()
+        ConversionCache(tmp_path / "cache.db", namespace="v1").get_or_convert(doc, convert)
+        ConversionCache(tmp_path / "cache.db", namespace="v2").get_or_convert(doc, convert)
+        assert convert.calls == 2
@@ -0,0 +1,85 @@
+import os
+import time
+import pytest
+from src.utils.document_converter import (
+    ConversionResult, DocumentConverter,
+    DocumentConversionError, DocumentConversionTimeoutError
+)
+
+
+def pid_job(path: str) -> ConversionResult:
+    return ConversionResult(markdown=str(os.getpid()), title=path)
+
+
+def sleep_job(path: str) -> ConversionResult:
+    time.sleep(30)
+    return ConversionResult(markdown="")
+
+
+def failing_job(path: str) -> ConversionResult:
+    raise ValueError("malformed document")
+
+
+def allocating_job(path: str) -> ConversionResult:
+    data = bytearray(512 * 1024 * 1024)
+    time.sleep(5)
+    return ConversionResult(markdown=str(len(data)))
+
+
+@pytest.fixture
+def make_converter():
+    converters = []
+    def factory(**kwargs) -> DocumentConverter:
+        converter = DocumentConverter(warm_up=None, **kwargs)
+        converters.append(converter)
+        return converter
+    yield factory
+    for converter in converters:
+        converter.shutdown()
+
+
+class TestDocumentConverter:
+    def test_convert_with_markitdown(self, tmp_path, make_converter):
+        html = tmp_path / "page.html"
+        html.write_text("<html><body><h1>Title</h1><p>Paragraph</p></body></html>")
+        converter = make_converter()
+        result = converter.convert(html)
+        assert "# Title" in result.markdown
+        assert "Paragraph" in result.markdown
+
+    def test_worker_is_reused_and_recycled(self, tmp_path, make_converter):
+        converter = make_converter(max_workers=1, max_jobs_per_worker=2, job=pid_job)
+        pids = [converter.convert(tmp_path / "doc.pdf").markdown for _ in range(3)]
+        assert pids[0] == pids[1] != pids[2]
+        assert pids[0] != str(os.getpid())
+
+    def test_job_error(self, tmp_path, make_converter):
+        converter = make_converter(job=failing_job)
+        with pytest.raises(DocumentConversionError, match="malformed document"):
+            converter.convert(tmp_path / "doc.pdf")
+
+    def test_timeout_kills_the_worker(self, tmp_path, make_converter):
+        converter = make_converter(max_workers=1, timeout=0.5, job=sleep_job)
+        start = time.monotonic()
+        with pytest.raises(DocumentConversionTimeoutError):
+            converter.convert(tmp_path / "doc.pdf")
+        assert time.monotonic() - start < 5
+        assert converter._idle == []
+
+    def test_cancel_check_aborts_the_job(self, tmp_path, make_converter):
+        converter = make_converter(job=sleep_job)
+        deadline = time.monotonic() + 0.5
+
+        def cancel_check():
+            if time.monotonic() > deadline:
+                raise InterruptedError("cancelled")
+
+        with pytest.raises(InterruptedError):
+            converter.convert(tmp_path / "doc.pdf", cancel_check=cancel_check)
+        assert converter._idle == []
+
+    @pytest.mark.skipif(not os.path.exists("/proc/self/statm"), reason="RSS is measured from /proc")
+    def test_memory_limit(self, tmp_path, make_converter):
+        converter = make_converter(max_rss=256 * 1024 * 1024, job=allocating_job)
+        with pytest.raises(DocumentConversionError, match="memory limit"):
+            converter.convert(tmp_path / "doc.pdf")
@@ -0,0 +1,166 @@
+import pytest
+from pathlib import Path
+from types import SimpleNamespace
+from src.agent.tools.conversion_cache import ConversionCache
+from src.agent.tools.document_index import DocumentIndex, query_tokens, split_passages
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.workspace_index import IndexState, WorkspaceIndex
+
+
+class FakeConverter:
+    def __init__(self):
+        self.converted: list[str] = []
+
+    def convert(self, path, cancel_check=None):
+        self.converted.append(Path(path).name)
+        return SimpleNamespace(markdown="# Roadmap\n\nThe launch of the mobile app is planned for June.\n")
+
+
+class TestTextProcessing:
+    def test_query_tokens(self):
+        assert query_tokens("Release schedule, v2!") == [["release"], ["schedule"], ["v2"]]
+        assert query_tokens("机器学习 notes") == [["机", "器", "学", "习"], ["notes"]]
+        assert query_tokens(" -- ") == []
+
+    def test_split_passages(self):
+        lines = ["a"] * 5 + [""] + ["b"] * 3 + ["", ""]
+        assert split_passages(lines, max_lines=10, max_chars=1000) == [(1, 6), (7, 5)]
+        assert split_passages(["x" * 10] * 4, max_lines=10, max_chars=25) == [(1, 3), (4, 1)]
+        assert split_passages(["", "  "], max_lines=10, max_chars=1000) == []
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    root = tmp_path / "workspace"
+    (root / "notes").mkdir(parents=True)
+    (root / "notes" / "planning.md").write_text(
+        "# Planning\n\nWe met on Monday.\nThe release schedule was moved to April.\n", encoding="utf-8")
+    (root / "notes" / "recipes.md").write_text("Bake the bread for 40 minutes.\n", encoding="utf-8")
+    (root / "notes" / "chinese.txt").write_text("今天讨论了机器学习的课程安排。\n", encoding="utf-8")
+    (root / "report.txt").write_text("Sales grew.\n" * 30 + "The release went well.\n", encoding="utf-8")
+    (root / "roadmap.pdf").write_bytes(b"%PDF-1.4 not really")
+    (root / "image.bin").write_bytes(b"release\0schedule")
+    return root
+
+
+@pytest.fixture
+def indexes(workspace, tmp_path):
+    workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+    workspace_index.build()
+    converter = FakeConverter()
+    document_index = DocumentIndex(workspace_index, tmp_path / "documents.db",
+                                   conversion_cache=ConversionCache(tmp_path / "conversions.db"),
+                                   converter=converter)
+    document_index.update([""])
+    document_index.state = IndexState.READY
+    yield workspace_index, document_index, converter
+    document_index.stop()
+
+
+def search(document_index: DocumentIndex, query: str, relative_root: str = "") -> list[str]:
+    return [hit.path for hit in document_index.search(query_tokens(query), relative_root, 10)]
+
+
+class TestDocumentIndex:
+    def test_ranking(self, indexes):
+        _, document_index, _ = indexes
+        assert search(document_index, "release schedule") == ["notes/planning.md", "report.txt"]
+        hit = document_index.search(query_tokens("release"), "", 10)[-1]
+        assert (hit.path, hit.start_line, hit.line_count) == ("report.txt", 21, 11)
+        assert search(document_index, "bread") == ["notes/recipes.md"]
+        assert search(document_index, "机器学习") == ["notes/chinese.txt"]
+        assert search(document_index, "release", "notes") == ["notes/planning.md"]
+
+    def test_scoped_search_is_filtered_before_the_row_limit(self, indexes):
+        _, document_index, _ = indexes
+        best = document_index.search(query_tokens("release"), "", 10, max_rows=1)
+        assert [hit.path for hit in best] == ["notes/planning.md"]
+        # the only row looked at is the best one of the directory, not of the workspace
+        hits = document_index.search(query_tokens("release"), "report.txt", 10, max_rows=1)
+        assert [hit.path for hit in hits] == ["report.txt"]
+        assert document_index.search(query_tokens("release"), "note", 10) == []
+
+    def test_documents_are_converted(self, indexes):
+        _, document_index, converter = indexes
+        assert converter.converted == ["roadmap.pdf"]
+        assert search(document_index, "mobile launch") == ["roadmap.pdf"]
+
+    def test_follows_the_changes(self, indexes, workspace):
+        workspace_index, document_index, _ = indexes
+        (workspace / "notes" / "recipes.md").write_text("The release party needs bread.\n", encoding="utf-8")
+        (workspace / "notes" / "planning.md").unlink()
+        workspace_index.apply_changes([str(workspace / "notes" / "recipes.md"),
+                                       str(workspace / "notes" / "planning.md")])
+        document_index.update(["notes/recipes.md", "notes/planning.md"])
+        assert search(document_index, "release schedule") == ["notes/recipes.md", "report.txt"]
+        assert document_index.record("notes/planning.md") is None
+
+    def test_persists_across_restarts(self, indexes, tmp_path):
+        workspace_index, _, _ = indexes
+        converter = FakeConverter()
+        reopened = DocumentIndex(workspace_index, tmp_path / "documents.db",
+                                 conversion_cache=ConversionCache(tmp_path / "conversions.db"),
+                                 converter=converter)
+        reopened._load()
+        reopened.update([""])
+        assert converter.converted == []
+        assert search(reopened, "bread") == ["notes/recipes.md"]
+
+    def test_size_limit_disables_the_index(self, indexes, monkeypatch):
+        _, document_index, _ = indexes
+        monkeypatch.setattr(DocumentIndex, "MAX_BYTES", 1024)
+        document_index._records.clear()
+        document_index.update([""])
+        assert document_index.state is IndexState.DISABLED
+        assert search(document_index, "bread") == []
+
+    def test_disabled_index_stops_listening(self, workspace, tmp_path, monkeypatch):
+        monkeypatch.setattr(DocumentIndex, "MAX_BYTES", 16)
+        workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+        workspace_index.build()
+        document_index = DocumentIndex(workspace_index, tmp_path / "documents.db",
+                                       conversion_cache=ConversionCache(tmp_path / "conversions.db"),
+                                       converter=FakeConverter())
+        document_index.start()
+        try:
+            document_index._worker.join(timeout=10)
+            assert document_index.state is IndexState.DISABLED
+            assert workspace_index._listeners == []
+        finally:
+            document_index.stop()
+
+
+class TestSearchDocuments:
+    def test_search_documents(self, workspace, tmp_path):
+        workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+        workspace_index.build()
+        document_index = DocumentIndex(workspace_index, tmp_path / "documents.db",
+                                       conversion_cache=ConversionCache(tmp_path / "conversions.db"),
+                                       converter=FakeConverter())
+        tool = FileSystemTool(str(workspace), workspace_index=workspace_index, document_index=document_index)
+        try:
+            assert tool.search_documents("release schedule").splitlines() == [
+                'Found 2 relevant files for "release schedule" (6 files indexed).',
+                "",
+                "notes/planning.md (lines 1-4)",
+                "4:The release schedule was moved to April.",
+                "",
+                "report.txt (lines 21-31)",
+                "31:The release went well.",
+            ]
+            assert "roadmap.pdf (lines 1-3)\n3:The launch of the mobile app" in tool.search_documents("mobile")
+            assert tool.search_documents("bread", "notes").startswith('Found 1 relevant files for "bread"')
+            assert tool.search_documents("submarine").startswith('No relevant files found for "submarine"')
+            with pytest.raises(ValueError):
+                tool.search_documents("?!")
+        finally:
+            document_index.stop()
+
+    def test_not_available(self, indexes, workspace):
+        _, document_index, _ = indexes
+        assert FileSystemTool(str(workspace)).search_documents("release").startswith(
+            "Document search is not available in this workspace")
+        tool = FileSystemTool(str(workspace / "notes"), workspace_index=document_index.workspace_index,
+                              document_index=document_index)
+        with pytest.raises(ValueError):
+            tool.search_documents("release", "../..")
@@ -0,0 +1,62 @@
+import difflib
+import pytest
+from src.agent.tools.edit_diff import edit_diff
+
+SOURCE = "".join(f"line {i}\n" for i in range(1, 31))
+
+
+def unified_diff(old: str, new: str) -> str:
+    diff = difflib.unified_diff(old.splitlines(), new.splitlines(), fromfile="a/f.txt", tofile="b/f.txt")
+    return "\n".join(diff)
+
+
+def replace(text: str, old: str, new: str) -> str:
+    start = text.index(old)
+    return edit_diff(text, start, start + len(old), new, "f.txt")
+
+
+class TestEditDiff:
+    @pytest.mark.parametrize("old, new", [
+        ("line 15\n", "line fifteen\n"),
+        ("line 1\n", ""),
+        ("line 1", "first line"),
+        ("line 30\n", "line 30\nline 31\n"),
+        ("line 30\n", "line 30"),
+        ("line 3\nline 4\n", "new line\n"),
+        ("line 10\n", "line 10\nline 10.5\n"),
+        ("5\nline 6", "5 and line 6"),
+        ("line 8\n", "changed 8\n" + "".join(f"line {i}\n" for i in range(9, 20)) + "changed 19\n"),
+        ("line 2\n", "line 2\n"),
+    ])
+    def test_matches_difflib(self, old, new):
+        assert replace(SOURCE, old, new) == unified_diff(SOURCE, SOURCE.replace(old, new, 1))
+
+    @pytest.mark.parametrize("text", ["a\r\nb\r\nc\r\nd", "a\fb\x85c d\n", "", "a"])
+    def test_line_breaks(self, text):
+        start = text.find("c") if "c" in text else len(text)
+        new_text = text[:start] + "C\nX" + text[start + 1:]
+        assert edit_diff(text, start, min(start + 1, len(text)), "C\nX", "f.txt") == unified_diff(text, new_text)
+
+    def test_large_file(self):
+        text = "".join(f"line {i}\n" for i in range(1, 50_001))
+        assert replace(text, "line 40000\n", "changed\n").splitlines()[4:] == [
+            "@@ -39997,7 +39997,7 @@", "", " line 39997", " line 39998", " line 39999",
+            "-line 40000", "+changed", " line 40001", " line 40002", " line 40003",
+        ]
+
+    def test_truncated(self):
+        new = "".join(f"new {i}\n" for i in range(100))
+        start = SOURCE.index("line 5\n")
+        diff = edit_diff(SOURCE, start, start + len("line 5\n"), new, "f.txt", max_chars=200)
+        lines = diff.splitlines()
+        assert len(diff) < 400
+        assert lines[-1] == ("[Diff truncated at 200 characters. The edit changed lines 5-104 of the new file, "
+                             "call read_file with offset=5 to see them.]")
+
+    def test_long_lines_are_clipped(self):
+        text = "x" * 5000 + "old" + "y" * 5000 + "\n"
+        start = text.index("old")
+        diff = edit_diff(text, start, start + 3, "new", "f.txt", max_line_chars=100)
+        removed, added = diff.splitlines()[-2:]
+        assert "old" in removed and "new" in added
+        assert len(added) <= 102
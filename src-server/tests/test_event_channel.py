@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.utils.event_channel import EventChannel, ChannelClosedError
+
+
+class TestEventChannel:
+    def test_iterates_until_closed(self):
+        channel = EventChannel()
+        for i in range(3):
+            assert channel.put(i)
+        channel.close()
+        assert list(channel) == [0, 1, 2]
+
+    def test_put_after_close_is_dropped(self):
+        channel = EventChannel()
+        assert channel.close()
+        assert not channel.close()
+        assert not channel.put(1)
+        with pytest.raises(ChannelClosedError):
+            channel.get()
+
+    def test_get_timeout(self):
+        channel = EventChannel()
+        with pytest.raises(TimeoutError):
+            channel.get(timeout=0.01)
+
+    def test_close_wakes_blocked_consumer(self):
+        channel = EventChannel()
+        received = []
+        consumer = threading.Thread(target=lambda: received.extend(channel))
+        consumer.start()
+        time.sleep(0.05)
+        channel.put("chunk")
+        channel.close()
+        consumer.join(timeout=1)
+        assert not consumer.is_alive()
+        assert received == ["chunk"]
+
+    def test_async_consumer_with_threaded_producer(self):
+        channel = EventChannel()
+
+        def produce():
+            for i in range(100):
+                channel.put(i)
+            channel.close()
+
+        async def consume():
+            threading.Thread(target=produce).start()
+            return [item async for item in channel]
+
+        assert asyncio.run(consume()) == list(range(100))
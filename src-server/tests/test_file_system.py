@@ -1,6 +1,11 @@
+import builtins
+import difflib
+import os
 import pytest
 from pathlib import Path
+from src.agent.tools import file_system, file_tracker
 from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.workspace_index import WorkspaceIndex
 
 
 class TestFileSystemToolInit:
@@ -96,6 +101,158 @@ class TestReadFile:
         assert result == "Test content"
 
 
+class TestReadFileRange:
+    @pytest.fixture
+    def numbered_file(self, temp_workspace):
+        content = "\n".join(f"line {i}" for i in range(1, 101)) + "\n"
+        (Path(temp_workspace) / "numbered.txt").write_text(content, encoding="utf-8")
+        return "numbered.txt"
+
+    def test_offset_and_limit(self, temp_workspace, numbered_file):
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file(numbered_file, offset=10, limit=3)
+        content, footer = result.split("\n\n")
+        assert content == "line 10\nline 11\nline 12"
+        assert "showing lines 10-12" in footer
+        assert "offset=13" in footer
+
+    def test_line_numbers_start_at_offset(self, temp_workspace, numbered_file):
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file(numbered_file, enable_line_numbers=True, offset=99, limit=5)
+        assert result == "  99 | line 99\n 100 | line 100"
+
+    def test_max_bytes(self, temp_workspace, numbered_file):
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file(numbered_file, max_bytes=21)
+        content, footer = result.split("\n\n")
+        assert content == "line 1\nline 2\nline 3"
+        assert "limited to 21 bytes" in footer
+        assert "offset=4" in footer
+
+    def test_long_line_is_cut(self, temp_workspace):
+        (Path(temp_workspace) / "long.txt").write_text("x" * 100 + "\nnext", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file("long.txt", max_bytes=10)
+        assert result.startswith("x" * 10 + "\n\n")
+        assert "line 1 is longer than 10 bytes" in result
+        assert tool.read_file("long.txt", offset=2) == "next"
+
+    def test_max_bytes_cannot_exceed_default(self, temp_workspace):
+        (Path(temp_workspace) / "big.txt").write_text("a" * 100, encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        tool.READ_FILE_MAX_BYTES = 50
+        assert "Truncated" in tool.read_file("big.txt", max_bytes=1000)
+
+    def test_offset_beyond_end(self, temp_workspace, numbered_file):
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file(numbered_file, offset=101)
+        assert result == "[No lines at offset 101, the file has fewer lines.]"
+
+    def test_invalid_range(self, temp_workspace, numbered_file):
+        tool = FileSystemTool(temp_workspace)
+        with pytest.raises(ValueError):
+            tool.read_file(numbered_file, offset=0)
+        with pytest.raises(ValueError):
+            tool.read_file(numbered_file, limit=0)
+
+    def test_crlf_line_endings(self, temp_workspace):
+        (Path(temp_workspace) / "crlf.txt").write_bytes(b"a\r\nb\r\nc")
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("crlf.txt") == "a\nb\nc"
+        assert tool.read_file("crlf.txt", offset=2, limit=1).startswith("b\n\n")
+
+    def test_bare_carriage_return_line_endings(self, temp_workspace):
+        (Path(temp_workspace) / "cr.txt").write_bytes(b"a\rb\r\nc\rd\n\re")
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("cr.txt") == "a\nb\nc\nd\n\ne"
+        assert tool.read_file("cr.txt", offset=3, limit=2).startswith("c\nd\n\n")
+        # the line by line reading under a byte limit breaks lines the same way
+        assert tool.read_file("cr.txt", offset=2, max_bytes=5).startswith("b\nc\n\n")
+
+    def test_mixed_line_endings_with_small_chunks(self, temp_workspace, mocker):
+        from src.agent.tools import file_reader
+        mocker.patch.object(file_reader, "SKIP_CHUNK_BYTES", 8)
+        endings = ["\n", "\r\n", "\r"]
+        lines = [f"r{i}" * (i % 3 + 1) for i in range(1, 301)]
+        content = "".join(line + endings[i % 3] for i, line in enumerate(lines))
+        (Path(temp_workspace) / "mixed.txt").write_bytes(content.encode("utf-8"))
+        assert content.splitlines() == lines
+
+        tool = FileSystemTool(temp_workspace)
+        for offset in (250, 2, 299, 100, 300, 101):
+            result = tool.read_file("mixed.txt", offset=offset, limit=1)
+            assert result.split("\n\n")[0] == lines[offset - 1]
+
+        # a "\r\n" across the end of a chunk is one line break
+        (Path(temp_workspace) / "split.txt").write_bytes(b"1234567\r\nb\r\nc\r\n")
+        assert tool.read_file("split.txt", offset=2, limit=1).startswith("b\n\n")
+
+    def test_deep_offset_with_small_chunks(self, temp_workspace, mocker):
+        from src.agent.tools import file_reader
+        mocker.patch.object(file_reader, "SKIP_CHUNK_BYTES", 64)
+        lines = [f"row {i}" * (i % 7 + 1) for i in range(1, 2001)]
+        (Path(temp_workspace) / "rows.txt").write_text("\n".join(lines), encoding="utf-8")
+
+        tool = FileSystemTool(temp_workspace)
+        for offset in (1500, 3, 1999, 700, 2000):
+            result = tool.read_file("rows.txt", offset=offset, limit=1)
+            assert result.split("\n\n")[0] == lines[offset - 1]
+
+    def test_markitdown_range(self, temp_workspace, mocker):
+        (Path(temp_workspace) / "doc.pdf").write_bytes(b"fake pdf content")
+        mock_result = mocker.MagicMock()
+        mock_result.markdown = "# Title\nfirst\nsecond\nthird"
+        tool = FileSystemTool(temp_workspace)
+        tool.md = mocker.MagicMock()
+        tool.md.convert.return_value = mock_result
+
+        result = tool.read_file("doc.pdf", offset=2, limit=2)
+        assert result.startswith("first\nsecond\n\n")
+        assert "offset=4" in result
+
+
+class TestReadFileEncoding:
+    def test_binary_file_summary(self, temp_workspace):
+        png = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + bytes(range(256)) * 4
+        (Path(temp_workspace) / "image.png").write_bytes(png)
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file("image.png")
+        assert result.startswith("[Binary file: image.png]")
+        assert "Type: PNG image" in result
+        assert f"({len(png)} bytes)" in result
+
+    def test_nul_bytes_are_binary(self, temp_workspace):
+        (Path(temp_workspace) / "data.bin").write_bytes(b"abc\x00def" * 100)
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file("data.bin")
+        assert result.startswith("[Binary file: data.bin]")
+        assert "abc" not in result
+
+    def test_utf8_bom_is_stripped(self, temp_workspace):
+        (Path(temp_workspace) / "bom.txt").write_bytes(b"\xef\xbb\xbffirst\nsecond\n")
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("bom.txt", enable_line_numbers=True) == "   1 | first\n   2 | second"
+
+    def test_utf16_file(self, temp_workspace):
+        (Path(temp_workspace) / "wide.txt").write_text("你好\r\nworld\n", encoding="utf-16")
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("wide.txt") == "你好\nworld"
+        assert tool.read_file("wide.txt", offset=2) == "world"
+
+    def test_legacy_encoding_fallback(self, temp_workspace):
+        text = "这是一个使用旧编码保存的中文文本文件，用于测试编码检测。\n第二行内容也是中文。\n"
+        (Path(temp_workspace) / "gbk.txt").write_bytes(text.encode("gbk"))
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("gbk.txt") == text.rstrip("\n")
+
+    def test_invalid_bytes_after_sample_are_replaced(self, temp_workspace, mocker):
+        from src.agent.tools import file_sniffer
+        mocker.patch.object(file_sniffer, "SNIFF_BYTES", 16)
+        (Path(temp_workspace) / "mixed.txt").write_bytes(b"plain ascii text\nbroken \xff byte\n")
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("mixed.txt") == "plain ascii text\nbroken � byte"
+
+
 class TestReadFileBatch:
     def test_read_single_file(self, temp_workspace, sample_text_file):
         filename, content = sample_text_file
@@ -134,6 +291,45 @@ class TestReadFileBatch:
         # Check line number format
         assert "   1 |" in result
 
+    def test_read_batch_keeps_order(self, temp_workspace):
+        filenames = [f"file{i:02d}.txt" for i in range(30)]
+        for filename in filenames:
+            (Path(temp_workspace) / filename).write_text(f"content of {filename}", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file_batch(filenames)
+
+        positions = [result.index(f'<file_content path="{filename}">') for filename in filenames]
+        assert positions == sorted(positions)
+        assert result.count("</file_content>") == 30
+
+    def test_read_batch_byte_budget(self, temp_workspace, monkeypatch):
+        monkeypatch.setattr(FileSystemTool, "READ_BATCH_MAX_BYTES", 300)
+        for name in ("a.txt", "b.txt", "c.txt"):
+            (Path(temp_workspace) / name).write_text("\n".join(f"{name} {i}" for i in range(30)), encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        result = tool.read_file_batch(["a.txt", "b.txt", "c.txt"])
+
+        a_content, b_content, c_content = result.split("</file_content>")[:3]
+        assert "a.txt 29" in a_content
+        assert "b.txt 0" in b_content
+        assert "Call read_file with offset=" in b_content
+        assert "[Skipped: the output limit of this batch (300 bytes) was reached" in c_content
+
+    def test_read_batch_reads_each_file_once_within_its_budget(self, temp_workspace, monkeypatch, mocker):
+        monkeypatch.setattr(FileSystemTool, "READ_BATCH_MAX_BYTES", 300)
+        (Path(temp_workspace) / "a.txt").write_text("a" * 199 + "\n", encoding="utf-8")
+        (Path(temp_workspace) / "b.txt").write_text("b\n" * 500, encoding="utf-8")
+        (Path(temp_workspace) / "c.txt").write_text("c", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        spy = mocker.spy(tool, "read_file")
+        result = tool.read_file_batch(["missing.txt", "a.txt", "b.txt", "c.txt"])
+
+        assert sorted((call.args[0], call.kwargs["max_bytes"]) for call in spy.call_args_list) == [
+            ("a.txt", 200), ("b.txt", 100), ("missing.txt", 0)]
+        assert "Error: File not found at missing.txt" in result
+        assert "offset=51" in result
+        assert "[Skipped: the output limit of this batch (300 bytes) was reached" in result.split("</file_content>")[3]
+
 
 class TestListDirectory:
     def test_list_directory_non_recursive(self, temp_workspace, nested_directory):
@@ -192,12 +388,227 @@ class TestListDirectory:
         tool = FileSystemTool(temp_workspace)
 
         # Use mocker.patch instead of unittest.mock.patch
-        mock_iterdir = mocker.patch("pathlib.Path.iterdir")
-        mock_iterdir.side_effect = PermissionError()
+        mock_scandir = mocker.patch("os.scandir")
+        mock_scandir.side_effect = PermissionError()
 
         result = tool.list_directory(".")
         assert "Error: Permission denied" in result
 
+    def test_max_entries_lists_upper_levels_first(self, temp_workspace):
+        base = Path(temp_workspace)
+        for name in ("a", "b", "c"):
+            (base / name).mkdir()
+            for i in range(10):
+                (base / name / f"{name}{i}.txt").write_text("", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        result = tool.list_directory(".", recursive=True, max_entries=15)
+
+        lines = result.splitlines()
+        assert "1 [dir] a" in lines
+        assert "3 [dir] c" in lines
+        assert "  1.10 [file] a9.txt" in lines
+        assert "  2.2 [file] b1.txt" in lines
+        assert "b2.txt" not in result
+        assert "  ... (8 more entries not listed)" in lines
+        assert lines[-1].startswith("[Truncated: 15 entries listed")
+
+    def test_max_entries_is_capped(self, temp_workspace, monkeypatch):
+        monkeypatch.setattr(FileSystemTool, "LIST_DIRECTORY_MAX_ENTRIES", 3)
+        for i in range(5):
+            (Path(temp_workspace) / f"file{i}.txt").write_text("", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        result = tool.list_directory(".", max_entries=100)
+        assert "3 [file] file2.txt" in result
+        assert "file3.txt" not in result
+        assert "... (2 more entries not listed)" in result
+
+    def test_ignored_paths(self, temp_workspace):
+        base = Path(temp_workspace)
+        (base / ".gitignore").write_text("*.log\n", encoding="utf-8")
+        (base / "node_modules" / "pkg").mkdir(parents=True)
+        (base / "src").mkdir()
+        (base / "src" / "main.py").write_text("", encoding="utf-8")
+        (base / "src" / "debug.log").write_text("", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+
+        result = tool.list_directory(".", recursive=True)
+        assert "[dir] node_modules (ignored)" in result
+        assert "pkg" not in result
+        assert "main.py" in result
+        assert "debug.log" not in result
+        # the rules of the workspace apply when listing a subdirectory
+        assert "debug.log" not in tool.list_directory("src")
+
+        result = tool.list_directory(".", recursive=True, include_ignored=True)
+        assert "[dir] node_modules\n" in result
+        assert "pkg" in result
+        assert "debug.log" in result
+
+    def test_symlinked_directory_is_not_descended(self, temp_workspace, nested_directory):
+        (Path(temp_workspace) / "loop").symlink_to(temp_workspace, target_is_directory=True)
+        tool = FileSystemTool(temp_workspace)
+        result = tool.list_directory(".", recursive=True)
+        assert f"[symlink -> {temp_workspace}] loop" in result
+        assert result.count("file4.txt") == 1
+
+
+class TestSearchFiles:
+    @pytest.fixture
+    def source_tree(self, temp_workspace):
+        base = Path(temp_workspace)
+        (base / "src").mkdir()
+        (base / "src" / "app.py").write_text(
+            "import os\n\ndef handle(request):\n    return request\n\nhandle(None)\n", encoding="utf-8")
+        (base / "src" / "util.js").write_text("function handle() {}\n", encoding="utf-8")
+        (base / "README.md").write_text("Call HANDLE(x) first.\n", encoding="utf-8")
+        (base / "node_modules").mkdir()
+        (base / "node_modules" / "lib.js").write_text("handle\n", encoding="utf-8")
+        (base / "data.bin").write_bytes(b"handle\0\1\2")
+        return temp_workspace
+
+    def test_regex_search(self, source_tree):
+        tool = FileSystemTool(source_tree)
+        result = tool.search_files(r"handle\(")
+        assert result.splitlines() == [
+            "Found 3 matching lines in 2 files (4 files searched).",
+            "",
+            "src/app.py",
+            "3:def handle(request):",
+            "6:handle(None)",
+            "",
+            "src/util.js",
+            "1:function handle() {}",
+        ]
+
+    def test_literal_and_case_insensitive(self, source_tree):
+        tool = FileSystemTool(source_tree)
+        assert "No matches found" in tool.search_files("handle(x)", literal=True)
+        result = tool.search_files("handle(x)", literal=True, case_sensitive=False)
+        assert "README.md\n1:Call HANDLE(x) first." in result
+
+    def test_include_and_exclude(self, source_tree):
+        tool = FileSystemTool(source_tree)
+        result = tool.search_files("handle", include=["*.py"])
+        assert "src/app.py" in result and "util.js" not in result
+        result = tool.search_files("handle", exclude=["src/*.py"], case_sensitive=False)
+        assert "src/app.py" not in result and "src/util.js" in result and "README.md" in result
+
+    def test_context_lines(self, source_tree):
+        tool = FileSystemTool(source_tree)
+        result = tool.search_files("^import|^handle", "src", context_lines=1)
+        assert result.splitlines()[2:] == [
+            "src/app.py",
+            "1:import os",
+            "2-",
+            "--",
+            "5-",
+            "6:handle(None)",
+        ]
+
+    def test_skips_binary_and_ignored_files(self, source_tree):
+        tool = FileSystemTool(source_tree)
+        result = tool.search_files("handle")
+        assert "data.bin" not in result
+        assert "node_modules" not in result
+        assert "node_modules/lib.js" in tool.search_files("handle", include_ignored=True)
+
+    def test_max_matches(self, temp_workspace):
+        (Path(temp_workspace) / "a.txt").write_text("match\n" * 5, encoding="utf-8")
+        (Path(temp_workspace) / "b.txt").write_text("match\n", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        result = tool.search_files("match", max_matches=3, context_lines=1)
+        assert "1:match\n2:match\n3:match\n4-match\n" in result
+        assert "b.txt" not in result
+        assert "[Stopped after 3 matching lines." in result
+        # exactly the limit is not truncated
+        assert "[Stopped" not in tool.search_files("match", "a.txt", max_matches=5)
+
+    def test_invalid_regex(self, source_tree):
+        tool = FileSystemTool(source_tree)
+        with pytest.raises(ValueError):
+            tool.search_files("handle(")
+
+    def test_parallel_search_keeps_order(self, temp_workspace, monkeypatch):
+        for i in range(40):
+            (Path(temp_workspace) / f"file{i:02d}.txt").write_text(f"line\nneedle {i}\n", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        sequential = tool.search_files("needle")
+        monkeypatch.setattr(FileSystemTool, "SEARCH_WORKERS", 2)
+        monkeypatch.setattr(FileSystemTool, "SEARCH_PARALLEL_MIN_BYTES", 0)
+        assert tool.search_files("needle") == sequential
+        result = tool.search_files("needle", max_matches=5)
+        assert "file04.txt" in result and "file05.txt" not in result
+
+
+class TestFindFiles:
+    @pytest.fixture
+    def project(self, temp_workspace):
+        base = Path(temp_workspace)
+        for path in ("src/agent/tools/file_system.py", "src/agent/task.py", "src/app.py",
+                     "tests/test_file_system.py", "pyproject.toml", "docs/FileSystem.md", "node_modules/fs/index.js"):
+            (base / path).parent.mkdir(parents=True, exist_ok=True)
+            (base / path).write_text("", encoding="utf-8")
+        return temp_workspace
+
+    def test_fuzzy_ranking(self, project):
+        tool = FileSystemTool(project)
+        assert tool.find_files("file_system").splitlines() == [
+            'Found 2 files matching "file_system" (6 files searched).',
+            "src/agent/tools/file_system.py",
+            "tests/test_file_system.py",
+        ]
+        assert tool.find_files("filesystem").splitlines()[1] == "docs/FileSystem.md"
+        # the most compact matches first
+        assert tool.find_files("fsys").splitlines()[1:] == [
+            "docs/FileSystem.md", "tests/test_file_system.py", "src/agent/tools/file_system.py"]
+        # a pattern with a slash is matched against the whole path
+        assert tool.find_files("agent/task").splitlines()[1] == "src/agent/task.py"
+
+    def test_glob(self, project):
+        tool = FileSystemTool(project)
+        assert tool.find_files("*.py").splitlines()[1:] == [
+            "src/app.py", "tests/test_file_system.py", "src/agent/task.py", "src/agent/tools/file_system.py"]
+        assert tool.find_files("src/*.py").splitlines()[1:] == ["src/app.py"]
+        assert tool.find_files("*.PY", "src/agent").splitlines()[1:] == [
+            "src/agent/task.py", "src/agent/tools/file_system.py"]
+
+    def test_max_results_and_no_match(self, project):
+        tool = FileSystemTool(project)
+        result = tool.find_files("*", max_results=2)
+        assert len(result.splitlines()) == 4
+        assert result.endswith("[Showing the best 2 of 6 matches. Use a more specific pattern or path to see the others.]")
+        assert tool.find_files("missing") == 'No files matching "missing" found in 6 files.'
+        assert "node_modules" not in tool.find_files("index")
+
+    def test_invalid_arguments(self, project):
+        tool = FileSystemTool(project)
+        with pytest.raises(ValueError):
+            tool.find_files("  ")
+        with pytest.raises(FileNotFoundError):
+            tool.find_files("app", "missing")
+        with pytest.raises(NotADirectoryError):
+            tool.find_files("app", "pyproject.toml")
+
+    def test_cache_follows_the_disk(self, project):
+        tool = FileSystemTool(project)
+        assert "No files" in tool.find_files("handlers")
+        (Path(project) / "src" / "agent" / "handlers.py").write_text("", encoding="utf-8")
+        assert "src/agent/handlers.py" in tool.find_files("handlers")
+        (Path(project) / ".gitignore").write_text("handlers.py\n", encoding="utf-8")
+        assert "No files" in tool.find_files("handlers")
+
+    def test_with_the_workspace_index(self, project):
+        index = WorkspaceIndex(project, Path(project).parent / "index.db")
+        index.build()
+        tool = FileSystemTool(project, workspace_index=index)
+        assert tool.find_files("task", "src").splitlines()[1] == "src/agent/task.py"
+        new_file = Path(project) / "src" / "agent" / "tools" / "task_runner.py"
+        new_file.write_text("", encoding="utf-8")
+        # only the index is looked at, the list is reloaded when it changes
+        assert "task_runner" not in tool.find_files("task")
+        index.apply_changes([str(new_file)])
+        assert "src/agent/tools/task_runner.py" in tool.find_files("task")
+
 
 class TestEdgeCases:
     def test_unicode_filename(self, temp_workspace):
@@ -358,6 +769,32 @@ class TestEditFile:
         assert "Modified second line" in new_content
         assert "Second line" not in new_content
     
+    def test_edit_file_diff_format(self, temp_workspace, file_with_content):
+        filename, original_content = file_with_content
+        tool = FileSystemTool(temp_workspace)
+
+        result = tool.edit_file(filename, "Second line", "Modified second line")
+        expected = difflib.unified_diff(original_content.splitlines(),
+                                        original_content.replace("Second line", "Modified second line").splitlines(),
+                                        fromfile=f"a/{filename}", tofile=f"b/{filename}")
+        assert result == "\n".join(expected)
+
+    def test_edit_file_failed_write_keeps_the_file(self, temp_workspace, file_with_content, mocker):
+        filename, original_content = file_with_content
+        tool = FileSystemTool(temp_workspace)
+        mocker.patch("src.agent.tools.file_system.check_cancelled", side_effect=RuntimeError("cancelled"))
+
+        with pytest.raises(RuntimeError):
+            tool.edit_file(filename, "Second line", "Modified second line")
+        assert (Path(temp_workspace) / filename).read_text(encoding="utf-8") == original_content
+        assert os.listdir(temp_workspace) == [filename]
+
+    def test_edit_file_overlapping_match_is_unique(self, temp_workspace):
+        (Path(temp_workspace) / "a.txt").write_text("xaaax", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        tool.edit_file("a.txt", "aa", "b")
+        assert (Path(temp_workspace) / "a.txt").read_text(encoding="utf-8") == "xbax"
+
     def test_edit_file_multiple_lines(self, temp_workspace, file_with_content):
         filename, _ = file_with_content
         tool = FileSystemTool(temp_workspace)
@@ -447,6 +884,93 @@ class TestEditFile:
         assert "Modified line" in file_path.read_text(encoding="utf-8")
 
 
+class TestStaleFiles:
+    def test_write_file_changed_since_read_raises_error(self, temp_workspace, sample_text_file):
+        filename, _ = sample_text_file
+        tool = FileSystemTool(temp_workspace)
+        tool.read_file(filename)
+        (Path(temp_workspace) / filename).write_text("Changed by someone else, longer", encoding="utf-8")
+
+        with pytest.raises(PermissionError) as exc_info:
+            tool.write_file(filename, "New content")
+        assert "changed on disk since it was last read" in str(exc_info.value)
+        tool.read_file(filename)
+        assert tool.write_file(filename, "New content") == "File written successfully."
+
+    def test_touched_file_is_unchanged(self, temp_workspace):
+        file_path = Path(temp_workspace) / "touched.txt"
+        tool = FileSystemTool(temp_workspace)
+        tool.write_file("touched.txt", "Content")
+        stat = file_path.stat()
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert tool.write_file("touched.txt", "New content") == "File written successfully."
+
+    def test_read_does_not_hash_the_file(self, temp_workspace, sample_text_file, mocker):
+        filename, _ = sample_text_file
+        file_path = Path(temp_workspace) / filename
+        tool = FileSystemTool(temp_workspace)
+        spy = mocker.spy(file_tracker, "_digest_file")
+        tool.read_file(filename)
+        assert spy.call_count == 0
+        # only the stat is known, a touched file must be read again
+        stat = file_path.stat()
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with pytest.raises(PermissionError):
+            tool.write_file(filename, "New content")
+        tool.read_file(filename)
+        assert tool.write_file(filename, "New content") == "File written successfully."
+
+    def test_change_during_read_is_detected(self, temp_workspace, mocker):
+        file_path = Path(temp_workspace) / "racy.txt"
+        file_path.write_text("before", encoding="utf-8")
+        read_text_lines = file_system.read_text_lines
+
+        def read_then_change(*args, **kwargs):
+            text_slice = read_text_lines(*args, **kwargs)
+            file_path.write_text("changed after the read", encoding="utf-8")
+            return text_slice
+
+        mocker.patch.object(file_system, "read_text_lines", side_effect=read_then_change)
+        tool = FileSystemTool(temp_workspace)
+        assert tool.read_file("racy.txt") == "before"
+        with pytest.raises(PermissionError):
+            tool.write_file("racy.txt", "New content")
+
+    def test_same_size_change_is_detected(self, temp_workspace):
+        file_path = Path(temp_workspace) / "same.txt"
+        file_path.write_text("aaaa", encoding="utf-8")
+        tool = FileSystemTool(temp_workspace)
+        tool.read_file("same.txt")
+        file_path.write_text("bbbb", encoding="utf-8")
+        stat = file_path.stat()
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with pytest.raises(PermissionError):
+            tool.write_file("same.txt", "cccc")
+
+    def test_written_file_can_be_overwritten(self, temp_workspace):
+        tool = FileSystemTool(temp_workspace)
+        tool.write_file("new.txt", "first")
+        assert tool.write_file("new.txt", "second") == "File written successfully."
+
+    def test_consecutive_edits_use_the_written_text(self, temp_workspace, file_with_content, mocker):
+        filename, _ = file_with_content
+        tool = FileSystemTool(temp_workspace)
+        tool.edit_file(filename, "Second line", "Line 2")
+        spy = mocker.spy(builtins, "open")
+        tool.edit_file(filename, "Third line", "Line 3")
+        assert not any(call.args[0] == Path(temp_workspace) / filename for call in spy.call_args_list)
+        assert (Path(temp_workspace) / filename).read_text(encoding="utf-8") == "Original content\nLine 2\nLine 3"
+
+    def test_edit_rereads_a_file_changed_on_disk(self, temp_workspace, file_with_content):
+        filename, _ = file_with_content
+        file_path = Path(temp_workspace) / filename
+        tool = FileSystemTool(temp_workspace)
+        tool.edit_file(filename, "Second line", "Line 2")
+        file_path.write_text("Original content\nLine 2\nThird line changed outside", encoding="utf-8")
+        tool.edit_file(filename, "Line 2", "Line two")
+        assert file_path.read_text(encoding="utf-8") == "Original content\nLine two\nThird line changed outside"
+
+
 class TestDelete:
     def test_delete_file(self, temp_workspace, sample_text_file):
         filename, _ = sample_text_file
@@ -485,13 +1009,13 @@ class TestDelete:
         # Read file (add to read_set)
         tool.read_file(filename)
         abs_path = str(Path(temp_workspace) / filename)
-        assert abs_path in tool._read_file_set
+        assert abs_path in tool._read_files
 
         # Delete file
         tool.delete(filename)
 
         # Verify removed from read_set
-        assert abs_path not in tool._read_file_set
+        assert abs_path not in tool._read_files
 
     def test_delete_unread_file_does_not_affect_read_set(self, temp_workspace):
         tool = FileSystemTool(temp_workspace)
@@ -754,7 +1278,7 @@ class TestIntegration:
 
         # Verify file in read_set
         abs_path1 = str(file1_path)
-        assert abs_path1 in tool._read_file_set
+        assert abs_path1 in tool._read_files
 
         # Copy file
         tool.copy(filename1, "file2.txt")
@@ -762,14 +1286,14 @@ class TestIntegration:
         # Read copied file
         tool.read_file("file2.txt")
         abs_path2 = str(Path(temp_workspace) / "file2.txt")
-        assert abs_path2 in tool._read_file_set
+        assert abs_path2 in tool._read_files
 
         # Delete original file
         tool.delete(filename1)
-        assert abs_path1 not in tool._read_file_set
+        assert abs_path1 not in tool._read_files
 
         # Verify copied file still in read_set
-        assert abs_path2 in tool._read_file_set
+        assert abs_path2 in tool._read_files
 
         # Overwrite copied file (should be allowed)
         tool.write_file("file2.txt", "New content")
@@ -0,0 +1,67 @@
+import os
+import stat
+import pytest
+from pathlib import Path
+from src.agent.tools.file_writer import FsyncPolicy, encode_text, write_atomic
+
+
+def test_encode_text():
+    text = "ab\ncd中文\n"
+    expected = text.replace("\n", os.linesep).encode("utf-8")
+    assert b"".join(encode_text(text, chunk_chars=3)) == expected
+    assert b"".join(encode_text(text, 3, 5, chunk_chars=1)) == "cd".encode("utf-8")
+    assert list(encode_text("")) == []
+
+
+@pytest.fixture
+def directory(tmp_path):
+    directory = tmp_path / "files"
+    directory.mkdir()
+    return directory
+
+
+class TestWriteAtomic:
+    @pytest.mark.parametrize("fsync", list(FsyncPolicy))
+    def test_replaces_the_file(self, directory, fsync):
+        path = directory / "a.txt"
+        path.write_bytes(b"old content")
+        assert write_atomic(path, [b"new ", b"content"], fsync) == 11
+        assert path.read_bytes() == b"new content"
+        assert os.listdir(directory) == ["a.txt"]
+
+    @pytest.mark.skipif(os.name == "nt", reason="POSIX permissions")
+    def test_keeps_the_mode(self, directory):
+        path = directory / "script.sh"
+        path.write_bytes(b"#!/bin/sh\n")
+        path.chmod(0o750)
+        write_atomic(path, [b"#!/bin/sh\necho hi\n"])
+        assert stat.S_IMODE(path.stat().st_mode) == 0o750
+
+        new_path = directory / "new.txt"
+        write_atomic(new_path, [b"x"])
+        umask = os.umask(0)
+        os.umask(umask)
+        assert stat.S_IMODE(new_path.stat().st_mode) == 0o666 & ~umask
+
+    @pytest.mark.skipif(os.name == "nt", reason="symlinks need privileges on Windows")
+    def test_keeps_symlinks(self, directory):
+        target = directory / "target.txt"
+        target.write_bytes(b"old")
+        link = directory / "link.txt"
+        link.symlink_to(target)
+        write_atomic(link, [b"new"])
+        assert link.is_symlink()
+        assert target.read_bytes() == b"new"
+
+    def test_failed_write_keeps_the_old_content(self, directory):
+        path = directory / "a.txt"
+        path.write_bytes(b"old content")
+
+        def chunks():
+            yield b"partial"
+            raise RuntimeError("cancelled")
+
+        with pytest.raises(RuntimeError):
+            write_atomic(path, chunks())
+        assert path.read_bytes() == b"old content"
+        assert os.listdir(directory) == ["a.txt"]
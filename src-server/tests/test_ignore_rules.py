@@ -0,0 +1,87 @@
+import os
+import pytest
+from pathlib import Path
+from src.agent.tools.ignore_rules import IgnoreRules, RuleSet
+
+
+class TestRuleSet:
+    @pytest.mark.parametrize("pattern,path,is_dir,expected", [
+        ("*.log", "a.log", False, True),
+        ("*.log", "deep/dir/a.log", False, True),
+        ("*.log", "a.log.txt", False, None),
+        ("build/", "build", True, True),
+        ("build/", "build", False, None),
+        ("build/", "src/build", True, True),
+        ("/build", "src/build", True, None),
+        ("/build", "build", False, True),
+        ("doc/*.md", "doc/a.md", False, True),
+        ("doc/*.md", "doc/sub/a.md", False, None),
+        ("doc/*.md", "x/doc/a.md", False, None),
+        ("**/logs", "a/b/logs", True, True),
+        ("**/logs/*.txt", "logs/a.txt", False, True),
+        ("a/**/b", "a/b", True, True),
+        ("a/**/b", "a/x/y/b", True, True),
+        ("a/**", "a/x/y", False, True),
+        ("file?.txt", "file1.txt", False, True),
+        ("file?.txt", "file10.txt", False, None),
+        ("[ab].txt", "a.txt", False, True),
+        ("[!ab].txt", "a.txt", False, None),
+        ("[!ab].txt", "c.txt", False, True),
+        ("\\#hash", "#hash", False, True),
+        ("# comment", "# comment", False, None),
+        ("trailing   ", "trailing", False, True),
+    ])
+    def test_pattern(self, pattern, path, is_dir, expected):
+        assert RuleSet([pattern]).match(path, is_dir) == expected
+
+    def test_last_matching_rule_wins(self):
+        rules = RuleSet(["*.log", "!keep.log", "keep.log.d/"])
+        assert rules.match("a.log", False) is True
+        assert rules.match("keep.log", False) is False
+        assert RuleSet(["!keep.log", "*.log"]).match("keep.log", False) is True
+
+
+class TestIgnoreRules:
+    def test_defaults(self, tmp_path):
+        rules = IgnoreRules(str(tmp_path))
+        assert rules.is_ignored("node_modules", True)
+        assert rules.is_ignored("pkg/__pycache__/mod.cpython-311.pyc", False)
+        assert rules.is_ignored(".git/config", False)
+        assert not rules.is_ignored("src/main.py", False)
+        # dir-only pattern
+        assert not rules.is_ignored("build", False)
+
+    def test_nested_gitignore(self, tmp_path):
+        (tmp_path / ".gitignore").write_text("*.tmp\n/out/\n")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / ".gitignore").write_text("!important.tmp\nlocal/\n")
+        rules = IgnoreRules(str(tmp_path))
+
+        assert rules.is_ignored("a.tmp", False)
+        assert rules.is_ignored("sub/a.tmp", False)
+        assert not rules.is_ignored("sub/important.tmp", False)
+        assert rules.is_ignored("important.tmp", False)
+        assert rules.is_ignored("out/file.txt", False)
+        assert not rules.is_ignored("sub/out/file.txt", False)
+        assert rules.is_ignored("sub/local/x.py", False)
+        assert not rules.is_ignored("local/x.py", False)
+
+    def test_gitignore_can_reinclude_defaults(self, tmp_path):
+        (tmp_path / ".gitignore").write_text("!build/\n")
+        assert not IgnoreRules(str(tmp_path)).is_ignored("build/main.o", False)
+
+    def test_changed_gitignore_is_reloaded(self, tmp_path):
+        gitignore = tmp_path / ".gitignore"
+        gitignore.write_text("*.tmp\n")
+        assert IgnoreRules(str(tmp_path)).is_ignored("a.tmp", False)
+
+        gitignore.write_text("*.bak\n")
+        os.utime(gitignore, ns=(0, gitignore.stat().st_mtime_ns + 1_000_000))
+        rules = IgnoreRules(str(tmp_path))
+        assert not rules.is_ignored("a.tmp", False)
+        assert rules.is_ignored("a.bak", False)
+
+    def test_custom_default_patterns(self, tmp_path):
+        rules = IgnoreRules(str(tmp_path), default_patterns=("*.secret",))
+        assert rules.is_ignored("key.secret", False)
+        assert not rules.is_ignored("node_modules", True)
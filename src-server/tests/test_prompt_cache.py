@@ -0,0 +1,59 @@
+from dataclasses import asdict
+from liteai_sdk import AssistantMessage, LlmProviders, UsageChunk
+from litellm.types.utils import Usage as LiteLlmUsage
+from src.agent.prompt_cache import (
+    cache_breakpoint_args, complete_usage, get_cached_tokens
+)
+
+
+class TestCacheBreakpointArgs:
+    def test_breakpoint_providers(self):
+        args = cache_breakpoint_args(LlmProviders.ANTHROPIC)
+        assert args is not None
+        points = args["cache_control_injection_points"]
+        assert {"location": "message", "role": "system"} in points
+        assert {"location": "message", "index": -1} in points
+
+    def test_automatic_prefix_cache_providers(self):
+        assert cache_breakpoint_args(LlmProviders.OPENAI) is None
+        assert cache_breakpoint_args(LlmProviders.DEEPSEEK) is None
+
+
+class TestGetCachedTokens:
+    def test_openai_style(self):
+        usage = {"prompt_tokens": 100, "prompt_tokens_details": {"cached_tokens": 80}}
+        assert get_cached_tokens(usage) == 80
+
+    def test_anthropic_style(self):
+        usage = {"prompt_tokens": 100, "cache_read_input_tokens": 64}
+        assert get_cached_tokens(usage) == 64
+
+    def test_litellm_usage(self):
+        usage = LiteLlmUsage(prompt_tokens=100, completion_tokens=5, total_tokens=105,
+                             prompt_tokens_details={"cached_tokens": 90})
+        assert get_cached_tokens(usage) == 90
+
+    def test_missing(self):
+        assert get_cached_tokens(None) == 0
+        assert get_cached_tokens({"prompt_tokens": 100}) == 0
+
+
+class TestCompleteUsage:
+    def test_fills_message_usage(self):
+        message = AssistantMessage(content="hi")
+        chunk = complete_usage(UsageChunk(100, 5, 105), message)
+        assert asdict(chunk) == {
+            "input_tokens": 100,
+            "output_tokens": 5,
+            "total_tokens": 105,
+            "cached_tokens": 0,
+        }
+        assert message.usage is not None
+        assert message.usage.prompt_tokens == 100
+
+    def test_reads_cached_tokens_from_message_usage(self):
+        message = AssistantMessage(content="hi")
+        message.usage = LiteLlmUsage(prompt_tokens=100, completion_tokens=5, total_tokens=105,
+                                     prompt_tokens_details={"cached_tokens": 96})
+        chunk = complete_usage(UsageChunk(100, 5, 105), message)
+        assert chunk.cached_tokens == 96
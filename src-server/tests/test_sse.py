@@ -0,0 +1,63 @@
+import json
+import pytest
+from src.utils import sse
+from src.utils.sse import encode_sse, format_sse, SseObjectTemplate
+
+
+def legacy_format_sse(data, event=None, event_id=None, retry=None) -> str:
+    """The original implementation, kept as the reference output"""
+    buffer = []
+    if event_id is not None:
+        buffer.append(f"id: {event_id}")
+    if event is not None:
+        buffer.append(f"event: {event}")
+    if retry is not None:
+        buffer.append(f"retry: {retry}")
+    if not isinstance(data, str):
+        payload = json.dumps(data, ensure_ascii=False)
+    else:
+        payload = data
+    for line in payload.splitlines():
+        buffer.append(f"data: {line}")
+    return "\n".join(buffer) + "\n\n"
+
+TEXTS = [
+    "", "Hello", "中文内容", "emoji 😀", "line1\nline2", "\r\n", "trailing\n",
+    "quote \" and backslash \\", "tab\tand\bcontrol\x00\x1f\x7f",
+    "next line \x85", "separators \u2028 and \u2029", "form\x0cfeed \x0bvt \x1c\x1d\x1e",
+]
+
+PAYLOADS = [
+    None, 0, 1.5, True, [], {}, [1, "a", None],
+    {"type": "usage", "max_tokens": 8192, "input_tokens": 10, "output_tokens": 2, "total_tokens": 12},
+    {"type": "tool_call", "data": {"id": "call_1", "name": "read_file", "arguments": "{\"path\": \"a\"}", "index": 0}},
+    {"tool_call_id": "call_1", "result": None},
+    *TEXTS,
+    *({"type": "text", "content": text} for text in TEXTS),
+]
+
+
+class TestEncodeSse:
+    @pytest.mark.parametrize("data", PAYLOADS)
+    @pytest.mark.parametrize("event,event_id,retry", [
+        (None, None, None),
+        ("MESSAGE_CHUNK", None, None),
+        ("TASK_DONE", "42", 3000),
+    ])
+    def test_byte_identical_to_legacy(self, data, event, event_id, retry):
+        expected = legacy_format_sse(data, event, event_id, retry)
+        assert encode_sse(data, event, event_id, retry) == expected.encode("utf-8")
+        assert format_sse(data, event, event_id, retry) == expected
+
+    @pytest.mark.parametrize("text", TEXTS)
+    def test_object_template(self, text):
+        template = SseObjectTemplate("MESSAGE_CHUNK", {"type": "text"}, "content")
+        expected = legacy_format_sse({"type": "text", "content": text}, event="MESSAGE_CHUNK")
+        assert template(text) == expected.encode("utf-8")
+
+    @pytest.mark.parametrize("text", TEXTS)
+    def test_without_orjson(self, text, mocker):
+        mocker.patch.object(sse, "orjson", None)
+        template = SseObjectTemplate("MESSAGE_CHUNK", {"type": "text"}, "content")
+        expected = legacy_format_sse({"type": "text", "content": text}, event="MESSAGE_CHUNK")
+        assert template(text) == expected.encode("utf-8")
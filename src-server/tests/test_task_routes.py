@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+import pytest
+from flask import Flask
+from src.routes import task as task_routes
+
+
+class FakeTaskService:
+    tasks: dict = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def get_task_by_id(self, task_id):
+        return self.tasks.get(task_id)
+
+
+class FakeTaskPool:
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(task_routes, "task_pool", FakeTaskPool({
+        1: SimpleNamespace(context_tokens=1200, context_size=128_000),
+    }))
+    monkeypatch.setattr(FakeTaskService, "tasks", {
+        1: SimpleNamespace(context_tokens=900, agent=SimpleNamespace(model=SimpleNamespace(context_size=64_000))),
+        2: SimpleNamespace(context_tokens=900, agent=SimpleNamespace(model=SimpleNamespace(context_size=64_000))),
+        3: SimpleNamespace(context_tokens=300, agent=SimpleNamespace(model=None)),
+        4: SimpleNamespace(context_tokens=0, agent=None),
+    })
+    monkeypatch.setattr(task_routes, "TaskService", FakeTaskService)
+    app = Flask(__name__)
+    app.register_blueprint(task_routes.tasks_bp, url_prefix="/api/tasks")
+    return app.test_client()
+
+
+class TestContextUsage:
+    def test_running_task(self, client):
+        response = client.get("/api/tasks/1/context_usage")
+        assert response.status_code == 200
+        assert response.get_json() == {"used_tokens": 1200, "max_tokens": 128_000}
+
+    def test_persisted_task(self, client):
+        response = client.get("/api/tasks/2/context_usage")
+        assert response.get_json() == {"used_tokens": 900, "max_tokens": 64_000}
+
+    @pytest.mark.parametrize("task_id, used_tokens", [(3, 300), (4, 0)])
+    def test_persisted_task_without_model(self, client, task_id, used_tokens):
+        response = client.get(f"/api/tasks/{task_id}/context_usage")
+        assert response.status_code == 200
+        assert response.get_json() == {"used_tokens": used_tokens, "max_tokens": 0}
+
+    def test_missing_task(self, client):
+        response = client.get("/api/tasks/5/context_usage")
+        assert response.status_code == 404
+        assert response.get_json() == {"error": "Task not found"}
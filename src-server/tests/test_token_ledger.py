@@ -0,0 +1,56 @@
+from liteai_sdk import AssistantMessage, ToolMessage, UserMessage
+from src.agent import token_ledger
+from src.agent.token_ledger import TokenLedger
+
+
+def make_messages() -> list:
+    return [
+        UserMessage(content="List the files"),
+        AssistantMessage(content="Listing", tool_calls=[{
+            "id": "call_1",
+            "type": "function",
+            "function": {"name": "list_directory", "arguments": "{}"},
+        }]),
+        ToolMessage(tool_call_id="call_1", name="list_directory", arguments="{}"),
+    ]
+
+
+class TestTokenLedger:
+    def test_sync_counts_each_message_once(self, mocker):
+        counter = mocker.spy(token_ledger, "token_counter")
+        ledger = TokenLedger("gpt-4-ledger-test-once")
+        messages = make_messages()
+
+        total = ledger.sync(messages)
+        assert total == ledger.total > 0
+        # the unresolved tool message is not counted
+        assert counter.call_count == 2
+
+        ledger.sync(messages)
+        assert counter.call_count == 2
+
+    def test_changed_message_is_recounted(self, mocker):
+        counter = mocker.spy(token_ledger, "token_counter")
+        ledger = TokenLedger("gpt-4-ledger-test-changed")
+        messages = make_messages()
+        before = ledger.sync(messages)
+
+        messages[2].result = "a.txt\nb.txt\n" * 50
+        after = ledger.sync(messages)
+        assert after > before
+        assert counter.call_count == 3
+        assert ledger.total == after
+
+    def test_counts_shared_by_content_hash(self, mocker):
+        counter = mocker.spy(token_ledger, "token_counter")
+        TokenLedger("gpt-4-ledger-test-shared").sync([UserMessage(content="same content")])
+        # a different message object with the same content
+        TokenLedger("gpt-4-ledger-test-shared").sync([UserMessage(content="same content")])
+        assert counter.call_count == 1
+
+    def test_removed_messages_leave_the_total(self):
+        ledger = TokenLedger("gpt-4")
+        messages = make_messages()
+        full = ledger.sync(messages)
+        assert ledger.sync(messages[:1]) < full
+        assert ledger.sync([]) == 0
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.agent.tool_executor import (
+    ToolExecutor, ToolCancelledError, ToolTimeoutError, check_cancelled
+)
+
+
+def echo(text: str) -> str:
+    return text
+
+def make_cooperative_tool():
+    stopped = threading.Event()
+
+    def slow_tool(seconds: float) -> str:
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                check_cancelled()
+                time.sleep(0.005)
+        except ToolCancelledError:
+            stopped.set()
+            raise
+        return "finished"
+    return slow_tool, stopped
+
+
+class TestToolExecutor:
+    def test_execute(self):
+        executor = ToolExecutor(max_workers=2)
+        try:
+            assert asyncio.run(executor.execute(echo, {"text": "hi"})) == "hi"
+            assert asyncio.run(executor.execute(echo, '{"text": "json"}')) == "json"
+        finally:
+            executor.shutdown()
+
+    def test_timeout_reaches_tool(self):
+        executor = ToolExecutor(max_workers=2)
+        slow_tool, stopped = make_cooperative_tool()
+        try:
+            with pytest.raises(ToolTimeoutError):
+                asyncio.run(executor.execute(slow_tool, {"seconds": 5}, timeout=0.05))
+            assert stopped.wait(1)
+        finally:
+            executor.shutdown()
+
+    def test_cancellation_reaches_tool(self):
+        executor = ToolExecutor(max_workers=2)
+        slow_tool, stopped = make_cooperative_tool()
+
+        async def run():
+            task = asyncio.create_task(executor.execute(slow_tool, {"seconds": 5}))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        try:
+            started_at = time.monotonic()
+            asyncio.run(run())
+            assert stopped.wait(1)
+            assert time.monotonic() - started_at < 1
+        finally:
+            executor.shutdown()
+
+    def test_tools_ignoring_cancellation_do_not_take_the_workers(self):
+        executor = ToolExecutor(max_workers=2)
+        released = threading.Event()
+
+        def stuck_tool() -> str:
+            # a blocking call that never checks for cancellation
+            released.wait(10)
+            return "stuck"
+
+        async def run():
+            for _ in range(3):
+                with pytest.raises(ToolTimeoutError):
+                    await executor.execute(stuck_tool, {}, timeout=0.05)
+            return await asyncio.wait_for(executor.execute(echo, {"text": "still running"}), 1)
+
+        try:
+            assert asyncio.run(run()) == "still running"
+        finally:
+            released.set()
+            executor.shutdown()
+
+    def test_pool_is_kept_after_cooperative_timeouts(self):
+        executor = ToolExecutor(max_workers=2)
+        slow_tool, stopped = make_cooperative_tool()
+        pool = executor._executor
+        try:
+            with pytest.raises(ToolTimeoutError):
+                asyncio.run(executor.execute(slow_tool, {"seconds": 5}, timeout=0.05))
+            assert stopped.wait(1)
+            time.sleep(0.05)
+            assert asyncio.run(executor.execute(echo, {"text": "hi"})) == "hi"
+            assert executor._executor is pool
+        finally:
+            executor.shutdown()
+
+    def test_check_cancelled_outside_executor(self):
+        # no-op when not running on the tool executor
+        check_cancelled()
@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+from liteai_sdk import ToolCallChunk
+from src.agent.tool_speculator import ToolCallSpeculator
+
+
+def read_file(path: str) -> str:
+    return f"content of {path}"
+
+def tool_message(id: str, name: str, arguments: str):
+    return SimpleNamespace(id=id, name=name, arguments=arguments)
+
+
+class TestToolCallSpeculator:
+    def test_starts_when_arguments_complete(self):
+        async def run():
+            speculator = ToolCallSpeculator({"read_file": read_file})
+            speculator.feed(ToolCallChunk("call_1", "read_file", "", 0))
+            speculator.feed(ToolCallChunk(None, None, '{"path": ', 0))
+            assert speculator._calls[0].task is None
+            speculator.feed(ToolCallChunk(None, None, '"a.txt"}', 0))
+            assert speculator._calls[0].task is not None
+
+            task = speculator.take(tool_message("call_1", "read_file", '{"path": "a.txt"}'))
+            assert task is not None
+            return await task
+
+        assert asyncio.run(run()) == "content of a.txt"
+
+    def test_discarded_when_final_call_differs(self):
+        async def run():
+            speculator = ToolCallSpeculator({"read_file": read_file})
+            speculator.feed(ToolCallChunk("call_1", "read_file", '{"path": "a.txt"}', 0))
+            task = speculator.take(tool_message("call_1", "read_file", '{"path": "b.txt"}'))
+            return task, speculator
+
+        task, speculator = asyncio.run(run())
+        assert task is None
+        assert speculator.misses == 1
+
+    def test_invalidated_when_arguments_keep_streaming(self):
+        async def run():
+            speculator = ToolCallSpeculator({"read_file": read_file})
+            speculator.feed(ToolCallChunk("call_1", "read_file", '{"path": "a"}', 0))
+            speculator.feed(ToolCallChunk(None, None, " ", 0))
+            return speculator.take(tool_message("call_1", "read_file", '{"path": "a"} '))
+
+        assert asyncio.run(run()) is None
+
+    def test_ignores_tools_that_are_not_read_only(self):
+        async def run():
+            speculator = ToolCallSpeculator({"read_file": read_file})
+            speculator.feed(ToolCallChunk("call_1", "write_file", '{"path": "a"}', 0))
+            return speculator._calls[0].task
+
+        assert asyncio.run(run()) is None
@@ -0,0 +1,199 @@
+import random
+import re
+import pytest
+from pathlib import Path
+from src.agent.tools.content_search import PathFilter, collect_candidates
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.trigram_index import TrigramIndex, use_trigram_index
+from src.agent.tools.workspace_index import IndexState, WorkspaceIndex
+from src.utils import trigrams
+from src.utils.trigrams import MATCH_ALL, build_query, trigrams_of
+
+
+def satisfies(query, text: str) -> bool:
+    trigrams = set(trigrams_of(text.encode("utf-8")))
+    return any(alternative <= trigrams for alternative in query)
+
+
+class TestBuildQuery:
+    @pytest.mark.parametrize("pattern", [r"a.b", r"[a-z]+", r"ab|cde", r"(foo)?", r"x*"])
+    def test_no_literal_text(self, pattern):
+        assert build_query(pattern, False, True) == MATCH_ALL
+
+    def test_invalid_pattern(self):
+        assert build_query("handle(", False, True) == MATCH_ALL
+
+    def test_literal_runs_are_required(self):
+        query = build_query(r"def\s+handle_request\(", False, True)
+        assert satisfies(query, "def  handle_request(self)")
+        assert not satisfies(query, "def handle_response(self)")
+
+    def test_alternation(self):
+        query = build_query(r"read_(file|directory)", False, True)
+        assert len(query) == 2
+        assert satisfies(query, "read_directory")
+        assert not satisfies(query, "read_lines")
+
+    def test_parsed_pattern_mapping(self):
+        # pins how the output of the private `re._parser` is read, a change of the stdlib fails here
+        def packed(*words):
+            return frozenset(trigram for word in words for trigram in trigrams_of(word.encode("utf-8")))
+
+        query = build_query(r"^foo(bar|baz)+\s*q[ux]x$", False, True)
+        assert len(query) == 4
+        assert set(query) == {packed("foo", "bar", "qux"), packed("foo", "bar", "qxx"),
+                              packed("foo", "baz", "qux"), packed("foo", "baz", "qxx")}
+
+    def test_without_the_regex_parser(self, monkeypatch):
+        monkeypatch.setattr(trigrams, "sre_parser", None)
+        assert build_query(r"read_(file|directory)", False, True) == MATCH_ALL
+        assert build_query("read_file", True, True) != MATCH_ALL
+
+    def test_unreadable_parse_matches_all(self, monkeypatch):
+        monkeypatch.setattr(trigrams, "_sequence_query", lambda items, ignore_case: items[0][5])
+        assert build_query(r"read_file", False, True) == MATCH_ALL
+
+    def test_case_is_folded(self):
+        assert satisfies(build_query("TaskQueue", False, True), "taskqueue")
+        assert satisfies(build_query("TaskQueue", True, False), "TASKQUEUE")
+        assert satisfies(build_query("(?i)TaskQueue", False, True), "TASKQUEUE")
+
+    def test_never_rejects_a_match(self):
+        rng = random.Random(0)
+        words = ["read", "file", "Read_File", "déjà", "vu", "(x)", "data", "DATA", "\t"]
+        patterns = [(r"read_file", False), (r"(?i)déjà vu", False), (r"dat[ab]", False), (r"(x)", True),
+                    (r"read|data", False), (r"file\s+\(x\)", False), (r"(?:re)+ad", False)]
+        for _ in range(2000):
+            text = " ".join(rng.choices(words, k=6))
+            for pattern, literal in patterns:
+                for case_sensitive in (True, False):
+                    regex = re.escape(pattern) if literal else pattern
+                    if re.search(regex, text, 0 if case_sensitive else re.IGNORECASE):
+                        assert satisfies(build_query(pattern, literal, case_sensitive), text), (pattern, text)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    root = tmp_path / "workspace"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "app.py").write_text("def handle_request(request):\n    pass\n", encoding="utf-8")
+    (root / "src" / "util.py").write_text("def parse_header(value):\n    pass\n", encoding="utf-8")
+    (root / "README.md").write_text("Call handle_request first.\n", encoding="utf-8")
+    (root / "image.bin").write_bytes(b"handle_request\0")
+    return root
+
+
+@pytest.fixture
+def indexes(workspace, tmp_path):
+    workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+    workspace_index.build()
+    trigram_index = TrigramIndex(workspace_index, tmp_path / "trigrams.db", max_bytes=64 * 1024 * 1024)
+    trigram_index.state = IndexState.READY
+    trigram_index.update([""])
+    yield workspace_index, trigram_index
+    trigram_index.stop()
+
+
+def candidate_paths(trigram_index: TrigramIndex, workspace_index: WorkspaceIndex, pattern: str) -> list[str]:
+    candidates = collect_candidates(workspace_index.root, PathFilter(None, None), None, workspace_index, "")
+    return [candidate.path for candidate in trigram_index.narrow(candidates, "", pattern, False, True)]
+
+
+class TestTrigramIndex:
+    def test_narrows_the_candidates(self, indexes):
+        workspace_index, trigram_index = indexes
+        assert candidate_paths(trigram_index, workspace_index, "handle_request") == ["README.md", "src/app.py"]
+        assert candidate_paths(trigram_index, workspace_index, "parse_.*value") == ["src/util.py"]
+        assert len(candidate_paths(trigram_index, workspace_index, "de.")) == 4
+
+    def test_pending_and_stored_files(self, indexes, workspace):
+        workspace_index, trigram_index = indexes
+        # the first update leaves the files pending, storing them gives the same answers
+        assert trigram_index.usage()["pending_files"] == 4
+        trigram_index._store_pending()
+        assert trigram_index.usage()["pending_files"] == 0
+        assert candidate_paths(trigram_index, workspace_index, "handle_request") == ["README.md", "src/app.py"]
+
+    def test_follows_the_changes(self, indexes, workspace, monkeypatch):
+        workspace_index, trigram_index = indexes
+        monkeypatch.setattr(TrigramIndex, "MAX_DEAD_RATIO", 1.0)
+        trigram_index._store_pending()
+        (workspace / "src" / "util.py").write_text("handle_request()\n", encoding="utf-8")
+        (workspace / "README.md").unlink()
+        workspace_index.apply_changes([str(workspace / "src" / "util.py"), str(workspace / "README.md")])
+        trigram_index.update(["src/util.py", "README.md"])
+
+        assert candidate_paths(trigram_index, workspace_index, "handle_request") == ["src/app.py", "src/util.py"]
+        assert trigram_index.usage()["dead_ids"] == 2
+
+    def test_rebuilds_when_most_ids_are_dead(self, indexes, workspace):
+        workspace_index, trigram_index = indexes
+        trigram_index._store_pending()
+        for name in ("app.py", "util.py"):
+            (workspace / "src" / name).write_text("changed\n", encoding="utf-8")
+        workspace_index.apply_changes([str(workspace / "src" / "app.py"), str(workspace / "src" / "util.py")])
+        trigram_index.update(["src"])
+
+        assert trigram_index.usage()["dead_ids"] == 0
+        assert candidate_paths(trigram_index, workspace_index, "handle_request") == ["README.md"]
+
+    def test_files_without_a_record_are_kept(self, indexes, workspace):
+        workspace_index, trigram_index = indexes
+        (workspace / "src" / "new.py").write_text("nothing here\n", encoding="utf-8")
+        workspace_index.apply_changes([str(workspace / "src" / "new.py")])
+        # the trigram index has not seen the change yet
+        assert "src/new.py" in candidate_paths(trigram_index, workspace_index, "handle_request")
+
+    def test_persists_across_restarts(self, indexes, tmp_path):
+        workspace_index, trigram_index = indexes
+        trigram_index._store_pending()
+        reopened = TrigramIndex(workspace_index, tmp_path / "trigrams.db", max_bytes=64 * 1024 * 1024)
+        reopened._load()
+        reopened.state = IndexState.READY
+        assert candidate_paths(reopened, workspace_index, "parse_header") == ["src/util.py"]
+
+    def test_size_limit_disables_the_index(self, workspace, tmp_path):
+        workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+        workspace_index.build()
+        trigram_index = TrigramIndex(workspace_index, tmp_path / "trigrams.db", max_bytes=1024)
+        trigram_index.update([""])
+        trigram_index._store_pending()
+        assert trigram_index.state is IndexState.DISABLED
+        assert len(candidate_paths(trigram_index, workspace_index, "handle_request")) == 4
+
+    def test_replaced_index_stops_listening(self, workspace, tmp_path):
+        workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+        workspace_index.build()
+        first = use_trigram_index(workspace_index, 64 * 1024 * 1024)
+        first.start()
+        try:
+            assert first.wait_idle(timeout=10)
+            assert workspace_index._listeners == [first._on_workspace_changed]
+        finally:
+            second = use_trigram_index(workspace_index, 32 * 1024 * 1024)
+        assert second is not first
+        assert workspace_index._listeners == []
+        second.stop()
+
+    def test_background_updates(self, workspace, tmp_path):
+        workspace_index = WorkspaceIndex(str(workspace), tmp_path / "workspace.db")
+        trigram_index = TrigramIndex(workspace_index, tmp_path / "trigrams.db", max_bytes=64 * 1024 * 1024)
+        workspace_index.start()
+        trigram_index.start()
+        try:
+            assert trigram_index.wait_idle(timeout=10)
+            assert trigram_index.state is IndexState.READY
+            (workspace / "src" / "util.py").write_text("handle_request()\n", encoding="utf-8")
+            workspace_index.apply_changes([str(workspace / "src" / "util.py")])
+            assert trigram_index.wait_idle(timeout=10)
+            assert trigram_index._records["src/util.py"].size == len("handle_request()\n")
+        finally:
+            trigram_index.stop()
+            workspace_index.stop()
+
+    def test_search_files_output_is_unchanged(self, indexes, workspace):
+        workspace_index, trigram_index = indexes
+        indexed = FileSystemTool(str(workspace), workspace_index=workspace_index, trigram_index=trigram_index)
+        plain = FileSystemTool(str(workspace))
+        for pattern in ("handle_request", "def (handle|parse)_", "pass", "not_in_any_file"):
+            assert indexed.search_files(pattern) == plain.search_files(pattern)
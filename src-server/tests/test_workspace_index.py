@@ -0,0 +1,235 @@
+import os
+import time
+import pytest
+from pathlib import Path
+from src.agent.tools.file_system import FileSystemTool
+from src.agent.tools.workspace_index import IndexState, WorkspaceIndex
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    root = tmp_path / "workspace"
+    (root / "src" / "pkg").mkdir(parents=True)
+    (root / "node_modules" / "lib").mkdir(parents=True)
+    (root / "src" / "main.py").write_text("print('main')", encoding="utf-8")
+    (root / "src" / "pkg" / "util.py").write_text("pass", encoding="utf-8")
+    (root / "src" / "pkg" / "util.pyc").write_bytes(b"\0")
+    (root / "node_modules" / "lib" / "index.js").write_text("", encoding="utf-8")
+    (root / "README.md").write_text("# Readme", encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def index(workspace, tmp_path):
+    index = WorkspaceIndex(str(workspace), tmp_path / "index.db")
+    index.build()
+    yield index
+    index.stop()
+
+
+def paths(index: WorkspaceIndex, directory: str) -> list[str]:
+    entries = index.children(directory)
+    assert entries is not None
+    return sorted(entry.path for entry in entries)
+
+
+def wait_until(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestWorkspaceIndex:
+    def test_build(self, index, workspace):
+        assert index.state is IndexState.READY
+        assert paths(index, "") == ["README.md", "node_modules", "src"]
+        assert paths(index, "src/pkg") == ["src/pkg/util.py"]
+
+        entry = index.get("src/main.py")
+        assert entry is not None
+        assert not entry.is_dir
+        assert entry.size == len("print('main')")
+        assert entry.mtime_ns == (workspace / "src" / "main.py").stat().st_mtime_ns
+
+    def test_ignored_directories_are_not_descended(self, index):
+        entry = index.get("node_modules")
+        assert entry is not None and entry.ignored
+        assert index.children("node_modules") is None
+        assert index.get("node_modules/lib") is None
+
+    def test_files(self, index):
+        files = index.files()
+        assert files is not None
+        assert [entry.path for entry in files] == ["README.md", "src/main.py", "src/pkg/util.py"]
+
+    def test_not_ready(self, workspace, tmp_path):
+        index = WorkspaceIndex(str(workspace), tmp_path / "index.db")
+        assert index.state is IndexState.EMPTY
+        assert index.children("") is None
+        assert index.files() is None
+
+    def test_too_many_entries(self, workspace, tmp_path):
+        index = WorkspaceIndex(str(workspace), tmp_path / "index.db", max_entries=3)
+        assert index.build() == 0
+        assert index.state is IndexState.DISABLED
+        assert index.children("") is None
+        assert index.count() == 0
+
+    def test_apply_created_and_deleted(self, index, workspace):
+        version = index.version
+        (workspace / "src" / "new.py").write_text("new", encoding="utf-8")
+        (workspace / "README.md").unlink()
+        index.apply_changes([str(workspace / "src" / "new.py"), str(workspace / "README.md")])
+
+        assert index.version > version
+        assert index.get("README.md") is None
+        assert paths(index, "src") == ["src/main.py", "src/new.py", "src/pkg"]
+
+    def test_apply_moved_directory(self, index, workspace):
+        (workspace / "src" / "pkg").rename(workspace / "pkg")
+        index.apply_changes([str(workspace / "src" / "pkg"), str(workspace / "pkg")])
+
+        assert index.get("src/pkg/util.py") is None
+        assert paths(index, "pkg") == ["pkg/util.py"]
+
+    def test_apply_modified(self, index, workspace):
+        (workspace / "src" / "main.py").write_text("print('changed main')", encoding="utf-8")
+        index.apply_changes([str(workspace / "src" / "main.py")])
+
+        entry = index.get("src/main.py")
+        assert entry is not None
+        assert entry.size == len("print('changed main')")
+
+    def test_apply_ignored_file(self, index, workspace):
+        (workspace / "src" / "main.pyc").write_bytes(b"\0")
+        index.apply_changes([str(workspace / "src" / "main.pyc")])
+        assert index.get("src/main.pyc") is None
+
+    def test_apply_gitignore_change(self, index, workspace):
+        (workspace / "src" / ".gitignore").write_text("pkg/\n", encoding="utf-8")
+        index.apply_changes([str(workspace / "src" / ".gitignore")])
+        pkg = index.get("src/pkg")
+        assert pkg is not None and pkg.ignored
+        assert index.get("src/pkg/util.py") is None
+
+        (workspace / "src" / ".gitignore").unlink()
+        index.apply_changes([str(workspace / "src" / ".gitignore")])
+        assert index.get("src/pkg/util.py") is not None
+
+    def test_watches_the_workspace(self, workspace, tmp_path):
+        index = WorkspaceIndex(str(workspace), tmp_path / "index.db")
+        index.start()
+        try:
+            assert index.wait_ready(timeout=10)
+            (workspace / "created.txt").write_text("created", encoding="utf-8")
+            assert wait_until(lambda: index.get("created.txt") is not None)
+            (workspace / "created.txt").unlink()
+            assert wait_until(lambda: index.get("created.txt") is None)
+        finally:
+            index.stop()
+
+
+    def test_watches_the_non_ignored_directories(self, workspace, tmp_path):
+        index = WorkspaceIndex(str(workspace), tmp_path / "index.db")
+        index.start()
+        try:
+            assert index.wait_ready(timeout=10)
+            assert wait_until(lambda: index._observer is not None)
+            assert set(index._watches) == {"src"}
+            (workspace / "docs").mkdir()
+            assert wait_until(lambda: "docs" in index._watches)
+            (workspace / "docs" / "guide.md").write_text("# Guide", encoding="utf-8")
+            assert wait_until(lambda: index.get("docs/guide.md") is not None)
+        finally:
+            index.stop()
+
+    def test_catches_up_with_changes_before_the_start(self, index, workspace):
+        (workspace / "src" / "late.py").write_text("pass", encoding="utf-8")
+        (workspace / "src" / "main.py").unlink()
+        index.start()
+        assert wait_until(lambda: index.get("src/late.py") is not None and index.get("src/main.py") is None)
+
+    def test_stored_index_is_loaded(self, index, workspace, tmp_path, mocker):
+        index.stop()
+        util = workspace / "src" / "pkg" / "util.py"
+        pkg_stat = util.parent.stat()
+        util.write_text("def util(): pass", encoding="utf-8")
+        # a file modified in place, in a directory that did not change since the build
+        os.utime(util.parent, ns=(pkg_stat.st_atime_ns, pkg_stat.st_mtime_ns - 10 * 10**9))
+        (workspace / "src" / "late.py").write_text("pass", encoding="utf-8")
+        (workspace / "README.md").unlink()
+
+        reopened = WorkspaceIndex(str(workspace), tmp_path / "index.db")
+        build = mocker.spy(reopened, "build")
+        walk = mocker.spy(reopened, "_walk")
+        reopened.start()
+        try:
+            assert reopened.wait_ready(5)
+            assert wait_until(lambda: reopened.get("src/late.py") is not None and reopened.get("README.md") is None)
+            assert wait_until(lambda: reopened.get("src/pkg/util.py").size == len("def util(): pass"))
+            assert build.call_count == 0 and walk.call_count == 0
+            assert paths(reopened, "src/pkg") == ["src/pkg/util.py"]
+        finally:
+            reopened.stop()
+
+    def test_stored_index_with_other_settings_is_built(self, index, workspace, tmp_path, mocker):
+        reopened = WorkspaceIndex(str(workspace), tmp_path / "index.db", ignore_patterns=("*.md",))
+        build = mocker.spy(reopened, "build")
+        reopened.start()
+        try:
+            assert reopened.wait_ready(5)
+            assert build.call_count == 1
+            assert reopened.get("README.md") is None
+            assert reopened.get("node_modules/lib/index.js") is not None
+        finally:
+            reopened.stop()
+
+    def test_disabled_index_does_not_watch(self, workspace, tmp_path):
+        index = WorkspaceIndex(str(workspace), tmp_path / "index.db", max_entries=2)
+        index.start()
+        try:
+            index._worker.join(timeout=10)
+            assert index.state is IndexState.DISABLED
+            assert index._observer is None
+        finally:
+            index.stop()
+
+    def test_relative_paths(self, index, workspace):
+        assert index._relative(str(workspace / "..foo")) == "..foo"
+        assert index._relative(str(workspace / ".." / "other")) is None
+        assert index._relative(str(workspace)) is None
+
+    def test_started_by_the_first_search(self, index, workspace):
+        tool = FileSystemTool(str(workspace), workspace_index=index)
+        tool.list_directory(".")
+        assert index._worker is None
+        tool.find_files("main")
+        assert index._worker is not None
+
+
+class TestListDirectoryFromIndex:
+    def test_same_listing_as_the_disk(self, index, workspace):
+        indexed_tool = FileSystemTool(str(workspace), workspace_index=index)
+        disk_tool = FileSystemTool(str(workspace))
+        for path in (".", "src"):
+            assert indexed_tool.list_directory(path, recursive=True) ==\
+                   disk_tool.list_directory(path, recursive=True)
+        assert indexed_tool.list_directory(".", max_entries=2) == disk_tool.list_directory(".", max_entries=2)
+
+    def test_answered_from_the_index(self, index, workspace):
+        tool = FileSystemTool(str(workspace), workspace_index=index)
+        # a file the index has not seen yet is not listed
+        (workspace / "unseen.txt").write_text("", encoding="utf-8")
+        assert "unseen.txt" not in tool.list_directory(".")
+        # the tool falls back to the disk for ignored directories
+        assert "lib" in tool.list_directory("node_modules")
+
+    def test_tools_update_the_index(self, index, workspace):
+        tool = FileSystemTool(str(workspace), workspace_index=index)
+        tool.write_file("src/written.py", "pass")
+        assert index.get("src/written.py") is not None
+        tool.delete("src/written.py")
+        assert index.get("src/written.py") is None